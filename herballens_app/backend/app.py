@@ -1,438 +1,1064 @@
-from flask import Flask, request, jsonify
+import time
+# Startup is timed from the first import (see startup_status)
+STARTUP_BEGAN = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import tensorflow as tf
-import numpy as np
-import json
-from PIL import Image, ImageOps
-from tensorflow.keras.applications.efficientnet import preprocess_input
-from deep_translator import GoogleTranslator
+from translation_store import TranslationStore
+from prediction_cache import PredictionCache
+from chat_cache import ChatCache, normalized_key
+from content import ADMIN_TOKEN, ADMIN_TOKEN_HEADER, ContentStore
+from response_fragments import (JSON_CONTENT_TYPE, NDJSON_CONTENT_TYPE, ChatFragments, PredictionFragments, compress,
+                                encode_event, encode_fields, encode_json)
+from process_stats import memory_usage
+from metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, registry as metrics_registry, REQUESTS_IN_FLIGHT,
+                     REQUEST_SECONDS, PREDICT_STAGE_SECONDS, CHAT_STAGE_SECONDS, IMAGE_DECODES,
+                     TRANSLATION_FALLBACKS, GATE_DECISIONS)
 
 import os
+import hmac
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 import sys
-
-# Configure standard output to flush immediately for better logging
 import functools
-print = functools.partial(print, flush=True)
+import logging
+
+from structured_log import (configure_logging, current_request_id, request_context, trace_enabled,
+                            wants_trace, REQUEST_ID_HEADER, DEBUG_TRACE_HEADER)
+
+# Which endpoints this process serves: HERBAL_MODE=predict (/predict,
+# /predict_batch, /similar), chat (/chat) or all (default). A chat worker
+# never imports numpy, PIL or the model code, let alone TensorFlow, so it
+# starts in a fraction of a second and can be scaled apart from the
+# inference workers.
+SERVICE_MODE = os.environ.get("HERBAL_MODE", "all").strip().lower()
+if SERVICE_MODE not in ("all", "predict", "chat"):
+    raise SystemExit(f"HERBAL_MODE must be all, predict or chat, not {SERVICE_MODE!r}")
+SERVES_PREDICT = SERVICE_MODE in ("all", "predict")
+SERVES_CHAT = SERVICE_MODE in ("all", "chat")
+
+if SERVES_PREDICT:
+    # TensorFlow itself is only imported when the model is first loaded
+    # (see inference_backend.py)
+    import numpy as np
+    from inference_batcher import InferenceBatcher
+    from embedding_index import EMBEDDING_INDEX_PATH, EmbeddingIndex
+    from prediction_gate import PredictionGate
+    from inference_backend import INFERENCE_BACKEND, create_backend, apply_preprocessing
+    from warmup import EAGER_LOAD, ModelWarmup
+    from image_pipeline import decode_upload, new_batch, resize_into, tta_view_count, tta_views
+if SERVES_CHAT:
+    from symptom_index import SymptomMatcher, load_synonyms
+    from plant_index import PlantIndex
+
+# Seconds spent in each startup phase, reported on /stats and /metrics
+startup_timings = {"imports": time.perf_counter() - STARTUP_BEGAN}
+
+# Logs go through a background writer (see structured_log.py); per-request
+# diagnostics are DEBUG and only kept for sampled requests
+configure_logging()
+log = logging.getLogger("herbal.app")
 
 app = Flask(__name__)
 CORS(app) # Enable CORS for all routes
 
+def route(rule, mode, **options):
+    # app.route for an endpoint of the "predict" or "chat" service; endpoints
+    # this process doesn't serve (see SERVICE_MODE) aren't registered
+    if (mode == "predict" and not SERVES_PREDICT) or (mode == "chat" and not SERVES_CHAT):
+        return lambda view: view
+    return app.route(rule, **options)
+
 # Get absolute path to files
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "herbal_model.keras")
 CLASS_INDICES_PATH = os.path.join(BASE_DIR, "class_indices.json")
 
-# Global model variable for lazy loading
+# Global model backend for lazy loading (keras or TFLite, see inference_backend.py)
 model = None
+model_lock = threading.Lock()
 
 def get_model():
     global model
     if model is None:
-        print(f"Loading model from: {MODEL_PATH}...")
-        try:
-            # Disable JIT to see if it prevents silent crashes
-            os.environ['TF_XLA_FLAGS'] = '--tf_xla_enable_xla_devices=false'
-            # Load the actual model. If it fails, we want to know why.
-            model = tf.keras.models.load_model(MODEL_PATH, compile=False)
-            print("Model loaded successfully!")
-        except Exception as e:
-            print(f"CRITICAL ERROR loading model: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            raise e # Raise the error so we don't use a dummy model
+        # The warm-up thread and request threads may race to load it
+        with model_lock:
+            if model is None:
+                log.info("Loading model from: %s (backend: %s)...", MODEL_PATH, INFERENCE_BACKEND)
+                try:
+                    # Load the actual model. If it fails, we want to know why.
+                    start = time.perf_counter()
+                    model = create_backend(INFERENCE_BACKEND, MODEL_PATH).load()
+                    startup_timings["model_load"] = time.perf_counter() - start
+                    log.info("Model loaded successfully in %.2fs!", model.load_seconds)
+                    log.info("Preprocessing: %s (from %s)", model.preprocessing, model.preprocessing_source)
+                except Exception as e:
+                    log.critical("CRITICAL ERROR loading model: %s", e, exc_info=True)
+                    raise e # Raise the error so we don't use a dummy model
     return model
 
-# Load class names
-print("Loading class indices...")
-with open(CLASS_INDICES_PATH) as f:
-    class_indices = json.load(f)
-# Ensure indices are handled correctly (some JSONs have "0": "Name", others "Name": 0)
-if isinstance(list(class_indices.keys())[0], str) and isinstance(list(class_indices.values())[0], int):
-    class_names = {int(v): k for k, v in class_indices.items()}
-else:
-    class_names = {int(k): v for k, v in class_indices.items()}
+def get_model_version():
+    # Identifies the weights behind a cached prediction without loading TensorFlow
+    version = os.environ.get("HERBAL_MODEL_VERSION")
+    if version:
+        return version
+    try:
+        st = os.stat(MODEL_PATH)
+        return f"{st.st_size}-{int(st.st_mtime)}-{INFERENCE_BACKEND}"
+    except OSError:
+        return f"missing-{INFERENCE_BACKEND}"
+
+def run_model_batch(images):
+    # Single forward pass over a (N, 224, 224, 3) batch collected by the batcher,
+    # preprocessed the way the model's contract (detected at load) requires
+    current_model = get_model()
+    return current_model.predict(apply_preprocessing(images, current_model.preprocessing))
 
-print(f"Loaded {len(class_names)} classes.")
+def run_embedding_batch(images):
+    # Same forward pass, returning the penultimate-layer features for /similar
+    current_model = get_model()
+    return current_model.embed(apply_preprocessing(images, current_model.preprocessing))
+
+# /predict_batch upload limits
+BATCH_MAX_FILES = int(os.environ.get("HERBAL_BATCH_MAX_FILES", "1000"))
+BATCH_MAX_FILE_BYTES = int(os.environ.get("HERBAL_BATCH_MAX_FILE_MB", "25")) * 1024 * 1024
+BATCH_MAX_TOTAL_BYTES = int(os.environ.get("HERBAL_BATCH_MAX_TOTAL_MB", "512")) * 1024 * 1024
+BATCH_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+# Test-time augmentation for /predict (see image_pipeline.tta_views): on for
+# every request with HERBAL_TTA=1, or per request with a "tta" form field or
+# query parameter. The views share forward passes through the batcher.
+TTA_DEFAULT = os.environ.get("HERBAL_TTA", "0") == "1"
+TTA_CROPS = int(os.environ.get("HERBAL_TTA_CROPS", "3"))
+TTA_FLIPS = os.environ.get("HERBAL_TTA_FLIPS", "1") == "1"
+
+SIMILAR_DEFAULT_K = 5
+SIMILAR_MAX_K = 20
+
+if SERVES_PREDICT:
+    # Uncertainty flags and the non-plant pre-filter (see prediction_gate.py)
+    gate = PredictionGate()
+    log.info("Prediction gate: %s", gate.status())
+
+    # Cached responses carry the gate's verdict, so its settings are part of the key
+    MODEL_VERSION = f"{get_model_version()}-{gate.signature}"
+
+    # Concurrent /predict requests share forward passes through the batcher
+    batcher = InferenceBatcher(run_model_batch)
+    embed_batcher = InferenceBatcher(run_embedding_batch)
+
+    # /predict_batch: images per forward pass and decode threads
+    BATCH_INFERENCE_SIZE = int(os.environ.get("HERBAL_BATCH_INFERENCE_SIZE", str(batcher.max_batch_size)))
+    decode_pool = ThreadPoolExecutor(
+        max_workers=int(os.environ.get("HERBAL_DECODE_WORKERS", str(os.cpu_count() or 4))),
+        thread_name_prefix="decode"
+    )
+
+    TTA_VIEWS = tta_view_count(TTA_CROPS, TTA_FLIPS)
+
+    # With HERBAL_EAGER_LOAD=1 the model is loaded and warmed up in the background
+    # at startup instead of on the first /predict; /readyz reports progress.
+    warmup = ModelWarmup(get_model)
+    if EAGER_LOAD:
+        warmup.start()
+
+    # Responses for repeat uploads of the same image (see prediction_cache.py)
+    prediction_cache = PredictionCache()
+
+    # Reference embeddings for /similar, memory-mapped and shared by all workers
+    # (built offline with embedding_index.py; /similar is unavailable without it)
+    try:
+        embedding_index = EmbeddingIndex.load(EMBEDDING_INDEX_PATH)
+        log.info("Embedding index: %d classes, %d reference photos (%s).",
+                 len(embedding_index.classes), len(embedding_index.images), embedding_index.meta.get("source"))
+        if not embedding_index.matches_model(MODEL_PATH):
+            log.warning("Embedding index was built for different model weights; rebuild it with embedding_index.py")
+    except (OSError, ValueError, KeyError) as e:
+        log.info("No embedding index at %s (%s); /similar is disabled.", EMBEDDING_INDEX_PATH, e)
+        embedding_index = None
 
-# Load detailed plant info
 PLANT_INFO_PATH = os.path.join(BASE_DIR, "plant_info.json")
-try:
-    with open(PLANT_INFO_PATH) as f:
-        plant_info = json.load(f)
-    print("Plant info loaded successfully.")
-except Exception as e:
-    print(f"Note: Could not load plant_info.json: {e}")
-    plant_info = {}
-
-def preprocess_image(image):
-    # 1. Handle EXIF orientation (important for mobile uploads)
-    image = ImageOps.exif_transpose(image)
-    
-    # 2. Convert to RGB
-    image = image.convert("RGB")
-    
-    # 3. Standard Preprocessing: Many models are trained with simple squashing
-    # to (224, 224) rather than aspect-ratio padding.
-    target_size = (224, 224)
-    image = image.resize(target_size, Image.Resampling.LANCZOS)
-    
-    # Debug: Save what the model actually sees
-    # image.save(os.path.join(BASE_DIR, "debug_preprocessed.jpg"))
-    
-    img_array = np.array(image).astype(np.float32)
-    
-    # Expand dims to (1, 224, 224, 3)
-    img_array = np.expand_dims(img_array, axis=0)
-    
-    # Note: Our model summary shows a Rescaling layer, 
-    # so we should NOT divide by 255 manually here.
-    return img_array
 
-@app.route("/predict", methods=["POST"])
+# Telugu translations come from the on-disk store (see translation_store.py);
+# only texts it has never seen go out to GoogleTranslator.
+translations = TranslationStore()
+
+# Replies for repeat /chat queries (see chat_cache.py)
+chat_cache = ChatCache()
+
+if SERVES_CHAT:
+    # Health mapping with 400+ symptoms (Minute, Common, Moderate, Chronic, Serious),
+    # compiled once into a single matcher for /chat
+    log.info("Loading symptom vocabulary...")
+    start = time.perf_counter()
+    symptom_matcher = SymptomMatcher(load_synonyms())
+    startup_timings["symptoms"] = time.perf_counter() - start
+    log.info("Compiled %d symptom terms for %d conditions (%d words indexed for typo matching).",
+             symptom_matcher.term_count, len(symptom_matcher.synonyms), len(symptom_matcher.vocabulary))
+
+def classify_prediction(content, pred_row):
+    # Pick the winning class from one row of probabilities and look up its details
+    top_indices = np.argsort(pred_row)[-3:][::-1]
+
+    if trace_enabled():
+        top3 = ", ".join(f"{content.class_names.get(int(i), 'Unknown')}: {float(pred_row[i]) * 100:.2f}%" for i in top_indices)
+        log.debug("Top 3 predictions: %s", top3)
+
+    idx = int(top_indices[0])
+    confidence = float(pred_row[idx]) * 100
+    plant_name = content.class_names.get(idx, "Unknown Plant")
+
+    uncertainty = gate.assess(pred_row)
+    log.info("Final result", extra={"plant": plant_name, "confidence": round(confidence, 2),
+                                    "uncertain": uncertainty["uncertain"]})
+    GATE_DECISIONS.inc(decision="uncertain" if uncertainty["uncertain"] else "accepted")
+
+    return plant_name, confidence, content.plant_details(plant_name), uncertainty
+
+def details_texts(plant_name, details):
+    # Every English text translate_details() will ask for
+    texts = [details.get("description", ""), *details.get("benefits", [])]
+    if plant_name != "Unknown Plant":
+        texts.append(plant_name.replace("_", " "))
+    return [t for t in texts if t]
+
+def telugu_updates(plant_name, details, translate):
+    # The Telugu fields of a prediction one at a time, as partial
+    # {"details_te": {…}} / {"plant_te": …} updates; raises if a translation fails
+    # Translate description
+    if details.get("description"):
+        yield {"details_te": {"description": translate(details["description"])}}
+
+    # Translate benefits
+    yield {"details_te": {"benefits": [translate(benefit) for benefit in details.get("benefits", [])]}}
+
+    # Translate plant name if it's not "Unknown Plant"
+    if plant_name != "Unknown Plant":
+        # Some plant names might be underscores, replace them for better translation
+        yield {"plant_te": translate(plant_name.replace("_", " "))}
+
+def translated_details(plant_name, details, translate):
+    # Returns (plant_name_te, details_te); raises if any translation fails
+    plant_name_te = plant_name
+    details_te = {
+        "description": details.get("description", ""),
+        "benefits": details.get("benefits", [])
+    }
+    for update in telugu_updates(plant_name, details, translate):
+        plant_name_te = update.get("plant_te", plant_name_te)
+        details_te.update(update.get("details_te", {}))
+    return plant_name_te, details_te
+
+def translate_details(plant_name, details, translate=translations.translate):
+    # Returns (plant_name_te, details_te, translated); falls back to English
+    # for everything if any translation fails.
+    try:
+        plant_name_te, details_te = translated_details(plant_name, details, translate)
+    except Exception as e:
+        log.warning("Prediction translation error: %s", e)
+        TRANSLATION_FALLBACKS.inc(endpoint="predict")
+        return plant_name, details, False # Fallback to English
+    return plant_name_te, details_te, True
+
+def stored_translation(text):
+    # Translation store lookup that never goes to the network
+    translated = translations.lookup(text)
+    if translated is None:
+        raise LookupError(f"No stored translation for {text[:40]!r}")
+    return translated
+
+def build_fragments(content):
+    # Pre-serialized English parts of every plant's response, plus the Telugu
+    # parts the translation store can already provide (see response_fragments.py)
+    built = PredictionFragments(content.class_names.values(), content.plant_details)
+    for plant_name in content.class_names.values():
+        try:
+            built.remember_telugu(plant_name, *translated_details(plant_name, content.plant_details(plant_name),
+                                                                  stored_translation))
+        except LookupError:
+            pass
+    return built
+
+def telugu_fragment(content, plant_name, details, translate=translations.translate):
+    # Returns (Telugu fragment, translated); translated ones are kept for next time
+    fragments = content.fragments
+    fragment = fragments.telugu(plant_name)
+    if fragment is not None:
+        return fragment, True
+    plant_name_te, details_te, translated = translate_details(plant_name, details, translate)
+    if translated:
+        return fragments.remember_telugu(plant_name, plant_name_te, details_te), True
+    return fragments.encode_telugu(plant_name_te, details_te), False
+
+def prediction_body(content, plant_name, telugu, confidence, uncertainty, **extra):
+    # JSON body of a /predict response, spliced from the plant's fragments
+    return content.fragments.assemble(plant_name, telugu, {"confidence": round(confidence, 2), **uncertainty, **extra})
+
+def body_response(body):
+    # Pre-encoded JSON body, compressed if the client accepts it
+    payload, encoding = compress(body, request.headers.get("Accept-Encoding"))
+    response = Response(payload, content_type=JSON_CONTENT_TYPE)
+    response.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+NOT_A_PLANT_EN = "No plant was found in this photo. Please upload a clear photo of a leaf or plant."
+NOT_A_PLANT_TE = "ఈ ఫోటోలో మొక్క కనిపించలేదు. దయచేసి ఆకు లేదా మొక్క స్పష్టంగా కనిపించే ఫోటోను అప్‌లోడ్ చేయండి."
+
+def rejection_result(green_fraction):
+    # Answer for uploads the pre-filter turned away before inference
+    GATE_DECISIONS.inc(decision="rejected")
+    log.info("Rejected upload", extra={"green_fraction": green_fraction})
+    return encode_json({
+        "plant": None,
+        "plant_te": None,
+        "confidence": 0.0,
+        "uncertain": True,
+        "rejected": "not_a_plant",
+        "green_fraction": green_fraction,
+        "message": NOT_A_PLANT_EN,
+        "message_te": NOT_A_PLANT_TE
+    })
+
+def gate_upload(processed_img):
+    # Pre-filter one decoded (1, 224, 224, 3) upload; returns a rejection
+    # result, or None if it should go on to the model
+    with PREDICT_STAGE_SECONDS.time(stage="gate"):
+        plant_like, fraction = gate.looks_like_plant(processed_img[0])
+    return None if plant_like else rejection_result(fraction)
+
+def describe_prediction(content, pred_row):
+    # Turn one row of class probabilities into the /predict response body.
+    # Also returns whether the Telugu fields were actually translated.
+    plant_name, confidence, details, uncertainty = classify_prediction(content, pred_row)
+    telugu, translated = telugu_fragment(content, plant_name, details)
+    return prediction_body(content, plant_name, telugu, confidence, uncertainty), translated
+
+def stream_prediction(content, plant_name, confidence, details, uncertainty, cache_key,
+                      translate=translations.translate, **extra):
+    # NDJSON events of a streamed /predict. The "result" event has the same
+    # fields as a plain response, with the Telugu ones still in English unless
+    # the plant's fragment is stored; "translation" events then replace them
+    # one at a time and "done" says whether they all made it.
+    fields = {"confidence": round(confidence, 2), **uncertainty, **extra}
+    fragments = content.fragments
+    telugu = fragments.telugu(plant_name)
+    if telugu is not None:
+        body = fragments.assemble(plant_name, telugu, fields)
+        if prediction_cache.enabled:
+            prediction_cache.put(cache_key, body)
+        yield from stream_body(body)
+        return
+
+    yield encode_event("result", fragments.assemble(plant_name, fragments.encode_telugu(plant_name, details), fields))
+    plant_name_te = plant_name
+    details_te = {"description": details.get("description", ""), "benefits": details.get("benefits", [])}
+    try:
+        with PREDICT_STAGE_SECONDS.time(stage="translation"):
+            for update in telugu_updates(plant_name, details, translate):
+                plant_name_te = update.get("plant_te", plant_name_te)
+                details_te.update(update.get("details_te", {}))
+                yield encode_event("translation", encode_json(update))
+    except Exception as e:
+        log.warning("Prediction translation error: %s", e)
+        TRANSLATION_FALLBACKS.inc(endpoint="predict")
+        # Put back the English fallback for fields already sent in Telugu
+        yield encode_event("translation", encode_json({"plant_te": plant_name, "details_te": details}))
+        yield encode_event("done", translated=False)
+        return
+
+    telugu = fragments.remember_telugu(plant_name, plant_name_te, details_te)
+    if prediction_cache.enabled:
+        prediction_cache.put(cache_key, fragments.assemble(plant_name, telugu, fields))
+    yield encode_event("done", translated=True)
+
+def stream_body(body):
+    # A complete body (cached, rejected, fully translated) as a one-result stream
+    yield encode_event("result", body)
+    yield encode_event("done", translated=True)
+
+def streamed(events):
+    # NDJSON response for a generator of events. The body is produced after
+    # the view returns; keep its logs tagged with this request's id.
+    request_id, traced = current_request_id(), trace_enabled()
+
+    def stream():
+        with request_context(request_id, traced):
+            yield from events
+
+    return Response(stream_with_context(stream()), mimetype=NDJSON_CONTENT_TYPE)
+
+def instrumented(endpoint):
+    # Tags the request's logs with its id (X-Request-ID, echoed back), counts
+    # it as in flight and records its duration by status
+    def wrap(view):
+        @functools.wraps(view)
+        def handle(*args, **kwargs):
+            start = time.perf_counter()
+            with request_context(request.headers.get(REQUEST_ID_HEADER),
+                                 wants_trace(request.headers.get(DEBUG_TRACE_HEADER))) as request_id:
+                with REQUESTS_IN_FLIGHT.track_inprogress(endpoint=endpoint):
+                    response = app.make_response(view(*args, **kwargs))
+                elapsed = time.perf_counter() - start
+                log.info("%s %s", request.method, request.path,
+                         extra={"status": response.status_code, "duration_ms": round(elapsed * 1000, 2)})
+            REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=response.status_code)
+            response.headers[REQUEST_ID_HEADER] = request_id
+            return response
+        return handle
+    return wrap
+
+def decode_image(data):
+    # Reduced-resolution decode when the format allows it, counted by path
+    image, reduced = decode_upload(data)
+    IMAGE_DECODES.inc(path="draft" if reduced else "full")
+    return image
+
+def preprocess_timed(data, tta=False):
+    # Upload bytes -> (1, 224, 224, 3) float32 batch (or the TTA_VIEWS views
+    # of the image), timing both stages
+    with PREDICT_STAGE_SECONDS.time(stage="decode"):
+        image = decode_image(data)
+    with PREDICT_STAGE_SECONDS.time(stage="preprocess"):
+        if tta:
+            return tta_views(image, new_batch(TTA_VIEWS), TTA_CROPS, TTA_FLIPS)
+        processed_img = new_batch(1)
+        resize_into(image, processed_img[0])
+    return processed_img
+
+def tta_requested(value):
+    # "tta" form field / query parameter; absent means the deployment default
+    if value is None:
+        return TTA_DEFAULT
+    return value.strip().lower() in ("1", "true", "yes")
+
+def stream_requested(value, accept):
+    # Opt-in streaming: "stream" form field / query parameter, or an NDJSON Accept header
+    if value is not None:
+        return value.strip().lower() in ("1", "true", "yes")
+    return NDJSON_CONTENT_TYPE in (accept or "")
+
+def infer(processed_img, tta=False):
+    # One row of probabilities. TTA views are averaged; their extra cost shows
+    # up as the inference_tta stage next to plain inference on /metrics.
+    if tta:
+        with PREDICT_STAGE_SECONDS.time(stage="inference_tta"):
+            return batcher.submit_many(processed_img).mean(axis=0)
+    with PREDICT_STAGE_SECONDS.time(stage="inference"):
+        return batcher.submit(processed_img)
+
+@route("/predict", "predict", methods=["POST"])
+@instrumented("predict")
 def predict():
-    print("\n--- NEW PREDICTION REQUEST ---")
     try:
         if "image" not in request.files:
-            print("Error: No image in request.files")
+            log.info("Error: No image in request.files")
             return jsonify({"error": "No image uploaded"}), 400
             
         file = request.files["image"]
         if file.filename == '':
-            print("Error: Empty filename")
+            log.info("Error: Empty filename")
             return jsonify({"error": "No selected file"}), 400
 
-        print(f"1. Processing file: {file.filename}")
-        image = Image.open(file).convert("RGB")
-        
-        print("2. Getting model...")
-        current_model = get_model()
-        
-        print("3. Preprocessing image...")
-        processed_img = preprocess_image(image)
-        print(f"   Shape: {processed_img.shape}, Dtype: {processed_img.dtype}")
-        
-        print("4. Running model prediction...")
-        # Try direct call first
-        preds = current_model(processed_img, training=False)
-        pred_array = preds.numpy()
-        
-        # If confidence is extremely low (< 1%), try with preprocess_input fallback
-        # This handles cases where the model might NOT have the rescaling layer 
-        # as expected or behaves differently.
-        if np.max(pred_array) < 0.01:
-            print("   Low confidence detected, trying fallback preprocessing...")
-            fallback_img = preprocess_input(processed_img)
-            preds = current_model(fallback_img, training=False)
-            pred_array = preds.numpy()
+        log.debug("1. Processing file: %s", file.filename)
+        data = file.read()
+        tta = tta_requested(request.values.get("tta"))
+        # Streamed responses send the English result right after inference
+        # and the Telugu fields as they're translated (see stream_prediction)
+        stream = stream_requested(request.values.get("stream"), request.headers.get("Accept"))
+
+        # One content snapshot for the whole request, even if a reload lands meanwhile
+        content = content_store.snapshot()
+
+        # Repeat uploads of the same photo are answered from the cache
+        cache_key = prediction_cache.key(data, cache_version(content, tta))
+        cached = prediction_cache.get(cache_key) if prediction_cache.enabled else None
+        if cached is not None:
+            log.info("Cache hit")
+            return streamed(stream_body(cached)) if stream else body_response(cached)
+
+        log.debug("2. Getting model...")
+        get_model()
         
-        print("6. Processing results...")
-        top_indices = np.argsort(pred_array[0])[-3:][::-1]
+        log.debug("3. Preprocessing image (%d bytes)...", len(data))
+        # Reduced-resolution decode straight into a (1, 224, 224, 3) float32 buffer
+        processed_img = preprocess_timed(data, tta)
+
+        # Obvious non-plants are answered without inference or translation
+        rejection = gate_upload(processed_img)
+        if rejection is not None:
+            if prediction_cache.enabled:
+                prediction_cache.put(cache_key, rejection)
+            return streamed(stream_body(rejection)) if stream else body_response(rejection)
         
-        print("Top 3 Predictions:")
-        for i, idx_top in enumerate(top_indices):
-            name = class_names.get(int(idx_top), "Unknown")
-            conf = float(pred_array[0][idx_top]) * 100
-            print(f"  {i+1}. {name}: {conf:.2f}%")
-
-        idx = int(top_indices[0])
-        confidence = float(pred_array[0][idx]) * 100
-        plant_name = class_names.get(idx, "Unknown Plant")
+        log.debug("4. Running model prediction...")
+        # One forward pass (batched together with any concurrent requests)
+        pred_row = infer(processed_img, tta)
         
-        print(f"7. Final Result: {plant_name} ({confidence:.2f}%)")
+        plant_name, confidence, details, uncertainty = classify_prediction(content, pred_row)
+        extra = {"tta_views": len(processed_img)} if tta else {}
+        if stream:
+            return streamed(stream_prediction(content, plant_name, confidence, details, uncertainty, cache_key,
+                                              **extra))
+        with PREDICT_STAGE_SECONDS.time(stage="translation"):
+            telugu, translated = telugu_fragment(content, plant_name, details)
+        with PREDICT_STAGE_SECONDS.time(stage="serialization"):
+            body = prediction_body(content, plant_name, telugu, confidence, uncertainty, **extra)
 
-        # Prepare details and translate to Telugu if needed
-        details = plant_info.get(plant_name, {
-            "scientific_name": "Information not available",
-            "description": "We are currently gathering more details about this specific herbal plant.",
-            "benefits": ["General medicinal properties"]
-        })
+        # Don't pin an English fallback in the cache; retry translation next time
+        if translated and prediction_cache.enabled:
+            prediction_cache.put(cache_key, body)
+        return body_response(body)
+    except Exception as e:
+        log.exception("!!! PREDICTION ERROR !!!: %s", e)
+        return jsonify({"error": str(e)}), 500
 
-        # Add Telugu translations for the details
-        details_te = {
-            "description": details.get("description", ""),
-            "benefits": details.get("benefits", [])
-        }
-        
+class BatchTooLarge(Exception):
+    """A /predict_batch upload over BATCH_MAX_FILES or BATCH_MAX_TOTAL_BYTES."""
+
+def read_batch_uploads():
+    # Collect (filename, bytes) from multipart "images" files and/or a zip
+    # archive sent as "archive". Everything is read up front because the
+    # streamed response outlives the request's file handles, so the limits
+    # are checked before anything is read: files and zip entries are counted
+    # first, no more than BATCH_MAX_FILE_BYTES of any file is kept, and each
+    # read is refused once the running total would pass BATCH_MAX_TOTAL_BYTES.
+    files = [file for file in request.files.getlist("images") + request.files.getlist("image") if file.filename]
+    archive = request.files.get("archive")
+    if archive is not None and not archive.filename:
+        archive = None
+    if len(files) > BATCH_MAX_FILES:
+        raise BatchTooLarge(f"Too many images (max {BATCH_MAX_FILES})")
+
+    uploads = []
+    total = 0
+
+    def take(size):
+        nonlocal total
+        total += size
+        if total > BATCH_MAX_TOTAL_BYTES:
+            raise BatchTooLarge(f"Batch larger than {BATCH_MAX_TOTAL_BYTES} bytes")
+
+    for file in files:
+        # One byte past either limit is enough to know the file is over it
+        data = file.read(min(BATCH_MAX_FILE_BYTES, BATCH_MAX_TOTAL_BYTES - total) + 1)
+        if len(data) > BATCH_MAX_FILE_BYTES:
+            # Gets the same "too large" line as an oversized zip entry
+            uploads.append((file.filename, None))
+            continue
+        take(len(data))
+        uploads.append((file.filename, data))
+
+    if archive is not None:
+        with zipfile.ZipFile(archive.stream) as zf:
+            entries = [entry for entry in zf.infolist()
+                       if not entry.is_dir() and entry.filename.lower().endswith(BATCH_IMAGE_EXTENSIONS)]
+            if len(uploads) + len(entries) > BATCH_MAX_FILES:
+                raise BatchTooLarge(f"Too many images (max {BATCH_MAX_FILES})")
+            for entry in entries:
+                if entry.file_size > BATCH_MAX_FILE_BYTES:
+                    uploads.append((entry.filename, None))
+                    continue
+                # file_size is the declared size; zipfile never inflates past it
+                take(entry.file_size)
+                uploads.append((entry.filename, zf.read(entry)))
+    return uploads
+
+def decode_into(data, out):
+    # Runs on the decode pool; PIL releases the GIL while decoding
+    resize_into(decode_image(data), out)
+
+def stream_batch_predictions(uploads):
+    # The whole batch is answered from one content snapshot
+    content = content_store.snapshot()
+    version = cache_version(content)
+    total = len(uploads)
+    errors = 0
+    batch_size = BATCH_INFERENCE_SIZE
+    chunks = [list(range(i, min(i + batch_size, total))) for i in range(0, total, batch_size)]
+
+    def start_chunk(chunk):
+        # Cached images skip decoding; the rest decode in parallel into one buffer
+        buffer = np.empty((len(chunk), 224, 224, 3), dtype=np.float32)
+        jobs = {}
+        for slot, i in enumerate(chunk):
+            data = uploads[i][1]
+            if data is None:
+                continue
+            key = prediction_cache.key(data, version)
+            cached = prediction_cache.get(key) if prediction_cache.enabled else None
+            jobs[i] = (slot, key, cached, None if cached is not None else decode_pool.submit(decode_into, data, buffer[slot]))
+        return buffer, jobs
+
+    # Keep the next chunk decoding while the current one is on the model
+    pending = start_chunk(chunks[0]) if chunks else None
+    for n, chunk in enumerate(chunks):
+        buffer, jobs = pending
+        pending = start_chunk(chunks[n + 1]) if n + 1 < len(chunks) else None
+
+        lines = {}
+        decoded = []
+        for i in chunk:
+            if i not in jobs:
+                lines[i] = {"error": f"File larger than {BATCH_MAX_FILE_BYTES} bytes"}
+                continue
+            slot, key, cached, future = jobs[i]
+            if cached is not None:
+                lines[i] = cached
+                continue
+            try:
+                future.result()
+            except Exception as e:
+                lines[i] = {"error": f"Could not read image: {e}"}
+                continue
+            plant_like, fraction = gate.looks_like_plant(buffer[slot])
+            if plant_like:
+                decoded.append(i)
+            else:
+                lines[i] = rejection_result(fraction)
+                if prediction_cache.enabled:
+                    prediction_cache.put(key, lines[i])
+
+        if decoded:
+            try:
+                slots = [jobs[i][0] for i in decoded]
+                preds = run_model_batch(buffer[slots])
+                for row, i in enumerate(decoded):
+                    result, translated = describe_prediction(content, preds[row])
+                    if translated and prediction_cache.enabled:
+                        prediction_cache.put(jobs[i][1], result)
+                    lines[i] = result
+            except Exception as e:
+                for i in decoded:
+                    lines[i] = {"error": f"Prediction failed: {e}"}
+
+        for i in chunk:
+            # Results are pre-encoded bodies; splice the index and filename in front
+            head = encode_fields({"index": i, "filename": uploads[i][0]})
+            if isinstance(lines[i], bytes):
+                yield b"{" + head + b"," + lines[i][1:] + b"\n"
+            else:
+                errors += 1
+                yield b"{" + head + b"," + encode_fields(lines[i]) + b"}\n"
+
+    yield encode_json({"done": True, "count": total, "errors": errors}) + b"\n"
+
+@route("/predict_batch", "predict", methods=["POST"])
+@instrumented("predict_batch")
+def predict_batch():
+    # Classify many images in one request. Results are streamed back as
+    # NDJSON, one line per image in upload order, then a final summary line.
+    # A bad image gets an "error" line instead of failing the batch.
+    try:
+        uploads = read_batch_uploads()
+    except BatchTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except zipfile.BadZipFile:
+        return jsonify({"error": "Archive is not a valid zip file"}), 400
+    if not uploads:
+        return jsonify({"error": "No images uploaded"}), 400
+
+    log.info("Batch of %d images", len(uploads))
+    get_model()
+    return streamed(stream_batch_predictions(uploads))
+
+CHAT_GREETING = "I'm here to help! What herbal remedy are you looking for?"
+CHAT_NO_REMEDY_EN = "I couldn't find a specific herbal remedy for this. For your safety, please visit a doctor for a proper diagnosis."
+CHAT_NO_REMEDY_TE = "దీనికి సంబంధించి నాకు నిర్దిష్టమైన మూలికా నివారణ కనిపించలేదు. మీ భద్రత కోసం, దయచేసి సరైన నిర్ధారణ కోసం వైద్యుడిని సందర్శించండి."
+
+# Fixed parts of a /chat reply, per language (see response_fragments.py)
+CHAT_TEMPLATES = {
+    "en": {
+        "header": "Here are the best herbal remedies for your query:",
+        "note": "Note: If symptoms persist or are severe, please visit a doctor."
+    },
+    "te": {
+        "header": "మీ ప్రశ్నకు ఉత్తమ మూలికా నివారణలు ఇవి:",
+        "note": "గమనిక: లక్షణాలు కొనసాగితే లేదా తీవ్రంగా ఉంటే, దయచేసి వైద్యుడిని సంప్రదించండి."
+    }
+}
+
+def chat_line_te(content, plant_name, translate):
+    # Telugu reply line for a plant from its translated name and description
+    name_te = translate(plant_name.replace("_", " "))
+    description_te = translate(content.plant_info[plant_name].get("description", ""))
+    return content.chat_fragments.remember(plant_name, "te", name_te, description_te)
+
+def build_chat_fragments(content):
+    # English lines for every plant, Telugu ones the translation store can
+    # already provide; the rest are translated on first use
+    built = ChatFragments(CHAT_TEMPLATES)
+    for plant_name, details in content.plant_info.items():
+        built.remember(plant_name, "en", plant_name, details.get("description", ""))
         try:
-            translator = GoogleTranslator(source='en', target='te')
-            # Translate description
-            if details.get("description"):
-                details_te["description"] = translator.translate(details["description"])
-            
-            # Translate benefits
-            translated_benefits = []
-            for benefit in details.get("benefits", []):
-                translated_benefits.append(translator.translate(benefit))
-            details_te["benefits"] = translated_benefits
-            
-            # Translate plant name if it's not "Unknown Plant"
-            plant_name_te = plant_name
-            if plant_name != "Unknown Plant":
-                # Some plant names might be underscores, replace them for better translation
-                clean_name = plant_name.replace("_", " ")
-                plant_name_te = translator.translate(clean_name)
-        except Exception as e:
-            print(f"Prediction translation error: {e}")
-            plant_name_te = plant_name
-            details_te = details # Fallback to English
-
-        return jsonify({
-            "plant": plant_name,
-            "plant_te": plant_name_te,
-            "confidence": round(confidence, 2),
-            "details": details,
-            "details_te": details_te
-        })
+            built.remember(plant_name, "te", stored_translation(plant_name.replace("_", " ")),
+                           stored_translation(details.get("description", "")))
+        except LookupError:
+            pass
+    return built
+
+def build_content(content):
+    # Everything derived from plant_info.json and class_indices.json that this
+    # process's endpoints use, built before the snapshot is published (at
+    # startup and on every reload, see content.py)
+    if SERVES_PREDICT:
+        content.fragments = build_fragments(content)
+        log.info("Built content %d for /predict: %d classes, fragments %s",
+                 content.generation, len(content.class_names), content.fragments.stats())
+    if SERVES_CHAT:
+        content.plant_index = PlantIndex(content.plant_info)
+        content.chat_fragments = build_chat_fragments(content)
+        log.info("Built content %d for /chat: %d plants, %d distinct benefits, chat lines %s",
+                 content.generation, len(content.plant_info), len(content.plant_index.benefit_plants),
+                 content.chat_fragments.stats())
+
+def content_reloaded(content):
+    # Cached replies are keyed by content digest, so old ones are never
+    # served; drop them rather than wait for them to age out
+    chat_cache.clear()
+
+log.info("Loading class indices and plant info...")
+content_store = ContentStore(CLASS_INDICES_PATH, PLANT_INFO_PATH, build_content, on_reload=content_reloaded)
+start = time.perf_counter()
+content_store.load()
+startup_timings["content"] = time.perf_counter() - start
+
+def cache_version(content, tta=False):
+    # Cached /predict bodies depend on the weights, the gate's settings and
+    # the plant content
+    return f"{MODEL_VERSION}-{content.digest}" + ("-tta" if tta else "")
+
+@route("/similar", "predict", methods=["POST"])
+@instrumented("similar")
+def similar():
+    # Look-alike plants and nearest reference photos for an uploaded image
+    if embedding_index is None:
+        return jsonify({"error": "Similarity search is not available"}), 503
+    if "image" not in request.files or request.files["image"].filename == "":
+        return jsonify({"error": "No image uploaded"}), 400
+    try:
+        k = int(request.form.get("k", SIMILAR_DEFAULT_K))
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+    k = max(1, min(k, SIMILAR_MAX_K))
+
+    try:
+        processed_img = new_batch(1)
+        decode_into(request.files["image"].read(), processed_img[0])
+        embedding = embed_batcher.submit(processed_img)
+        plants, images = embedding_index.search(embedding, k)
+        log.info("Similar plants", extra={"plant": plants[0]["plant"] if plants else None})
+        return jsonify({"similar_plants": plants, "similar_images": images})
     except Exception as e:
-        print(f"!!! PREDICTION ERROR !!!: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Similarity search failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
-@app.route("/chat", methods=["POST"])
+def chat_query_parts(query):
+    return [p.strip() for p in query.replace(",", " and ").split(" and ") if p.strip()]
+
+def compose_chat_reply(content, query):
+    # Rank plants for a /chat query and build the reply.
+    # Returns (reply, untranslated). When every Telugu line is available the
+    # reply is already complete and untranslated is None; otherwise it lists
+    # the plants to hand to telugu_chat_reply().
+    if not query:
+        return {"response": CHAT_GREETING}, None
+
+    # Expand query with synonyms
+    start = time.perf_counter()
+    original_query = query.lower()
+    log.debug("Original query: %s", original_query)
+    # Split query into parts to catch multiple conditions
+    query_parts = chat_query_parts(original_query)
+    log.debug("Query parts: %s", query_parts)
+    if trace_enabled():
+        corrected = [symptom_matcher.correct(part) for part in query_parts]
+        if corrected != query_parts:
+            log.debug("Typo-corrected parts: %s", corrected)
+    
+    primary_terms = set(query_parts)
+    expanded_terms = set()
+    # One pass of the compiled matcher finds every condition whose key or
+    # any of its synonyms appears in the query (then again over the
+    # typo-corrected query, see symptom_index.py)
+    for key in sorted(symptom_matcher.match_parts(query_parts)):
+        log.debug("Matched category: %s", key)
+        primary_terms.add(key)
+        for syn in symptom_matcher.synonyms[key]:
+            expanded_terms.add(syn)
+    
+    log.debug("Primary terms: %s", primary_terms)
+    # Remove primary terms from expanded terms to avoid double counting
+    expanded_terms = expanded_terms - primary_terms
+    CHAT_STAGE_SECONDS.observe(time.perf_counter() - start, stage="matching")
+
+    # Search in plant_info through the prebuilt benefit index
+    with CHAT_STAGE_SECONDS.time(stage="scoring"):
+        top_scored, total_matches = content.plant_index.top_matches(primary_terms, expanded_terms, k=5)
+    log.debug("Total matches found: %d", total_matches)
+
+    if not top_scored:
+        return {"response": CHAT_NO_REMEDY_EN, "response_te": CHAT_NO_REMEDY_TE}, None
+
+    log.info("Chat matches", extra={"matches": top_scored[:2], "total_matches": total_matches})
+    log.debug("Top matches for %r: %s", query, top_scored)
+    
+    # Only return 1 or 2 plants as requested, each as a concise name and usage line
+    plants = [name for name, _ in top_scored[:2]]
+    chat_fragments = content.chat_fragments
+    response_text_en = chat_fragments.reply("en", [chat_fragments.line(name, "en") for name in plants])
+    reply = {"response": response_text_en.strip()}
+
+    # The Telugu reply is assembled from stored lines; only plants never
+    # translated before are left for telugu_chat_reply()
+    lines_te = [chat_fragments.line(name, "te") for name in plants]
+    if None in lines_te:
+        return reply, plants
+    reply["response_te"] = chat_fragments.reply("te", lines_te)
+    return reply, None
+
+def telugu_chat_reply(content, plants, translate=translations.translate):
+    # Returns (Telugu reply for `plants`, complete), translating the lines
+    # the store lacks. A plant whose translation fails keeps its English line.
+    chat_fragments = content.chat_fragments
+    lines = []
+    complete = True
+    for plant_name in plants:
+        line = chat_fragments.line(plant_name, "te")
+        if line is None:
+            try:
+                line = chat_line_te(content, plant_name, translate)
+            except Exception as e:
+                log.warning("Translation error: %s", e)
+                TRANSLATION_FALLBACKS.inc(endpoint="chat")
+                line = chat_fragments.line(plant_name, "en")
+                complete = False
+        lines.append(line)
+    return chat_fragments.reply("te", lines), complete
+
+def compute_chat_reply(content, query):
+    # Returns (reply, complete); incomplete replies aren't cached
+    reply, untranslated = compose_chat_reply(content, query)
+    if untranslated is None:
+        return reply, True
+    with CHAT_STAGE_SECONDS.time(stage="translation"):
+        reply["response_te"], complete = telugu_chat_reply(content, untranslated)
+    return reply, complete
+
+def chat_key(content, query):
+    # Replies depend on the query's normalized parts and the plant content
+    return (content.digest, *normalized_key(query.lower(), chat_query_parts(query.lower())))
+
+def chat_reply(query):
+    # Repeat queries (in any part order) are answered from the cache, and
+    # identical ones arriving together share one computation (see chat_cache.py)
+    content = content_store.snapshot()
+    return chat_cache.get_or_compute(chat_key(content, query), lambda: compute_chat_reply(content, query))
+
+def stream_chat_reply(query):
+    # NDJSON events of a streamed /chat: the reply as soon as the plants are
+    # ranked, then its Telugu text if that still had to be translated.
+    # Misses go through the chat cache's single flight like chat_reply():
+    # requests for a query that is already being answered wait (for at most
+    # HERBAL_CHAT_CACHE_WAIT) for that reply in the stream's first step.
+    content = content_store.snapshot()
+    key = chat_key(content, query)
+    reply, flight, leader = chat_cache.begin(key)
+    if reply is None and not leader:
+        reply = chat_cache.wait(flight) or compute_chat_reply(content, query)[0]
+    if reply is not None:
+        yield from stream_body(encode_json(reply))
+        return
+
+    # The flight is finished as soon as the full reply exists, so waiters
+    # don't depend on how fast this client reads. A client that goes away
+    # before then finishes it empty, and waiters compute the reply themselves.
+    finished = False
+    try:
+        reply, untranslated = compose_chat_reply(content, query)
+        if untranslated is None:
+            finished = True
+            chat_cache.finish(key, flight, reply, True)
+            yield from stream_body(encode_json(reply))
+            return
+
+        yield encode_event("result", encode_json(reply))
+        with CHAT_STAGE_SECONDS.time(stage="translation"):
+            response_te, complete = telugu_chat_reply(content, untranslated)
+        finished = True
+        chat_cache.finish(key, flight, {**reply, "response_te": response_te}, complete)
+        yield encode_event("translation", encode_json({"response_te": response_te}))
+        yield encode_event("done", translated=complete)
+    except Exception as e:
+        if not finished:
+            finished = True
+            chat_cache.finish(key, flight, error=e)
+        raise
+    finally:
+        if not finished:
+            chat_cache.finish(key, flight)
+
+@route("/chat", "chat", methods=["POST"])
+@instrumented("chat")
 def chat():
     try:
         data = request.json
         query = data.get("query", "").lower().strip()
-        
-        if not query:
-            return jsonify({"response": "I'm here to help! What herbal remedy are you looking for?"})
-
-        # Comprehensive health mapping with 400+ symptoms (Minute, Common, Moderate, Chronic, Serious)
-        synonyms = {
-            # 🫧 MINUTE / TINY ISSUES (Daily discomforts)
-            "hiccups": ["hiccup", "hiccupping", "sudden hiccups", "eating too fast", "drinking too fast"],
-            "dry lips": ["chapped lips", "cracked lips", "lip dryness", "peeling lips", "lip care", "dry mouth corner"],
-            "foot cracks": ["cracked heels", "heel cracks", "dry feet", "rough feet", "foot care", "hard skin on feet"],
-            "tech neck": ["stiff neck", "neck pain from mobile", "neck strain", "scrolling pain", "computer neck", "text neck", "neck stiffness"],
-            "eye strain": ["tired eyes", "dry eyes", "screen fatigue", "burning eyes", "eye heaviness", "computer vision", "eye itchiness"],
-            "sunburn": ["sun rash", "burnt skin", "red skin from sun", "sun irritation", "sun peeling", "beach burn"],
-            "dizziness": ["mild dizziness", "spinning head", "lightheadedness", "faint feeling", "feeling unsteady"],
-            "leg cramps": ["calf pain", "muscle twitching", "night cramps", "leg stiffness", "muscle spasms", "toe cramps"],
-            "dry mouth": ["thirst", "sticky mouth", "low saliva", "dry throat at night", "cotton mouth"],
-            "bad breath": ["morning breath", "mouth odor", "smelly breath", "oral hygiene", "stinky mouth", "bad taste"],
-            "sweaty palms": ["body odor", "excessive sweating", "smelly armpits", "sweaty feet", "clammy hands", "perspiration"],
-            "brittle nails": ["weak nails", "nail breaking", "nail health", "yellow nails", "soft nails", "nail splitting"],
-            "snoring": ["mild snoring", "nasal block at night", "heavy breathing", "sleep noise", "night congestion"],
-            "morning stiffness": ["stiff joints", "hard to move in morning", "body ache after waking", "waking up stiff"],
-            "prickly heat": ["heat rash", "sweat rash", "itchy skin in summer", "red bumps", "miliaria", "skin heat"],
-            "bloating": ["full stomach", "heavy stomach", "stomach gurgling", "gas after beans", "tight stomach"],
-            "burping": ["excessive burping", "belching", "sour belching", "air in stomach", "noisy stomach"],
-            "cuts": ["scratches", "paper cut", "small wound", "minor scrape", "bleeding finger", "skin nick"],
-            "muscle fatigue": ["tired muscles", "body weakness", "after workout pain", "doms", "sore muscles", "physical exhaustion"],
-            "stress": ["mental stress", "anxiety", "tension", "nervousness", "stress relief", "daily stress"],
-            "low appetite": ["not feeling hungry", "loss of taste", "no interest in food", "appetite loss"],
-            "burning sensation": ["spicy food reaction", "mouth burning", "stomach heat", "burning throat"],
-            "dark circles": ["puffy eyes", "under eye bags", "tired face", "eye circles", "eye puffiness"],
-            "scalp itch": ["dry scalp", "dandruff flakes", "itchy head", "scalp buildup", "head itch"],
-            "morning sluggishness": ["low energy", "afternoon slump", "tired after lunch", "laziness", "no motivation", "drowsiness"],
-            "hoarse voice": ["voice loss", "throat tickle", "shouting pain", "cracked voice", "losing voice"],
-            "cold hands": ["cold feet", "chilly feeling", "poor circulation", "shivering", "icy hands"],
-            "oily skin": ["excess oil", "greasy face", "open pores", "blackheads", "shiny skin"],
-            "joint clicks": ["cracking joints", "clicking knees", "finger cracking", "bone noise", "noisy joints"],
-            "brain fog": ["forgetfulness", "poor concentration", "losing keys", "confusion", "mental fatigue", "lack of focus"],
-            "insect bites": ["ant bite", "mosquito bite", "bee sting", "itchy bite", "bug bite", "sting relief"],
-            "tongue coating": ["white tongue", "coated tongue", "bad taste in morning"],
-            "gum sensitivity": ["sensitive gums", "sore gums", "bleeding gums", "gum pain"],
-            "chapped skin": ["dry patches", "rough skin", "winter skin", "skin peeling"],
-            "minor bruises": ["bump mark", "blue mark", "skin bruise", "hit mark"],
-            "sneezing fits": ["recurrent sneezing", "dust allergy", "morning sneezing"],
-            "runny nose": ["watery nose", "constant sneezing", "nasal drip"],
-            "thirst": ["extreme thirst", "dehydration", "feeling dry"],
-            "back ache": ["lower back pain", "stiff back", "sitting too long", "back stiffness"],
-            "shoulder tension": ["stiff shoulders", "shoulder ache", "heavy shoulders"],
-            "foot fatigue": ["sore feet", "tired feet", "standing too long", "foot pain"],
-            "anemia": ["రక్తహీనత", "anemia support", "low iron", "iron deficiency", "blood weakness", "pale skin"],
-            "blood purification": ["రక్త శుద్ధి", "purify blood", "blood detox", "toxins in blood", "clean blood"],
-            "inflammation": ["వాపు", "swelling", "internal inflammation", "redness", "body swelling", "inflammation relief"],
-            "appetite": ["ఆకలి", "poor appetite", "loss of appetite", "not hungry", "appetite loss", "stimulate appetite"],
-            "body odor": ["smelly sweat", "excessive body odor", "perspiration smell"],
-
-            # 🟢 GENERAL & COMMON (1-30)
-            "fatigue": ["అలసట", "నీరసం", "general fatigue", "morning fatigue", "evening fatigue", "chronic tiredness", "weakness", "laziness", "low energy", "stamina", "tired", "chronic fatigue", "physical exhaustion"],
-            "weakness": ["నీరసం", "physical weakness", "mental weakness", "seasonal weakness", "stamina loss", "faint feeling", "dizziness", "body weakness"],
-            "body heat": ["శరీర వేడి", "body heat imbalance", "excess body heat", "heat intolerance", "sweating", "gastric heat", "internal heat"],
-            "dehydration": ["డీహైడ్రేషన్", "mild dehydration", "severe dehydration", "thirst", "water retention"],
-            "fever": ["జ్వరం", "feverish feeling", "mild fever", "viral fever", "temperature", "shivering", "chills", "sibver", "cold sensation", "malarial fever", "dengue fever", "body temperature"],
-            "body pain": ["ఒళ్లు నొప్పులు", "నొప్పులు", "body heaviness", "mild body pain", "body stiffness", "general discomfort", "muscle pain", "muscle cramps", "muscle stiffness", "muscle inflammation"],
-            "wound healing": ["దెబ్బలు తగ్గడం", "పుండ్లు తగ్గడం", "heal wounds", "cuts", "scratches", "external wounds", "minor burns", "wound infections", "antiseptic", "skin healing"],
-
-            "blood purification": ["రక్త శుద్ధి", "purify blood", "blood detox", "clear skin", "blood cleanser"],
-            "fatigue": ["అలసట", "నీరసం", "tiredness", "weakness", "low energy", "exhaustion", "general weakness", "physical fatigue"],
-            "inflammation": ["వాపు", "మంట", "swelling", "internal inflammation", "redness", "painful swelling"],
-            
-            # 👂👃👅 ENT & RESPIRATORY (31-70)
-            "common cold": ["జలుబు", "seasonal cold", "recurrent cold", "sneezing", "runny nose", "nasal discharge", "blocked nose", "nasal congestion", "nasal irritation", "chest congestion"],
-            "sore throat": ["గొంతు నొప్పి", "throat pain", "dry throat", "burning throat", "hoarseness", "voice loss", "itchy throat", "throat irritation", "throat swelling", "throat clearing", "throat infection"],
-            "sinusitis": ["సైనస్", "sinus pressure", "nasal block", "congestion", "headache"],
-            "ear problems": ["చెవి నొప్పి", "ear heaviness", "ear itching", "ear discomfort", "ear pain", "ear blockage", "tinnitus"],
-            "cough": ["దగ్గు", "dry cough", "wet cough", "chronic cough", "night cough", "allergic cough", "chest congestion", "chest tightness", "persistent cough"],
-            "asthma": ["ఆయాసం", "దమ్ము", "mild asthma", "wheezing", "breathlessness", "shortness of breath", "respiratory issues", "bronchitis support"],
-
-            # 🥣 DIGESTIVE (71-110)
-            "indigestion": ["అజీర్ణం", "chronic indigestion", "slow digestion", "irregular digestion", "weak digestion", "stomach burning", "sour belching", "bitter taste", "food intolerance", "digestive weakness", "poor digestion"],
-            "gas": ["గ్యాస్", "కడుపు ఉబ్బరం", "gas formation", "excess gas", "trapped gas", "bloating", "flatulence", "burping", "gas after meals", "stomach gas", "digestive bloating", "stomach discomfort"],
-            "acidity": ["ఎసిడిటీ", "కడుపులో మంట", "hyperacidity", "heartburn", "chest burning", "stomach burning", "reflux", "gastric irritation", "stomach acidity", "digestive irritation"],
-            "nausea": ["వికారం", "morning nausea", "motion nausea", "vomiting tendency", "vomit", "bitter mouth", "motion sickness"],
-            "vomiting": ["వాంతులు", "mild vomiting", "nausea", "stomach upset"],
-            "constipation": ["మలబద్ధకం", "mild constipation", "hard stools", "bowel movement", "irregular bowels"],
-            "diarrhea": ["విరేచనాలు", "loose stools", "soft stools", "loose motions", "stomach cramps", "dysentery", "digestive cramps"],
-            "piles": ["మొలలు", "hemorrhoids", "hemorrhoids (piles)", "anal swelling", "rectal pain"],
-            "worms": ["కడుపులో పురుగులు", "worm infestation", "intestinal worms", "parasitic issues", "stomach worms"],
-            "antioxidant support": ["యాంటీ ఆక్సిడెంట్", "detox", "rejuvenation", "antioxidant", "vitality boost", "cell protection"],
-            "throat irritation": ["గొంతు గీర", "scratchy throat", "throat tickle", "irritated throat", "throat clearing", "hoarse voice"],
-
-            # ✨ SKIN, HAIR, ORAL (111-150)
-            "acne": ["మొటిమలు", "pimples", "mild acne", "oily skin acne", "dry skin acne", "hormonal acne", "adult acne", "pimple", "skin breakouts"],
-            "skin rashes": ["చర్మంపై దద్దుర్లు", "చర్మపు మంట", "skin redness", "skin itching", "sunburn", "heat rash", "allergy", "eczema", "dermatitis", "skin irritation", "skin inflammation", "skin disorders", "skin diseases"],
-            "dry skin": ["పొడి చర్మం", "excessively dry skin", "dull skin", "uneven skin tone", "skin dryness", "skin dullness", "chapped skin"],
-            "hair fall": ["జుట్టు రాలడం", "excess hair fall", "seasonal hair fall", "hair thinning", "weak hair roots", "hairloss", "hairfall", "hair loss", "hair damage", "premature greying"],
-            "dandruff": ["చుండ్రు", "severe dandruff", "dry scalp", "itchy scalp", "scalp infections"],
-            "mouth ulcers": ["నోటి పూత", "నోటి ఇన్ఫెక్షన్", "recurrent mouth ulcers", "burning mouth", "oral dryness", "oral infections"],
-            "gum problems": ["చిగుళ్ల సమస్యలు", "నోటి దుర్వాసన", "gum bleeding", "gum swelling", "tooth sensitivity", "bad breath", "oral discomfort", "gum health", "oral health"],
-
-            # 🟡 MODERATE PROBLEMS (151-250)
-            "joint pain": ["కీళ్ల నొప్పులు", "మోకాళ్ల నొప్పులు", "నడుము నొప్పి", "knee pain", "back pain", "lower back pain", "neck stiffness", "muscle cramps", "muscle pain", "arthritis", "sprains", "ligament strain", "bone weakness", "joint stiffness", "bone health", "bone density", "strengthen bones"],
-            "infections": ["ఇన్ఫెక్షన్", "సోకు", "fungal skin infection", "ringworm", "scabies", "boils", "skin abscess", "uti", "burning urination", "frequent urination", "urinary infections", "bacterial infections", "fungal infections", "antiseptic", "disinfectant"],
-            "mental health": ["మానసిక సమస్యలు", "ఒత్తిడి", "ఆందోళన", "stress", "chronic stress", "anxiety", "panic feeling", "poor concentration", "memory weakness", "mild depression", "low mood", "irritability", "anger issues", "memory loss", "mental fatigue"],
-            "sleep": ["నిద్రలేమి", "నిద్ర పట్టకపోవడం", "insomnia", "sleep disturbance", "disturbed sleep cycle", "daytime sleepiness", "fatigue with stress", "sleep disorders", "restless sleep"],
-            "headache": ["తలనొప్పి", "తల భారంగా ఉండటం", "stress headache", "tension headache", "migraine", "head ache"],
-            "hormonal": ["హార్మోన్ సమస్యలు", "irregular periods", "hormonal imbalance", "menstrual cramps", "irregular menstruation", "excessive menstrual bleeding", "pms", "menstrual fatigue", "menstrual disorders", "uterine health support", "pcos"],
-            "immunity": ["రోగ నిరోధక శక్తి", "రోగ నిరోధక శక్తి తగ్గడం", "weak immunity", "frequent cold", "frequent infections", "seasonal allergies", "dust allergy", "pollen allergy", "skin allergy", "immune disorders", "immune weakness"],
-            "metabolic": ["మెటబాలిక్", "జీవక్రియ", "weight gain", "weight loss", "metabolic imbalance", "metabolic disorders", "insulin resistance"],
-
-            # 🟠 CHRONIC & 🔴 SERIOUS (251-300)
-            "diabetes": ["షుగర్", "చక్కెర వ్యాధి", "మధుమేహం", "type 2 diabetes", "prediabetes", "uncontrolled diabetes", "diabetes with fatigue", "sugar", "diabetes support", "blood sugar imbalance", "high blood sugar"],
-            "obesity": ["అధిక బరువు", "స్థూలకాయం", "obesity", "central obesity", "weight management", "metabolic syndrome"],
-            "high blood pressure": ["బీపీ", "రక్తపోటు", "hypertension", "chronic high bp", "hypertensive", "high blood pressure support"],
-            "cholesterol": ["కొలెస్ట్రాల్", "blood circulation", "heart health", "heart health support"],
-            "liver disorders": ["కాలేయ సమస్యలు", "fatty liver", "chronic liver disorder", "liver cirrhosis", "liver weakness", "jaundice support"],
-            "kidney support": ["కిడ్నీ సమస్యలు", "మూత్రపిండాల సమస్యలు", "chronic kidney weakness", "urinary support", "kidney stones (support)", "kidney health support"],
-            "thyroid": ["థైరాయిడ్", "thyroid imbalance", "hypothyroidism", "hyperthroidism"],
-            "recovery": ["కోలుకోవడం", "నీరసం నుండి కోలుకోవడం", "dengue recovery", "malaria recovery", "tuberculosis support", "chronic infection recovery", "post-dengue weakness", "post-illness weakness"]
-        }
-
-        # Expand query with synonyms
-        original_query = query.lower()
-        print(f"DEBUG: Original query: {original_query}")
-        # Split query into parts to catch multiple conditions
-        query_parts = [p.strip() for p in original_query.replace(",", " and ").split(" and ") if p.strip()]
-        print(f"DEBUG: Query parts: {query_parts}")
-        
-        primary_terms = set(query_parts)
-        expanded_terms = set()
-        for key, syn_list in synonyms.items():
-            # Check if the key or any of its synonyms are in the query
-            if any(key in part or any(syn in part for syn in syn_list) for part in query_parts):
-                print(f"DEBUG: Matched category: {key}")
-                primary_terms.add(key)
-                for syn in syn_list:
-                    expanded_terms.add(syn)
-        
-        print(f"DEBUG: Primary terms: {primary_terms}")
-        # Remove primary terms from expanded terms to avoid double counting
-        expanded_terms = expanded_terms - primary_terms
-
-        # Search in plant_info
-        matches = []
-        for plant, info in plant_info.items():
-            benefits_list = [b.lower() for b in info.get("benefits", [])]
-            description = info.get("description", "").lower()
-            plant_name_lower = plant.lower()
-            
-            score = 0
-            matched_conditions = 0
-            
-            # 1. Check for primary terms (High priority)
-            for term in primary_terms:
-                term_lower = term.lower()
-                term_matched = False
-                for b in benefits_list:
-                    if term_lower == b or term_lower in b or b in term_lower:
-                        score += 50 # Base score for matching a primary condition
-                        term_matched = True
-                        break
-                
-                if term_matched:
-                    matched_conditions += 1
-                elif term_lower in description:
-                    score += 5
-                elif term_lower in plant_name_lower:
-                    score += 10
-            
-            # Bonus for matching multiple query terms
-            if matched_conditions > 1:
-                score += (matched_conditions * 20)
-            
-            # 2. Check for expanded synonyms (Lower priority)
-            for term in expanded_terms:
-                term_lower = term.lower()
-                for b in benefits_list:
-                    if term_lower == b or term_lower in b or b in term_lower:
-                        score += 5
-                        break
-                else:
-                    if term_lower in description:
-                        score += 1
-            
-            if score > 0:
-                matches.append({"name": plant, "score": score, **info})
+        if stream_requested(request.args.get("stream"), request.headers.get("Accept")):
+            return streamed(stream_chat_reply(query))
+        return jsonify(chat_reply(query))
 
-        print(f"DEBUG: Total matches found: {len(matches)}")
+    except Exception as e:
+        log.exception("Chat error: %s", e)
+        return jsonify({"error": str(e)}), 500
 
-        if matches:
-            # Sort by score descending, then by name for consistency
-            matches.sort(key=lambda x: (-x["score"], x["name"]))
-            
-            # Debug log
-            print(f"Query: {query}")
-            print(f"Top matches: {[(m['name'], m['score']) for m in matches[:5]]}")
-            
-            # Only return 1 or 2 plants as requested
-            top_matches = matches[:2]
-            
-            response_text_en = "Here are the best herbal remedies for your query:\n\n"
-            
-            for match in top_matches:
-                # Provide a concise name and usage info
-                response_text_en += f"🌿 **{match['name']}**: {match['description']}\n\n"
-            
-            response_text_en += "⚠️ *Note: If symptoms persist or are severe, please visit a doctor.*"
-            
-            # Translate to Telugu for voice
-            try:
-                # Remove symbols for better translation quality
-                text_to_translate = response_text_en.replace("🌿", "").replace("**", "").replace("⚠️", "").replace("*", "")
-                
-                # Check if we have a very common response that we can pre-translate to save time/avoid errors
-                if "I couldn't find a specific herbal remedy" in text_to_translate:
-                    response_text_te = "దీనికి సంబంధించి నాకు నిర్దిష్టమైన మూలికా నివారణ కనిపించలేదు. మీ భద్రత కోసం, దయచేసి సరైన నిర్ధారణ కోసం వైద్యుడిని సందర్శించండి."
-                else:
-                    translator = GoogleTranslator(source='en', target='te')
-                    response_text_te = translator.translate(text_to_translate)
-                
-                # If translation is too short or failed, fallback
-                if not response_text_te or len(response_text_te) < 5:
-                    response_text_te = text_to_translate
-            except Exception as e:
-                print(f"Translation error: {e}")
-                # Provide a more helpful fallback message if translation fails
-                response_text_te = "క్షమించండి, అనువాదంలో సమస్య ఉంది. (Sorry, there was a translation error.)"
-
-            return jsonify({
-                "response": response_text_en.strip(),
-                "response_te": response_text_te.strip()
-            })
-        
-        return jsonify({
-            "response": "I couldn't find a specific herbal remedy for this. For your safety, please visit a doctor for a proper diagnosis.",
-            "response_te": "దీనికి సంబంధించి నాకు నిర్దిష్టమైన మూలికా నివారణ కనిపించలేదు. మీ భద్రత కోసం, దయచేసి సరైన నిర్ధారణ కోసం వైద్యుడిని సందర్శించండి."
+def reload_content(token):
+    # POST /admin/reload: re-read plant_info.json and class_indices.json now
+    # (see content.py). Returns (body, status code).
+    if not ADMIN_TOKEN:
+        return {"error": "Reloading is not enabled (set HERBAL_ADMIN_TOKEN)"}, 404
+    if not hmac.compare_digest(token or "", ADMIN_TOKEN):
+        return {"error": "Invalid admin token"}, 403
+    swapped, status = content_store.reload("admin endpoint")
+    return status, (422 if "error" in status else 200)
+
+@app.route("/admin/reload", methods=["POST"])
+@instrumented("admin_reload")
+def admin_reload():
+    body, status = reload_content(request.headers.get(ADMIN_TOKEN_HEADER))
+    return jsonify(body), status
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    # Liveness: the process is up and serving requests
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    ready, status = readiness()
+    return jsonify(status), (200 if ready else 503)
+
+def readiness():
+    # (ready, status) for /readyz. In eager mode, ready only once the model is
+    # loaded and warmed up. In lazy mode the model loads on the first /predict,
+    # so we are always ready, as is a chat-only process.
+    if not SERVES_PREDICT:
+        return True, {"ready": True, "mode": SERVICE_MODE}
+    status = warmup.status()
+    status["eager"] = EAGER_LOAD
+    ready = not EAGER_LOAD or warmup.ready
+    return ready, {"ready": ready, **status}
+
+def startup_status():
+    # Where this process's startup went. Modules are counted to show what a
+    # chat-only process avoids importing.
+    return {
+        "mode": SERVICE_MODE,
+        "seconds": {phase: round(seconds, 4) for phase, seconds in startup_timings.items()},
+        "modules_loaded": len(sys.modules),
+        "numpy_imported": "numpy" in sys.modules,
+        "tensorflow_imported": "tensorflow" in sys.modules,
+    }
+
+def collect_stats():
+    content = content_store.current
+    stats = {
+        "startup": startup_status(),
+        "process": memory_usage(),
+        "translations": translations.stats(),
+        "chat_cache": chat_cache.stats(),
+        "content": content_store.status(),
+    }
+    if SERVES_PREDICT:
+        stats.update({
+            "model": {
+                "backend": INFERENCE_BACKEND,
+                "loaded": model is not None,
+                "load_seconds": model.load_seconds if model is not None else None,
+                "preprocessing": model.preprocessing if model is not None else None,
+                "preprocessing_source": model.preprocessing_source if model is not None else None,
+                "warmup": warmup.status(),
+                "gate": gate.status()
+            },
+            "batcher": batcher.stats(),
+            "prediction_cache": prediction_cache.stats(),
+            "response_fragments": content.fragments.stats(),
+            "embedding_index": embedding_index.stats() if embedding_index is not None else None
         })
+    if SERVES_CHAT:
+        stats.setdefault("response_fragments", {})["chat_lines"] = content.chat_fragments.stats()
+    return stats
 
-    except Exception as e:
-        print(f"Chat error: {e}")
-        return jsonify({"error": str(e)}), 500
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify(collect_stats())
+
+def collect_app_metrics():
+    # Figures the caches, translation store and batcher already count,
+    # exported on each /metrics scrape
+    chats = chat_cache.stats()
+    store = translations.stats()
+    reloads = content_store.status()
+    families = [
+        ("herbal_service_info", "gauge", "Endpoints this process serves (HERBAL_MODE)",
+         [({"mode": SERVICE_MODE}, 1)]),
+        ("herbal_startup_seconds", "gauge", "Time spent in each startup phase (imports, content, symptoms, model_load)",
+         [({"phase": phase}, seconds) for phase, seconds in startup_timings.items()]),
+        ("herbal_chat_cache_lookups_total", "counter", "Chat cache lookups by result",
+         [({"result": "hit"}, chats["hits"]), ({"result": "coalesced"}, chats["coalesced"]),
+          ({"result": "miss"}, chats["misses"])]),
+        ("herbal_chat_cache_entries", "gauge", "Replies held by the chat cache", [({}, chats["entries"])]),
+        ("herbal_translation_lookups_total", "counter", "Translation store lookups by result",
+         [({"result": "memory_hit"}, store["memory_hits"]), ({"result": "disk_hit"}, store["disk_hits"]),
+          ({"result": "miss"}, store["misses"])]),
+        ("herbal_translation_failures_total", "counter", "Live translation calls that failed",
+         [({}, store["failures"])]),
+        ("herbal_content_reloads_total", "counter", "Reloads of plant_info.json / class_indices.json by result",
+         [({"result": "applied"}, reloads["reloads"]), ({"result": "rejected"}, reloads["rejected"])]),
+        ("herbal_content_generation", "gauge", "Generation of the content snapshot being served",
+         [({}, reloads["generation"])]),
+    ]
+    if not SERVES_PREDICT:
+        return families
+
+    cache = prediction_cache.stats()
+    batches = batcher.stats()
+    current = model
+    families += [
+        ("herbal_prediction_cache_lookups_total", "counter", "Prediction cache lookups by result",
+         [({"result": "memory_hit"}, cache["memory_hits"]), ({"result": "disk_hit"}, cache["disk_hits"]),
+          ({"result": "miss"}, cache["misses"])]),
+        ("herbal_prediction_cache_bytes", "gauge", "Approximate size of cached responses in memory",
+         [({}, cache["bytes"])]),
+        ("herbal_batcher_batches_total", "counter", "Forward passes run by the inference batcher",
+         [({}, batches["batches"])]),
+        ("herbal_batcher_requests_total", "counter", "Images classified through the inference batcher",
+         [({}, batches["requests"])]),
+        ("herbal_batcher_queued", "gauge", "Images waiting for a forward pass", [({}, batches["queued"])]),
+        ("herbal_model_ready", "gauge", "1 once the model is loaded (and warmed up in eager mode)",
+         [({}, 1 if readiness()[0] and current is not None else 0)]),
+    ]
+    if current is not None:
+        # preprocessing_source is "default" when the contract could not be
+        # detected from metadata or the graph (a fallback worth alerting on)
+        families.append(("herbal_model_info", "gauge", "Loaded model backend and preprocessing contract",
+                         [({"backend": INFERENCE_BACKEND, "preprocessing": current.preprocessing,
+                            "preprocessing_source": current.preprocessing_source}, 1)]))
+    return families
+
+metrics_registry.add_collector(collect_app_metrics)
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Prometheus text exposition (see metrics.py)
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+startup_timings["total"] = time.perf_counter() - STARTUP_BEGAN
+log.info("Started in %.3fs (mode: %s, imports %.3fs, %d modules loaded)", startup_timings["total"], SERVICE_MODE,
+         startup_timings["imports"], len(sys.modules))
 
 if __name__ == "__main__":
     # Standard production-like run
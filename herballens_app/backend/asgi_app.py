@@ -0,0 +1,401 @@
+"""Asyncio front end for /predict and /chat.
+
+The Flask app spends a whole thread per request, most of it blocked on the
+model or on translation HTTP calls, and accepts as many requests as clients
+send. This app serves the same endpoints from one event loop instead:
+
+  * Image decoding runs on app.decode_pool, waiting for the shared batcher
+    on a dedicated inference pool and chat scoring on a small CPU pool, so
+    slow work never blocks the loop.
+  * The translations a response needs are issued concurrently on an I/O
+    pool (store hits return at once, misses go out to GoogleTranslator in
+    parallel instead of one after another).
+  * /predict and /chat each have a bounded admission queue. A fixed number
+    of requests run at once, a fixed number may wait, and anything beyond
+    that (or anything that waited too long) gets 503 with Retry-After right
+    away instead of piling up threads and memory.
+
+The request handling itself is app.py's, so responses are identical,
+including streamed ones (?stream=1 or Accept: application/x-ndjson), whose
+translation steps run on the I/O pool as the body is sent.
+
+    python asgi_app.py [--host 0.0.0.0] [--port 5000]
+    uvicorn asgi_app:app --port 5000
+
+Per-stage timings and admission counters are exported on /metrics.
+
+Configuration (environment variables, besides the app's own):
+    HERBAL_ASGI_PREDICT_CONCURRENCY   /predict requests processed at once (default 2x max batch size)
+    HERBAL_ASGI_PREDICT_QUEUE         /predict requests allowed to wait (default 64)
+    HERBAL_ASGI_CHAT_CONCURRENCY      /chat requests processed at once (default 32)
+    HERBAL_ASGI_CHAT_QUEUE            /chat requests allowed to wait (default 128)
+    HERBAL_ASGI_QUEUE_TIMEOUT         seconds a request may wait for admission (default 10)
+    HERBAL_ASGI_RETRY_AFTER           Retry-After seconds sent with 503 (default 2)
+    HERBAL_ASGI_TRANSLATE_WORKERS     concurrent translation calls (default 16)
+    HERBAL_ASGI_CHAT_WORKERS          threads scoring /chat queries (default 2)
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import app as herbal
+from response_fragments import JSON_CONTENT_TYPE, NDJSON_CONTENT_TYPE, compress
+from structured_log import request_context, wants_trace, REQUEST_ID_HEADER, DEBUG_TRACE_HEADER
+from metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, registry as metrics_registry, REQUESTS_IN_FLIGHT,
+                     REQUEST_SECONDS, PREDICT_STAGE_SECONDS)
+
+log = logging.getLogger("herbal.asgi")
+
+# A chat-only process (HERBAL_MODE=chat) has no batcher and serves no /predict
+DEFAULT_PREDICT_CONCURRENCY = 2 * herbal.batcher.max_batch_size if herbal.SERVES_PREDICT else 1
+PREDICT_CONCURRENCY = int(os.environ.get("HERBAL_ASGI_PREDICT_CONCURRENCY", str(DEFAULT_PREDICT_CONCURRENCY)))
+PREDICT_QUEUE = int(os.environ.get("HERBAL_ASGI_PREDICT_QUEUE", "64"))
+CHAT_CONCURRENCY = int(os.environ.get("HERBAL_ASGI_CHAT_CONCURRENCY", "32"))
+CHAT_QUEUE = int(os.environ.get("HERBAL_ASGI_CHAT_QUEUE", "128"))
+QUEUE_TIMEOUT = float(os.environ.get("HERBAL_ASGI_QUEUE_TIMEOUT", "10"))
+RETRY_AFTER = int(os.environ.get("HERBAL_ASGI_RETRY_AFTER", "2"))
+
+# Threads blocked in batcher.submit() while their image is in a forward pass;
+# one per admitted /predict request is enough.
+inference_pool = ThreadPoolExecutor(max_workers=PREDICT_CONCURRENCY, thread_name_prefix="infer-wait")
+translate_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("HERBAL_ASGI_TRANSLATE_WORKERS", "16")),
+    thread_name_prefix="translate"
+)
+chat_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("HERBAL_ASGI_CHAT_WORKERS", "2")),
+    thread_name_prefix="chat"
+)
+# /chat work that may block waiting for an identical request already in
+# flight (see ChatCache.wait): chat_reply() and the first step of a streamed
+# reply. Nothing waits on chat_pool, so a streamed leader's later steps
+# always get a thread there.
+flight_pool = ThreadPoolExecutor(max_workers=CHAT_CONCURRENCY, thread_name_prefix="chat-wait")
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionQueue:
+    """Lets `concurrency` requests run and up to `max_waiting` wait; rejects the rest."""
+
+    def __init__(self, name, concurrency, max_waiting, timeout=QUEUE_TIMEOUT):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.max_wait_ms = 0.0
+
+    @contextlib.asynccontextmanager
+    async def admit(self):
+        if not self._semaphore.locked():
+            # A free slot: acquire() returns without suspending
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise Overloaded(f"{self.name} queue is full")
+        else:
+            start = time.perf_counter()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise Overloaded(f"{self.name} queue wait exceeded {self.timeout:g}s")
+            finally:
+                self.waiting -= 1
+            self.max_wait_ms = max(self.max_wait_ms, (time.perf_counter() - start) * 1000)
+
+        self.admitted += 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "max_waiting": self.max_waiting,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "max_wait_ms": round(self.max_wait_ms, 2),
+        }
+
+
+predict_queue = AdmissionQueue("predict", PREDICT_CONCURRENCY, PREDICT_QUEUE)
+chat_queue = AdmissionQueue("chat", CHAT_CONCURRENCY, CHAT_QUEUE)
+
+
+def overloaded_response(error):
+    log.warning("Rejected: %s", error)
+    return JSONResponse({"error": "Server is busy, please retry shortly."}, status_code=503,
+                        headers={"Retry-After": str(RETRY_AFTER)})
+
+
+async def run_in(pool, fn, *args):
+    # run_in_executor doesn't carry context variables over; copy them so the
+    # work is still logged under this request's id
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(pool, context.run, fn, *args)
+
+
+def instrumented(endpoint):
+    # Async counterpart of app.instrumented
+    def wrap(handler):
+        @functools.wraps(handler)
+        async def handle(request):
+            start = time.perf_counter()
+            with request_context(request.headers.get(REQUEST_ID_HEADER),
+                                 wants_trace(request.headers.get(DEBUG_TRACE_HEADER))) as request_id:
+                with REQUESTS_IN_FLIGHT.track_inprogress(endpoint=endpoint):
+                    response = await handler(request)
+                elapsed = time.perf_counter() - start
+                log.info("%s %s", request.method, request.url.path,
+                         extra={"status": response.status_code, "duration_ms": round(elapsed * 1000, 2)})
+            REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=response.status_code)
+            response.headers[REQUEST_ID_HEADER] = request_id
+            return response
+        return handle
+    return wrap
+
+
+def body_response(request, body):
+    # Pre-encoded JSON body, compressed if the client accepts it
+    payload, encoding = compress(body, request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(payload, media_type=JSON_CONTENT_TYPE, headers=headers)
+
+
+def streamed(events, pool, first_pool=None):
+    # Async counterpart of app.streamed. Each step of the event generator may
+    # block (translation calls), so it runs on `pool`, in a copy of this
+    # request's context taken now, while the handler is still inside it. The
+    # first step runs on `first_pool` if given (see chat()).
+    context = contextvars.copy_context()
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        step_pool = first_pool or pool
+        while True:
+            line = await loop.run_in_executor(step_pool, context.run, next, events, None)
+            if line is None:
+                return
+            yield line
+            step_pool = pool
+
+    return StreamingResponse(stream(), media_type=NDJSON_CONTENT_TYPE)
+
+
+async def translate_all(texts):
+    # Every text at once; a failed translation is kept as its exception and
+    # re-raised by the lookup, so translate_details() falls back as usual.
+    results = await asyncio.gather(
+        *(run_in(translate_pool, herbal.translations.translate, text) for text in texts),
+        return_exceptions=True
+    )
+    done = dict(zip(texts, results))
+
+    def lookup(text):
+        result = done[text]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+    return lookup
+
+
+@instrumented("predict")
+async def predict(request):
+    try:
+        async with predict_queue.admit():
+            form = await request.form()
+            file = form.get("image")
+            if file is None or isinstance(file, str):
+                log.info("Error: No image in request.files")
+                return JSONResponse({"error": "No image uploaded"}, status_code=400)
+            if file.filename == '':
+                log.info("Error: Empty filename")
+                return JSONResponse({"error": "No selected file"}, status_code=400)
+
+            log.debug("1. Processing file: %s", file.filename)
+            data = await file.read()
+            tta = herbal.tta_requested(form.get("tta", request.query_params.get("tta")))
+            stream = herbal.stream_requested(form.get("stream", request.query_params.get("stream")),
+                                             request.headers.get("accept"))
+
+            # One content snapshot for the whole request (see content.py)
+            content = herbal.content_store.snapshot()
+            cache_key = herbal.prediction_cache.key(data, herbal.cache_version(content, tta))
+            cached = herbal.prediction_cache.get(cache_key) if herbal.prediction_cache.enabled else None
+            if cached is not None:
+                log.info("Cache hit")
+                if stream:
+                    return streamed(herbal.stream_body(cached), translate_pool)
+                return body_response(request, cached)
+
+            log.debug("2. Getting model...")
+            await run_in(inference_pool, herbal.get_model)
+
+            log.debug("3. Preprocessing image (%d bytes)...", len(data))
+            processed_img = await run_in(herbal.decode_pool, herbal.preprocess_timed, data, tta)
+
+            rejection = herbal.gate_upload(processed_img)
+            if rejection is not None:
+                if herbal.prediction_cache.enabled:
+                    herbal.prediction_cache.put(cache_key, rejection)
+                if stream:
+                    return streamed(herbal.stream_body(rejection), translate_pool)
+                return body_response(request, rejection)
+
+            log.debug("4. Running model prediction...")
+            pred_row = await run_in(inference_pool, herbal.infer, processed_img, tta)
+
+            plant_name, confidence, details, uncertainty = herbal.classify_prediction(content, pred_row)
+            extra = {"tta_views": len(processed_img)} if tta else {}
+            if stream:
+                # The English result goes out at once; the Telugu fields are
+                # translated one after another while the body streams, after
+                # this request has left the admission queue
+                return streamed(herbal.stream_prediction(content, plant_name, confidence, details, uncertainty,
+                                                         cache_key, **extra), translate_pool)
+            with PREDICT_STAGE_SECONDS.time(stage="translation"):
+                # Plants with a stored Telugu fragment need no translation calls
+                lookup = herbal.translations.translate
+                if content.fragments.telugu(plant_name) is None:
+                    lookup = await translate_all(herbal.details_texts(plant_name, details))
+                telugu, translated = herbal.telugu_fragment(content, plant_name, details, translate=lookup)
+            with PREDICT_STAGE_SECONDS.time(stage="serialization"):
+                body = herbal.prediction_body(content, plant_name, telugu, confidence, uncertainty, **extra)
+
+            if translated and herbal.prediction_cache.enabled:
+                herbal.prediction_cache.put(cache_key, body)
+            return body_response(request, body)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        log.exception("!!! PREDICTION ERROR !!!: %s", e)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@instrumented("chat")
+async def chat(request):
+    try:
+        async with chat_queue.admit():
+            data = await request.json()
+            query = data.get("query", "").lower().strip()
+            if herbal.stream_requested(request.query_params.get("stream"), request.headers.get("accept")):
+                # The first step may wait for a concurrent request answering
+                # the same query, so it runs on the flight pool
+                return streamed(herbal.stream_chat_reply(query), chat_pool, flight_pool)
+            # Cached and coalesced like the Flask app (hence the flight pool);
+            # a miss that still needs a live translation (a plant never
+            # translated before) does it there, once per plant
+            reply = await run_in(flight_pool, herbal.chat_reply, query)
+            return JSONResponse(reply)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        log.exception("Chat error: %s", e)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@instrumented("admin_reload")
+async def admin_reload(request):
+    # The rebuild runs on the chat pool, off the event loop
+    body, status = await run_in(chat_pool, herbal.reload_content, request.headers.get(herbal.ADMIN_TOKEN_HEADER))
+    return JSONResponse(body, status_code=status)
+
+
+async def healthz(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def readyz(request):
+    ready, status = herbal.readiness()
+    return JSONResponse(status, status_code=200 if ready else 503)
+
+
+async def stats(request):
+    result = await run_in(chat_pool, herbal.collect_stats)
+    result["admission"] = {"predict": predict_queue.stats(), "chat": chat_queue.stats()}
+    return JSONResponse(result)
+
+
+def collect_admission_metrics():
+    queues = (predict_queue, chat_queue)
+    return [
+        ("herbal_admission_rejected_total", "counter", "Requests refused with 503 by the admission queue",
+         [({"endpoint": q.name, "reason": "queue_full"}, q.rejected) for q in queues]
+         + [({"endpoint": q.name, "reason": "timeout"}, q.timed_out) for q in queues]),
+        ("herbal_admission_waiting", "gauge", "Requests waiting for admission",
+         [({"endpoint": q.name}, q.waiting) for q in queues]),
+    ]
+
+
+metrics_registry.add_collector(collect_admission_metrics)
+
+
+async def metrics(request):
+    body = await run_in(chat_pool, metrics_registry.render)
+    return Response(body, media_type=METRICS_CONTENT_TYPE)
+
+
+routes = [
+    Route("/admin/reload", admin_reload, methods=["POST"]),
+    Route("/healthz", healthz, methods=["GET"]),
+    Route("/readyz", readyz, methods=["GET"]),
+    Route("/stats", stats, methods=["GET"]),
+    Route("/metrics", metrics, methods=["GET"]),
+]
+# Only the endpoints of this process's service (see app.SERVICE_MODE)
+if herbal.SERVES_PREDICT:
+    routes.append(Route("/predict", predict, methods=["POST"]))
+if herbal.SERVES_CHAT:
+    routes.append(Route("/chat", chat, methods=["POST"]))
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve /predict and /chat from an asyncio event loop")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    log.info("Admission: predict %d running + %d queued, chat %d running + %d queued",
+             PREDICT_CONCURRENCY, PREDICT_QUEUE, CHAT_CONCURRENCY, CHAT_QUEUE)
+    # Our own request log replaces uvicorn's access log; uvicorn's other
+    # messages go through the same queued handler
+    uvicorn.run(app, host=args.host, port=args.port, log_config=None, access_log=False)
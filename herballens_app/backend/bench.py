@@ -0,0 +1,334 @@
+"""Reproducible benchmarks and load test for /predict and /chat.
+
+Runs fully offline and in-process: the model is replaced by a small
+deterministic stub (with an optional simulated forward-pass time) and
+GoogleTranslator by a stub translator, so results only depend on our own
+code and the machine.
+
+  * Micro benchmarks: the original and the fast image preprocessing, the
+    test-time augmentation views, the chat scorer (compose_chat_reply), and
+    serializing a /predict response with jsonify and from pre-serialized
+    fragments, and compressing it.
+  * Load test: concurrent /predict and /chat requests against the Flask app
+    (threads, one test client each) or the asyncio app (asgi_app.py),
+    reporting p50/p95/p99 latency, throughput and errors.
+
+Results are written as JSON. Pass a previous result as --baseline to
+compare: any latency more than --tolerance slower, or throughput more than
+--tolerance lower, is reported and the script exits with status 1.
+
+    python bench.py [--target flask|asgi] [--concurrency 16] [--requests 400]
+                    [--model-ms 20] [--translate-ms 0] [--tta]
+                    [--output bench_results.json] [--baseline old.json] [--tolerance 0.10]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+CHAT_QUERIES = [
+    "cough", "fever and headache", "sore throat", "indigestion, gas & bloating", "joint pain",
+    "hair fall", "skin rash and itching", "diabetes", "high blood pressure", "insomnia",
+    "mouth ulcers", "acidity", "cold and cough", "anxiety", "back pain", "something unrelated",
+]
+
+
+class StubModel:
+    """Stands in for an inference backend: deterministic scores, optional fixed cost per batch."""
+    name = "stub"
+    fork_safe = True
+    preprocessing = "raw"
+    preprocessing_source = "stub"
+    load_seconds = 0.0
+
+    def __init__(self, num_classes, batch_ms=0.0, seed=0):
+        rng = np.random.default_rng(seed)
+        self.weights = rng.normal(size=(3, num_classes)).astype(np.float32)
+        self.batch_seconds = batch_ms / 1000
+
+    def load(self):
+        return self
+
+    def predict(self, images):
+        if self.batch_seconds:
+            time.sleep(self.batch_seconds)
+        logits = images.mean(axis=(1, 2)) / 64.0 @ self.weights
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+class StubTranslator:
+    def __init__(self, lang, delay_ms=0.0):
+        self.lang = lang
+        self.delay = delay_ms / 1000
+
+    def translate(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return f"[{self.lang}] {text}"
+
+
+def summarize(latencies_ms):
+    ordered = sorted(latencies_ms)
+    if not ordered:
+        return {}
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered), 3),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def time_calls(fn, runs, warmup=3):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def make_images(count, width, height):
+    from bench_preprocess import make_phone_photo
+    return [make_phone_photo(width, height, seed=i) for i in range(count)]
+
+
+def micro_benchmarks(herbal, images, runs):
+    import image_pipeline
+    from response_fragments import compress
+
+    sample = images[0]
+    decoded = image_pipeline.load_image(sample)
+    views = image_pipeline.new_batch(herbal.TTA_VIEWS)
+    pred_row = herbal.get_model().predict(image_pipeline.preprocess_upload(sample))[0]
+    content = herbal.content_store.current
+    body, _ = herbal.describe_prediction(content, pred_row)
+    result = json.loads(body)
+    plant = result["plant"]
+    telugu, _ = herbal.telugu_fragment(content, plant, content.plant_details(plant))
+    uncertainty = {k: result[k] for k in ("uncertain", "entropy", "calibrated_confidence")}
+    queries = iter(CHAT_QUERIES * (runs // len(CHAT_QUERIES) + 10))
+
+    with herbal.app.app_context():
+        return {
+            "preprocess_image_legacy": time_calls(lambda: image_pipeline.legacy_preprocess_upload(sample), runs),
+            "preprocess_upload": time_calls(lambda: image_pipeline.preprocess_upload(sample), runs),
+            "tta_views": time_calls(lambda: image_pipeline.tta_views(decoded, views, herbal.TTA_CROPS, herbal.TTA_FLIPS), runs),
+            "chat_scorer": time_calls(lambda: herbal.compose_chat_reply(content, next(queries)), runs),
+            "serialize_predict_jsonify": time_calls(lambda: herbal.jsonify(result).get_data(), runs),
+            "serialize_predict_json": time_calls(
+                lambda: herbal.prediction_body(content, plant, telugu, result["confidence"], uncertainty), runs),
+            "compress_predict_gzip": time_calls(lambda: compress(body, "gzip"), runs),
+        }
+
+
+def request_plan(kind, total, images):
+    if kind == "predict":
+        return [("predict", images[i % len(images)]) for i in range(total)]
+    return [("chat", CHAT_QUERIES[i % len(CHAT_QUERIES)]) for i in range(total)]
+
+
+def load_test_flask(herbal, plan, concurrency, predict_fields):
+    local = threading.local()
+
+    def send(item):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = herbal.app.test_client()
+        kind, payload = item
+        start = time.perf_counter()
+        if kind == "predict":
+            r = client.post("/predict", data={"image": (io.BytesIO(payload), "bench.jpg"), **predict_fields})
+        else:
+            r = client.post("/chat", json={"query": payload})
+        return (time.perf_counter() - start) * 1000, r.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, plan))
+    return results, time.perf_counter() - start
+
+
+def load_test_asgi(plan, concurrency, predict_fields):
+    import httpx
+    import asgi_app
+
+    async def run():
+        gate = asyncio.Semaphore(concurrency)
+        transport = httpx.ASGITransport(app=asgi_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def send(item):
+                kind, payload = item
+                async with gate:
+                    start = time.perf_counter()
+                    if kind == "predict":
+                        r = await client.post("/predict", files={"image": ("bench.jpg", payload, "image/jpeg")},
+                                              data=predict_fields)
+                    else:
+                        r = await client.post("/chat", json={"query": payload})
+                    return (time.perf_counter() - start) * 1000, r.status_code
+
+            start = time.perf_counter()
+            results = await asyncio.gather(*(send(item) for item in plan))
+            return results, time.perf_counter() - start
+
+    return asyncio.run(run())
+
+
+def load_report(results, wall_seconds):
+    ok = [ms for ms, status in results if status == 200]
+    return {
+        **summarize(ok),
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(results) / wall_seconds, 2) if wall_seconds else 0.0,
+    }
+
+
+# Figures compared against a baseline; max and p99 of short runs are too noisy
+COMPARED_METRICS = ("p50_ms", "p95_ms", "throughput_rps")
+
+
+def flatten(results):
+    # "section.name.metric" -> value for every compared figure
+    flat = {}
+    for section in ("micro", "load"):
+        for name, figures in results.get(section, {}).items():
+            for metric in COMPARED_METRICS:
+                if metric in figures:
+                    flat[f"{section}.{name}.{metric}"] = figures[metric]
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """Return (regressions, comparisons) between two result documents."""
+    now, before = flatten(current), flatten(baseline)
+    regressions, comparisons = [], []
+    for key in sorted(now.keys() & before.keys()):
+        old, new = before[key], now[key]
+        if not old:
+            continue
+        change = (new - old) / old
+        higher_is_better = key.endswith("throughput_rps")
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        comparisons.append({"metric": key, "baseline": old, "current": new, "change": round(change, 4)})
+        if regressed:
+            regressions.append(comparisons[-1])
+    return regressions, comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks and load test for /predict and /chat")
+    parser.add_argument("--target", choices=["flask", "asgi"], default="flask")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400, help="requests per endpoint in the load test")
+    parser.add_argument("--micro-runs", type=int, default=50)
+    parser.add_argument("--images", type=int, default=8, help="distinct test photos")
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--height", type=int, default=1200)
+    parser.add_argument("--model-ms", type=float, default=20.0, help="simulated forward pass time per batch")
+    parser.add_argument("--translate-ms", type=float, default=0.0, help="simulated live translation time")
+    parser.add_argument("--tta", action="store_true", help="request test-time augmentation on /predict")
+    parser.add_argument("--prediction-cache", action="store_true", help="keep the prediction cache on")
+    parser.add_argument("--chat-cache", action="store_true", help="keep the chat cache on")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    # Everything that would touch the network, the real model or shared
+    # state on disk is isolated before the app is imported
+    workdir = tempfile.mkdtemp(prefix="herbal-bench-")
+    os.environ["HERBAL_TRANSLATIONS_PATH"] = os.path.join(workdir, "translations.sqlite3")
+    os.environ.pop("HERBAL_PREDICTION_CACHE_DIR", None)
+    if not args.prediction_cache:
+        os.environ["HERBAL_PREDICTION_CACHE_MB"] = "0"
+    if not args.chat_cache:
+        os.environ["HERBAL_CHAT_CACHE_SIZE"] = "0"
+    os.environ["HERBAL_EAGER_LOAD"] = "0"
+    os.environ.setdefault("HERBAL_LOG_LEVEL", "WARNING")
+    os.environ.setdefault("HERBAL_LOG_DEBUG_SAMPLE_RATE", "0")
+
+    import app as herbal
+
+    herbal.model = StubModel(len(herbal.content_store.current.class_names), batch_ms=args.model_ms)
+    herbal.translations.translator_factory = lambda lang: StubTranslator(lang, args.translate_ms)
+
+    print(f"Generating {args.images} test photos ({args.width}x{args.height})...")
+    images = make_images(args.images, args.width, args.height)
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": vars(args),
+    }
+
+    if not args.skip_micro:
+        print("Running micro benchmarks...")
+        results["micro"] = micro_benchmarks(herbal, images, args.micro_runs)
+
+    if not args.skip_load:
+        results["load"] = {}
+        predict_fields = {"tta": "1"} if args.tta else {}
+        for kind in ("predict", "chat"):
+            print(f"Load test: {args.requests} {kind} requests, concurrency {args.concurrency} ({args.target})...")
+            plan = request_plan(kind, args.requests, images)
+            if args.target == "asgi":
+                raw, wall = load_test_asgi(plan, args.concurrency, predict_fields)
+            else:
+                raw, wall = load_test_flask(herbal, plan, args.concurrency, predict_fields)
+            results["load"][kind] = load_report(raw, wall)
+        results["batcher"] = herbal.batcher.stats()
+        results["chat_cache"] = herbal.chat_cache.stats()
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions, comparisons = compare(results, baseline, args.tolerance)
+        results["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance,
+                                 "regressions": regressions, "metrics": comparisons}
+        status = 1 if regressions else 0
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for section in ("micro", "load"):
+        for name, figures in results.get(section, {}).items():
+            line = ", ".join(f"{k}={v}" for k, v in figures.items() if k in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "errors"))
+            print(f"  {section:5} {name:<24} {line}")
+    if args.baseline:
+        for r in results["comparison"]["regressions"]:
+            print(f"REGRESSION {r['metric']}: {r['baseline']} -> {r['current']} ({r['change']:+.1%})")
+        print("No regressions." if not status else f"{len(results['comparison']['regressions'])} regression(s).")
+    print(f"Results written to {args.output}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Compare the original and the fast image preprocessing pipelines.
+
+Generates a large synthetic phone photo (a 12 MP JPEG with an EXIF rotation),
+runs both pipelines from image_pipeline.py over it and reports latency and
+peak memory. Each pipeline runs in its own process so the peak RSS of one
+does not hide the other's.
+
+    python bench_preprocess.py [--runs 20] [--width 4032 --height 3024]
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+import image_pipeline
+
+PIPELINES = {
+    "legacy": image_pipeline.legacy_preprocess_upload,
+    "fast": image_pipeline.preprocess_upload,
+}
+
+
+def make_phone_photo(width, height, seed=0):
+    # Smooth gradients plus noise compress like a real photo rather than a flat colour
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = np.stack(np.broadcast_arrays(120 * x + 60 * y, 180 * y + 40 + 0 * x, 90 * (1 - x) + 30 * y), axis=-1)
+    noise = rng.normal(0, 12, size=(height, width, 3))
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotated 90 degrees, as most portrait phone shots are stored
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=90, exif=exif)
+    return buf.getvalue()
+
+
+def max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_pipeline(name, data, runs, results):
+    pipeline = PIPELINES[name]
+    baseline_rss = max_rss_mb()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        pipeline(data)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    results[name] = {
+        "runs": runs,
+        "mean_ms": round(statistics.mean(timings), 2),
+        "p50_ms": round(timings[len(timings) // 2], 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "peak_rss_delta_mb": round(max_rss_mb() - baseline_rss, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the original and the fast image preprocessing pipelines")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    args = parser.parse_args()
+
+    print(f"Generating {args.width}x{args.height} JPEG...")
+    data = make_phone_photo(args.width, args.height)
+    print(f"  {len(data) / 1e6:.1f} MB")
+
+    manager = multiprocessing.Manager()
+    results = manager.dict()
+    for name in PIPELINES:
+        proc = multiprocessing.Process(target=run_pipeline, args=(name, data, args.runs, results))
+        proc.start()
+        proc.join()
+
+    results = dict(results)
+    print(json.dumps(results, indent=2))
+    print(f"Speed-up (mean): {results['legacy']['mean_ms'] / results['fast']['mean_ms']:.1f}x")
+
+    # The model sees slightly different pixels; show how far apart they are
+    legacy_out = image_pipeline.legacy_preprocess_upload(data)
+    fast_out = image_pipeline.preprocess_upload(data)
+    print(f"Mean absolute pixel difference: {np.abs(legacy_out - fast_out).mean():.2f} (0-255 scale)")
@@ -0,0 +1,180 @@
+"""Result cache for /chat, keyed by the normalized query.
+
+Most chat traffic is a small set of queries (the frontend suggestions,
+voice input of common symptoms), and "Cough and cold", "cold, cough" and
+"cough and cold" all rank the same plants. Replies are cached under the
+query's language and its sorted, de-duplicated parts, in an LRU whose
+entries also expire after a TTL so stale replies don't outlive content
+edits forever.
+
+Concurrent misses for the same key are coalesced: the first request
+computes the reply and the others wait for its result instead of repeating
+the work (single flight). A waiter gives up after a timeout and computes
+the reply itself, so a slow leader (a streamed reply still translating,
+a slow client) never holds other requests up for long.
+
+Only complete replies are stored; one whose Telugu text fell back to
+English is recomputed next time so the translation is retried.
+
+Configuration (environment variables):
+    HERBAL_CHAT_CACHE_SIZE   number of cached replies (default 1024, 0 disables)
+    HERBAL_CHAT_CACHE_TTL    seconds a cached reply is served (default 3600)
+    HERBAL_CHAT_CACHE_WAIT   seconds a request waits for a concurrent identical one (default 10)
+"""
+import collections
+import os
+import re
+import threading
+import time
+
+CHAT_CACHE_SIZE = int(os.environ.get("HERBAL_CHAT_CACHE_SIZE", "1024"))
+CHAT_CACHE_TTL = float(os.environ.get("HERBAL_CHAT_CACHE_TTL", "3600"))
+CHAT_CACHE_WAIT = float(os.environ.get("HERBAL_CHAT_CACHE_WAIT", "10"))
+
+_TELUGU = re.compile("[\u0c00-\u0c7f]")
+
+
+def query_language(query):
+    return "te" if _TELUGU.search(query) else "en"
+
+
+def normalized_key(query, parts):
+    # `parts` are the query's condition parts as /chat splits them; their
+    # order and repetition don't change the reply
+    return query_language(query), tuple(sorted(set(parts)))
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ChatCache:
+    def __init__(self, max_entries=CHAT_CACHE_SIZE, ttl=CHAT_CACHE_TTL, wait_timeout=CHAT_CACHE_WAIT):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        # key -> (reply, expires_at)
+        self._entries = collections.OrderedDict()
+        self._inflight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.wait_timeouts = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get_or_compute(self, key, compute):
+        """Return the cached reply for `key`, or compute() it once for all concurrent callers.
+
+        compute() returns (reply, cacheable).
+        """
+        reply, flight, leader = self.begin(key)
+        if reply is not None:
+            return reply
+        if not leader:
+            # None if the leader gave up without a reply (a streamed one whose
+            # client left) or took too long
+            reply = self.wait(flight)
+            return reply if reply is not None else compute()[0]
+
+        try:
+            reply, cacheable = compute()
+        except Exception as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, reply, cacheable)
+        return reply
+
+    def begin(self, key):
+        """Look up `key` for a caller that builds the reply in steps (streamed /chat).
+
+        Returns (reply, flight, leader). On a hit reply is the cached reply.
+        On a miss a leader computes the reply and must always finish() the
+        flight; any other caller wait()s on it for the leader's reply.
+        """
+        if not self.enabled:
+            return None, None, True
+
+        with self._lock:
+            reply = self._fresh(key)
+            if reply is not None:
+                self.hits += 1
+                return reply, None, False
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return None, flight, False
+            flight = self._inflight[key] = _Flight()
+            self.misses += 1
+            return None, flight, True
+
+    def wait(self, flight):
+        """The leader's reply, or None if it finished without one or not within wait_timeout."""
+        if not flight.done.wait(self.wait_timeout):
+            with self._lock:
+                self.wait_timeouts += 1
+            return None
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def finish(self, key, flight, reply=None, cacheable=False, error=None):
+        """Hand the leader's reply (or error) to its waiters, storing it if cacheable."""
+        if flight is None:
+            return
+        flight.value = reply
+        flight.error = error
+        with self._lock:
+            del self._inflight[key]
+            if error is None and cacheable:
+                self._store(key, reply)
+        flight.done.set()
+
+    def _fresh(self, key):
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry[0]
+        del self._entries[key]
+        self.expired += 1
+        return None
+
+    def _store(self, key, reply):
+        # Caller holds the lock
+        self._entries[key] = (reply, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "expired": self.expired,
+                "wait_timeouts": self.wait_timeouts,
+                # Coalesced requests were answered without their own computation too
+                "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
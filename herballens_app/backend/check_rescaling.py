@@ -1,5 +1,6 @@
 import tensorflow as tf
 import os
+from inference_backend import detect_preprocessing
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "herbal_model.keras")
@@ -8,6 +9,8 @@ try:
     model = tf.keras.models.load_model(MODEL_PATH, compile=False)
     has_rescaling = any("rescaling" in layer.name.lower() for layer in model.layers)
     print(f"Has rescaling layer: {has_rescaling}")
+    mode, source = detect_preprocessing(MODEL_PATH, model)
+    print(f"Preprocessing the server will use: {mode} (from {source})")
     for layer in model.layers[:10]:
         print(f"Layer: {layer.name}, Type: {type(layer)}")
 except Exception as e:
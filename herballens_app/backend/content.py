@@ -0,0 +1,268 @@
+"""Hot reload of plant_info.json and class_indices.json.
+
+Everything the app derives from the two files (class names, plant details,
+the /chat benefit index, the pre-serialized response fragments) lives in one
+Content snapshot. Requests take the current snapshot once and use only it,
+so a request that started before a reload finishes against the old version
+and never mixes old class names with new details.
+
+A reload reads and validates both files, builds a complete new snapshot on
+the reloading thread (never on a request), then publishes it with a single
+reference swap. Invalid files are rejected with the reason and the current
+snapshot stays in place. Each published snapshot has a generation number
+(1 at startup, +1 per reload) and a digest of the two files; cached
+responses are keyed by the digest, so nothing cached for old content is
+served for new content, even by another worker sharing the disk cache.
+
+Reloads are triggered by:
+
+  * the file watcher: a thread polls both files' size and mtime and reloads
+    once a change has settled (the files are unchanged over two polls, so a
+    half-written file isn't picked up);
+  * POST /admin/reload with the X-Admin-Token header. It reloads the process
+    that answers it; under serve.py every worker has its own watcher, which
+    is what reloads them all.
+
+The watcher is started on first use in each process, so workers forked by
+serve.py each run their own.
+
+The class count must not change: it is the width of the model's output
+layer, and a new class needs a new model (and a restart) anyway.
+
+Configuration (environment variables):
+    HERBAL_CONTENT_WATCH_SECONDS  how often the files are polled for changes, 0 disables (default 5)
+    HERBAL_ADMIN_TOKEN            token required by POST /admin/reload (the endpoint is off without one)
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger("herbal.content")
+
+CONTENT_WATCH_SECONDS = float(os.environ.get("HERBAL_CONTENT_WATCH_SECONDS", "5"))
+ADMIN_TOKEN = os.environ.get("HERBAL_ADMIN_TOKEN", "")
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+# Details served for plants plant_info.json doesn't cover yet
+PLACEHOLDER_DETAILS = {
+    "scientific_name": "Information not available",
+    "description": "We are currently gathering more details about this specific herbal plant.",
+    "benefits": ["General medicinal properties"]
+}
+
+
+class ContentError(ValueError):
+    pass
+
+
+def parse_class_indices(class_indices):
+    # Some JSONs have "0": "Name", others "Name": 0; returns {index: name}
+    if not isinstance(class_indices, dict) or not class_indices:
+        raise ContentError("class_indices.json must be a non-empty object")
+    try:
+        if isinstance(list(class_indices.keys())[0], str) and isinstance(list(class_indices.values())[0], int):
+            class_names = {int(v): k for k, v in class_indices.items()}
+        else:
+            class_names = {int(k): v for k, v in class_indices.items()}
+    except (TypeError, ValueError) as e:
+        raise ContentError(f"class_indices.json has a non-integer index: {e}")
+    if sorted(class_names) != list(range(len(class_indices))):
+        raise ContentError(f"class_indices.json indices must be 0..{len(class_indices) - 1}, each once")
+    names = list(class_names.values())
+    if not all(isinstance(name, str) and name for name in names):
+        raise ContentError("class_indices.json has an empty or non-string class name")
+    if len(set(names)) != len(names):
+        raise ContentError("class_indices.json names a class twice")
+    return class_names
+
+
+def validate_plant_info(plant_info):
+    if not isinstance(plant_info, dict):
+        raise ContentError("plant_info.json must be an object of plant name -> details")
+    for plant_name, details in plant_info.items():
+        if not isinstance(details, dict):
+            raise ContentError(f"plant_info.json: {plant_name!r} must be an object")
+        for field in ("scientific_name", "description"):
+            if not isinstance(details.get(field, ""), str):
+                raise ContentError(f"plant_info.json: {plant_name!r} {field} must be a string")
+        benefits = details.get("benefits", [])
+        if not isinstance(benefits, list) or not all(isinstance(b, str) for b in benefits):
+            raise ContentError(f"plant_info.json: {plant_name!r} benefits must be a list of strings")
+    return plant_info
+
+
+def read_json(path):
+    # Returns (parsed, raw bytes); the bytes feed the content digest
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        return json.loads(raw), raw
+    except ValueError as e:
+        raise ContentError(f"{os.path.basename(path)} is not valid JSON: {e}")
+
+
+class Content:
+    """One version of the two files and everything derived from them."""
+
+    def __init__(self, class_names, plant_info, digest, generation=1):
+        self.class_names = class_names
+        self.plant_info = plant_info
+        self.digest = digest
+        self.generation = generation
+        self.loaded_at = time.time()
+        # Derived structures, filled in by the app's builder before the
+        # snapshot is published
+        self.plant_index = None
+        self.fragments = None
+        self.chat_fragments = None
+
+    def plant_details(self, plant_name):
+        # English details served for a plant, with a placeholder for plants
+        # plant_info.json doesn't cover yet
+        return self.plant_info.get(plant_name, PLACEHOLDER_DETAILS)
+
+    def status(self):
+        missing = [name for name in self.class_names.values() if name not in self.plant_info]
+        return {
+            "generation": self.generation,
+            "digest": self.digest,
+            "loaded_at": round(self.loaded_at, 3),
+            "classes": len(self.class_names),
+            "plants": len(self.plant_info),
+            "classes_without_details": len(missing),
+        }
+
+
+class ContentStore:
+    def __init__(self, class_indices_path, plant_info_path, build, on_reload=None, watch_seconds=CONTENT_WATCH_SECONDS):
+        # build(content) fills in a snapshot's derived structures; on_reload(content)
+        # runs after a new one is published
+        self.class_indices_path = class_indices_path
+        self.plant_info_path = plant_info_path
+        self.build = build
+        self.on_reload = on_reload
+        self.watch_seconds = watch_seconds
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+        self._watcher_lock = threading.Lock()
+
+        self.current = None
+        self.reloads = 0
+        self.rejected = 0
+        self.last_error = None
+
+    def read(self, generation, require_plant_info=True):
+        """Read and validate both files into an unbuilt Content."""
+        class_indices, class_raw = read_json(self.class_indices_path)
+        class_names = parse_class_indices(class_indices)
+        try:
+            plant_info, info_raw = read_json(self.plant_info_path)
+            validate_plant_info(plant_info)
+        except (OSError, ContentError) as e:
+            if require_plant_info:
+                raise
+            # At startup the app has always run (with placeholders) without it
+            log.warning("Note: Could not load plant_info.json: %s", e)
+            plant_info, info_raw = {}, b""
+        if self.current is not None and len(class_names) != len(self.current.class_names):
+            raise ContentError(f"class_indices.json has {len(class_names)} classes, the model has "
+                               f"{len(self.current.class_names)}; a new class needs a new model")
+        digest = hashlib.sha256(class_raw + b"\0" + info_raw).hexdigest()[:12]
+        return Content(class_names, plant_info, digest, generation)
+
+    def load(self):
+        # Initial snapshot, at startup
+        content = self.read(1, require_plant_info=False)
+        self.build(content)
+        self.current = content
+        self._signature = self.signature()
+        return content
+
+    def signature(self):
+        # Cheap change detection for the watcher
+        stamp = []
+        for path in (self.class_indices_path, self.plant_info_path):
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_size, st.st_mtime_ns))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def reload(self, reason="manual"):
+        """Build and publish a new snapshot; returns (swapped, status)."""
+        with self._reload_lock:
+            previous = self.current
+            start = time.perf_counter()
+            # What the watcher compares against, so it doesn't repeat this reload
+            self._signature = self.signature()
+            try:
+                content = self.read(previous.generation + 1)
+                if content.digest == previous.digest:
+                    return False, {"reloaded": False, "reason": "unchanged", "content": previous.status()}
+                self.build(content)
+            except Exception as e:
+                # Anything else malformed content trips over while building
+                # is rejected the same way, not left to escape as a 500
+                self.rejected += 1
+                self.last_error = str(e) if isinstance(e, (OSError, ContentError)) else f"{type(e).__name__}: {e}"
+                log.warning("Content reload (%s) rejected: %s", reason, self.last_error)
+                return False, {"reloaded": False, "error": self.last_error, "content": previous.status()}
+
+            # The swap: requests that already hold `previous` keep using it
+            self.current = content
+            self.reloads += 1
+            self.last_error = None
+            if self.on_reload is not None:
+                self.on_reload(content)
+            elapsed = time.perf_counter() - start
+            log.info("Content reloaded (%s)", reason, extra={"generation": content.generation,
+                                                              "digest": content.digest,
+                                                              "build_ms": round(elapsed * 1000, 2)})
+            return True, {"reloaded": True, "build_ms": round(elapsed * 1000, 2), "content": content.status()}
+
+    def snapshot(self):
+        """The current snapshot; also makes sure this process is watching the files."""
+        if self.watch_seconds > 0 and self._watcher_pid != os.getpid():
+            self._start_watcher()
+        return self.current
+
+    def _start_watcher(self):
+        with self._watcher_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+            self._watcher = threading.Thread(target=self._watch, name="content-watcher", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        pending = None
+        while True:
+            time.sleep(self.watch_seconds)
+            signature = self.signature()
+            if signature == self._signature:
+                pending = None
+                continue
+            # Wait until the files stop changing before reading them
+            if signature != pending:
+                pending = signature
+                continue
+            self._signature = signature
+            pending = None
+            try:
+                self.reload("file change")
+            except Exception as e:
+                log.exception("Content reload failed: %s", e)
+
+    def status(self):
+        return {
+            **self.current.status(),
+            "reloads": self.reloads,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+            "watch_seconds": self.watch_seconds,
+        }
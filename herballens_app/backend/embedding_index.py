@@ -0,0 +1,220 @@
+"""Look-alike search over the classifier's penultimate-layer embeddings.
+
+The input of the final Dense layer (512 floats) is a compact description of
+a photo that the classifier itself learned. An index of such vectors lets
+/similar answer "which plants, and which reference photos, does this look
+like" with a dot product instead of another model.
+
+Rows of the index, all L2-normalized so a dot product is cosine similarity:
+
+  * one prototype per class (classes first, in class-index order): the mean
+    embedding of that class's reference photos, or, for classes without
+    photos, the class's column of the final Dense kernel, which points the
+    way the classifier scores that class;
+  * one row per reference photo, if the index was built from photos.
+
+Vectors are stored as float16 in a .npy file (metadata in a .json file next
+to it) and opened with mmap_mode="r", so workers forked by serve.py and
+separate processes all read the same pages from the OS page cache instead
+of each holding a copy. At this size (86 classes plus a few thousand photos)
+an exact scan takes well under a millisecond, so there is no quantizer or
+approximate index to tune.
+
+Build the index offline, next to the model:
+
+    python embedding_index.py --images DIR     # DIR/<plant name>/*.jpg
+    python embedding_index.py                  # classifier prototypes only
+
+Configuration (environment variables):
+    HERBAL_EMBEDDING_INDEX  index path without extension (default herbal_embeddings)
+"""
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+log = logging.getLogger("herbal.embedding_index")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EMBEDDING_INDEX_PATH = os.environ.get("HERBAL_EMBEDDING_INDEX", os.path.join(BASE_DIR, "herbal_embeddings"))
+
+# Rows converted to float32 at a time during a search, bounding the scratch memory
+SEARCH_CHUNK_ROWS = 4096
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def model_fingerprint(model_path):
+    # Same size-mtime scheme as app.get_model_version(), minus the backend:
+    # every backend embeds into the same space
+    try:
+        st = os.stat(model_path)
+        return f"{st.st_size}-{int(st.st_mtime)}"
+    except OSError:
+        return None
+
+
+def top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class EmbeddingIndex:
+    def __init__(self, vectors, meta):
+        self.vectors = vectors
+        self.meta = meta
+        self.classes = meta["classes"]
+        self.images = meta.get("images", [])
+        if vectors.shape[0] != len(self.classes) + len(self.images):
+            raise ValueError(f"Index has {vectors.shape[0]} rows for {len(self.classes)} classes "
+                             f"and {len(self.images)} images")
+
+    @classmethod
+    def load(cls, path=EMBEDDING_INDEX_PATH):
+        with open(path + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(np.load(path + ".npy", mmap_mode="r"), meta)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def matches_model(self, model_path):
+        return self.meta.get("model") == model_fingerprint(model_path)
+
+    def scores(self, embedding):
+        query = normalize(embedding).reshape(-1)
+        if query.shape[0] != self.dim:
+            raise ValueError(f"Embedding has {query.shape[0]} dimensions, index has {self.dim}")
+        out = np.empty(self.vectors.shape[0], dtype=np.float32)
+        for start in range(0, len(out), SEARCH_CHUNK_ROWS):
+            chunk = self.vectors[start:start + SEARCH_CHUNK_ROWS]
+            out[start:start + len(chunk)] = chunk.astype(np.float32) @ query
+        return out
+
+    def search(self, embedding, k=5):
+        """Return (plants, images): the k nearest class prototypes and reference photos."""
+        scores = self.scores(embedding)
+        class_scores, image_scores = scores[:len(self.classes)], scores[len(self.classes):]
+        plants = [{"plant": self.classes[i], "similarity": round(float(class_scores[i]), 4)}
+                  for i in top_k(class_scores, k)]
+        images = [{**self.images[i], "similarity": round(float(image_scores[i]), 4)}
+                  for i in top_k(image_scores, k)]
+        return plants, images
+
+    def stats(self):
+        return {
+            "classes": len(self.classes),
+            "images": len(self.images),
+            "dim": self.dim,
+            "bytes": int(self.vectors.nbytes),
+            "source": self.meta.get("source"),
+        }
+
+
+def save_index(path, vectors, meta):
+    """Write the .npy and .json atomically (readers never see half an index)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    vectors = normalize(vectors).astype(np.float16)
+    meta = {**meta, "dim": int(vectors.shape[1]), "dtype": "float16"}
+    for suffix, write in ((".npy", lambda f: np.save(f, vectors)),
+                          (".json", lambda f: f.write(json.dumps(meta, indent=2, ensure_ascii=False).encode("utf-8")))):
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path + suffix)
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def reference_photos(images_dir, class_names, per_class):
+    # DIR/<plant name>/<photo>, only folders named after a known class
+    known = set(class_names)
+    photos = []
+    for plant in sorted(os.listdir(images_dir)):
+        folder = os.path.join(images_dir, plant)
+        if plant not in known or not os.path.isdir(folder):
+            continue
+        names = [n for n in sorted(os.listdir(folder)) if n.lower().endswith((".jpg", ".jpeg", ".png"))]
+        photos.extend((plant, os.path.join(plant, n)) for n in names[:per_class])
+    return photos
+
+
+def build_index(backend, class_names, images_dir=None, per_class=20, batch_size=16):
+    """Return (vectors, meta) for class_names (list in class-index order)."""
+    from image_pipeline import preprocess_upload
+    from inference_backend import apply_preprocessing
+
+    kernel, _ = backend.classifier_weights()
+    prototypes = normalize(np.asarray(kernel).T)
+    sources = ["classifier"] * len(class_names)
+
+    photos = reference_photos(images_dir, class_names, per_class) if images_dir else []
+    embeddings = []
+    for start in range(0, len(photos), batch_size):
+        chunk = photos[start:start + batch_size]
+        batch = np.concatenate([preprocess_upload(read_bytes(os.path.join(images_dir, p))) for _, p in chunk])
+        embeddings.append(normalize(backend.embed(apply_preprocessing(batch, backend.preprocessing))))
+        log.info("Embedded %d/%d reference photos", start + len(chunk), len(photos))
+    embeddings = np.concatenate(embeddings) if embeddings else np.empty((0, prototypes.shape[1]), np.float32)
+
+    # Classes with photos use the centroid of their embeddings instead
+    for i, plant in enumerate(class_names):
+        rows = [j for j, (p, _) in enumerate(photos) if p == plant]
+        if rows:
+            prototypes[i] = embeddings[rows].mean(axis=0)
+            sources[i] = "photos"
+
+    meta = {
+        "classes": list(class_names),
+        "prototypes": sources,
+        "images": [{"plant": p, "image": path} for p, path in photos],
+        "source": "photos" if photos else "classifier",
+        "model": model_fingerprint(backend.model_path),
+    }
+    return np.concatenate([prototypes, embeddings]), meta
+
+
+def load_class_names(path):
+    # Same two layouts app.py accepts ({"Name": 0} or {"0": "Name"}), as a list by index
+    with open(path) as f:
+        class_indices = json.load(f)
+    if isinstance(next(iter(class_indices.values())), int):
+        by_index = {int(v): k for k, v in class_indices.items()}
+    else:
+        by_index = {int(k): v for k, v in class_indices.items()}
+    return [by_index[i] for i in sorted(by_index)]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from inference_backend import KerasBackend
+
+    parser = argparse.ArgumentParser(description="Build the embedding index used by /similar")
+    parser.add_argument("--images", help="reference photos, one folder per plant (default: classifier prototypes only)")
+    parser.add_argument("--per-class", type=int, default=20, help="reference photos kept per plant")
+    parser.add_argument("--class-indices", default=os.path.join(BASE_DIR, "class_indices.json"))
+    parser.add_argument("--output", default=EMBEDDING_INDEX_PATH, help="index path without extension")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # Always built from the full-precision model; quantized backends embed
+    # into the same space closely enough for nearest-neighbour search
+    backend = KerasBackend().load()
+    vectors, meta = build_index(backend, load_class_names(args.class_indices), args.images, args.per_class)
+    save_index(args.output, vectors, meta)
+    print(f"Wrote {vectors.shape[0]} x {vectors.shape[1]} float16 vectors "
+          f"({len(meta['classes'])} classes, {len(meta['images'])} photos) to {args.output}.npy")
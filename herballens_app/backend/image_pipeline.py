@@ -0,0 +1,167 @@
+"""Image decoding and preprocessing for the classifier.
+
+The fast path decodes uploads as close to the model's input size as the file
+format allows, instead of decoding a 12 MP phone photo at full resolution and
+resizing it down:
+
+  * JPEGs are opened in draft mode, which lets libjpeg decode at 1/2, 1/4 or
+    1/8 scale (never below the requested size) and straight to RGB.
+  * The EXIF orientation is read from the header and applied with a plain
+    transpose of the already-reduced image, without ImageOps.exif_transpose
+    copying metadata around.
+  * The image is converted to RGB at most once and the 224x224 result is
+    written directly into a caller-provided float32 buffer, so a batch can be
+    filled in place.
+
+For test-time augmentation, tta_views() fills a batch with several views of
+one decoded image (the usual squashed frame plus square crops along the long
+side, each optionally mirrored) so the model can score them in a single
+forward pass.
+
+preprocess_image() is the original pipeline, kept for scripts and for the
+comparison in bench_preprocess.py.
+"""
+import io
+
+import numpy as np
+from PIL import Image, ImageOps
+
+TARGET_SIZE = (224, 224)
+
+# EXIF orientation tag and the transpose that undoes each orientation value
+_ORIENTATION_TAG = 0x0112
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def open_image(data):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = io.BytesIO(data)
+    return Image.open(data)
+
+
+def load_image(data, min_size=TARGET_SIZE):
+    """Decode an upload to an upright RGB image at least `min_size` large (when possible)."""
+    return decode_upload(data, min_size)[0]
+
+
+def decode_upload(data, min_size=TARGET_SIZE):
+    """Like load_image(), also returning whether the reduced-resolution decode applied.
+
+    Only JPEGs can be decoded at reduced size; everything else falls back to
+    a full-resolution decode.
+    """
+    image = open_image(data)
+    reduced = False
+    try:
+        orientation = image.getexif().get(_ORIENTATION_TAG, 1)
+    except Exception:
+        orientation = 1
+
+    if image.format == "JPEG":
+        # Orientations 5-8 are stored rotated by 90 degrees, so the size we
+        # need in stored pixels has width and height swapped.
+        draft_size = (min_size[1], min_size[0]) if orientation in (5, 6, 7, 8) else min_size
+        reduced = image.draft("RGB", draft_size) is not None
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    else:
+        image.load()
+
+    transpose = _ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose is not None:
+        image = image.transpose(transpose)
+    return image, reduced
+
+
+def resize_into(image, out, target_size=TARGET_SIZE):
+    """Squash-resize `image` to `target_size` and write it into the float32 array `out`."""
+    # Many models are trained with simple squashing to (224, 224) rather
+    # than aspect-ratio padding.
+    resized = image.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    out[...] = np.asarray(resized)
+    return out
+
+
+def new_batch(n=1):
+    return np.empty((n, *TARGET_SIZE[::-1], 3), dtype=np.float32)
+
+
+def square_crops(image, count=3):
+    """Boxes of `count` side-length squares spread evenly along the long side."""
+    width, height = image.size
+    side = min(width, height)
+    slack = max(width, height) - side
+    offsets = [round(slack * i / (count - 1)) for i in range(count)] if count > 1 else [slack // 2]
+    if width >= height:
+        return [(x, 0, x + side, side) for x in offsets]
+    return [(0, y, side, y + side) for y in offsets]
+
+
+def tta_view_count(crops=3, flips=True):
+    return (1 + crops) * (2 if flips else 1)
+
+
+def tta_views(image, out, crops=3, flips=True):
+    """Write the test-time augmentation views of `image` into `out`.
+
+    `out` is a (tta_view_count(crops, flips), 224, 224, 3) float32 batch:
+    the squash-resized frame, then `crops` square crops from one end of the
+    long side to the other (so an off-centre leaf fills one of them), and,
+    with `flips`, the horizontal mirror of each.
+    """
+    resize_into(image, out[0])
+    for i, box in enumerate(square_crops(image, crops), start=1):
+        crop = image.resize(TARGET_SIZE, Image.Resampling.LANCZOS, box=box, reducing_gap=3.0)
+        out[i] = np.asarray(crop)
+    if flips:
+        # Mirroring the already-resized views is the same as resizing a mirrored crop
+        n = 1 + crops
+        out[n:2 * n] = out[:n, :, ::-1]
+    return out
+
+
+def preprocess_upload(data, out=None):
+    """Decode and preprocess raw upload bytes into a (1, 224, 224, 3) float32 array.
+
+    `out` may be a preallocated (224, 224, 3) float32 slot of a batch buffer.
+    """
+    if out is None:
+        batch = new_batch(1)
+        resize_into(load_image(data), batch[0])
+        return batch
+    return resize_into(load_image(data), out)
+
+
+def preprocess_image(image):
+    # Original pipeline: full-resolution decode, EXIF transpose, LANCZOS resize
+    # 1. Handle EXIF orientation (important for mobile uploads)
+    image = ImageOps.exif_transpose(image)
+
+    # 2. Convert to RGB
+    image = image.convert("RGB")
+
+    # 3. Standard Preprocessing: squash to (224, 224)
+    image = image.resize(TARGET_SIZE, Image.Resampling.LANCZOS)
+
+    img_array = np.array(image).astype(np.float32)
+
+    # Expand dims to (1, 224, 224, 3)
+    img_array = np.expand_dims(img_array, axis=0)
+
+    # Note: Our model summary shows a Rescaling layer,
+    # so we should NOT divide by 255 manually here.
+    return img_array
+
+
+def legacy_preprocess_upload(data):
+    # What /predict used to do with an upload, end to end
+    return preprocess_image(open_image(data).convert("RGB"))
@@ -0,0 +1,363 @@
+"""Pluggable inference backends for the plant classifier.
+
+The backend is picked at startup with HERBAL_INFERENCE_BACKEND:
+
+    keras        full-precision herbal_model.keras through tf.keras (default)
+    tflite-fp16  float16-weight TFLite conversion of the same model
+    tflite-int8  dynamic-range int8 TFLite conversion of the same model
+
+TFLite conversions are cached next to the Keras model
+(herbal_model.fp16.tflite / herbal_model.int8.tflite) and rebuilt whenever
+the Keras file is newer. They run on tflite_runtime when it is installed,
+otherwise on the interpreter bundled with TensorFlow.
+
+Every backend exposes load(), predict(batch) -> numpy probabilities and
+embed(batch) -> the penultimate-layer features (the input of the final
+classification layer, used by embedding_index.py), and after load() a
+`preprocessing` mode saying how raw 0-255 pixels must be
+scaled before they go into the model:
+
+    raw        pass pixels through unchanged (the model rescales internally)
+    unit       divide by 255
+    symmetric  scale to [-1, 1]
+
+The mode is decided once per process: an explicit "preprocessing" entry in
+the model's sidecar metadata file (herbal_model.json) wins; otherwise the
+Keras model is inspected for a Rescaling layer the way check_rescaling.py
+does. EfficientNet models normalize internally and their preprocess_input
+is a pass-through, so "raw" is also the default when nothing is found.
+
+Check that a TFLite backend agrees with Keras before deploying it:
+
+    python inference_backend.py --backend tflite-int8 [--samples DIR]
+
+Configuration (environment variables):
+    HERBAL_INFERENCE_BACKEND  one of the names above (default keras)
+    HERBAL_TFLITE_THREADS     interpreter threads (default: TFLite's choice)
+"""
+import importlib.util
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger("herbal.inference")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "herbal_model.keras")
+INFERENCE_BACKEND = os.environ.get("HERBAL_INFERENCE_BACKEND", "keras")
+TFLITE_THREADS = int(os.environ["HERBAL_TFLITE_THREADS"]) if os.environ.get("HERBAL_TFLITE_THREADS") else None
+
+
+PREPROCESSING_MODES = ("raw", "unit", "symmetric")
+
+
+def metadata_path(model_path):
+    return f"{os.path.splitext(model_path)[0]}.json"
+
+
+def read_model_metadata(model_path):
+    try:
+        with open(metadata_path(model_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def has_rescaling_layer(model):
+    # Walk nested models too: a wrapped EfficientNet keeps its Rescaling
+    # layer inside the base model rather than at the top level.
+    for layer in getattr(model, "layers", []):
+        if type(layer).__name__ == "Rescaling" or "rescaling" in layer.name.lower():
+            return True
+        if has_rescaling_layer(layer):
+            return True
+    return False
+
+
+def detect_preprocessing(model_path, keras_model=None):
+    """Return (mode, source) describing how inputs must be preprocessed."""
+    mode = read_model_metadata(model_path).get("preprocessing")
+    if mode:
+        if mode not in PREPROCESSING_MODES:
+            raise ValueError(f"Unknown preprocessing '{mode}' in {metadata_path(model_path)}")
+        return mode, "metadata"
+    if keras_model is not None and has_rescaling_layer(keras_model):
+        return "raw", "rescaling layer"
+    return "raw", "default"
+
+
+def apply_preprocessing(images, mode):
+    if mode == "unit":
+        return images / 255.0
+    if mode == "symmetric":
+        return images / 127.5 - 1.0
+    return images
+
+
+def configure_tf_threads(tf):
+    # Worker processes set TF_NUM_INTRAOP_THREADS / TF_NUM_INTEROP_THREADS
+    # (see serve.py) so N workers don't each spin up a thread per core.
+    # This only takes effect before TensorFlow has run any op.
+    intra = os.environ.get("TF_NUM_INTRAOP_THREADS")
+    inter = os.environ.get("TF_NUM_INTEROP_THREADS")
+    try:
+        if intra:
+            tf.config.threading.set_intra_op_parallelism_threads(int(intra))
+        if inter:
+            tf.config.threading.set_inter_op_parallelism_threads(int(inter))
+    except RuntimeError as e:
+        log.warning("Could not set TensorFlow thread counts: %s", e)
+
+
+def load_keras_model(model_path):
+    import tensorflow as tf
+    configure_tf_threads(tf)
+    # Disable JIT to see if it prevents silent crashes
+    os.environ['TF_XLA_FLAGS'] = '--tf_xla_enable_xla_devices=false'
+    return tf.keras.models.load_model(model_path, compile=False)
+
+
+class KerasBackend:
+    name = "keras"
+    # TensorFlow's runtime threads don't survive fork(), so a loaded Keras
+    # model can't be handed to forked workers.
+    fork_safe = False
+
+    def __init__(self, model_path=MODEL_PATH):
+        self.model_path = model_path
+        self.model = None
+        self._feature_model = None
+        self.load_seconds = None
+        self.preprocessing = None
+        self.preprocessing_source = None
+
+    def load(self):
+        start = time.perf_counter()
+        self.model = load_keras_model(self.model_path)
+        self.preprocessing, self.preprocessing_source = detect_preprocessing(self.model_path, self.model)
+        self.load_seconds = time.perf_counter() - start
+        return self
+
+    def predict(self, images):
+        return self.model(images, training=False).numpy()
+
+    def embed(self, images):
+        if self._feature_model is None:
+            import tensorflow as tf
+            # Same graph, cut at the input of the classification layer
+            self._feature_model = tf.keras.Model(self.model.inputs, self.model.layers[-1].input)
+        return self._feature_model(images, training=False).numpy()
+
+    def classifier_weights(self):
+        # (kernel, bias) of the final Dense layer: kernel[:, i] is class i's
+        # direction in the embedding space
+        kernel, bias = self.model.layers[-1].get_weights()[:2]
+        return kernel, bias
+
+
+class TFLiteBackend:
+    # The .tflite file is memory-mapped, so workers forked after load() share
+    # its pages; each process opens its own interpreter on first use.
+
+    @property
+    def fork_safe(self):
+        # Without tflite_runtime the interpreter comes from tf.lite, and
+        # loading it would start TensorFlow's runtime before the fork
+        return importlib.util.find_spec("tflite_runtime") is not None
+
+    def __init__(self, quantization, model_path=MODEL_PATH, num_threads=TFLITE_THREADS):
+        if quantization not in ("fp16", "int8"):
+            raise ValueError(f"Unknown TFLite quantization: {quantization}")
+        self.quantization = quantization
+        self.name = f"tflite-{quantization}"
+        self.model_path = model_path
+        self.tflite_path = f"{os.path.splitext(model_path)[0]}.{quantization}.tflite"
+        self.num_threads = num_threads
+        self.load_seconds = None
+        self.preprocessing = None
+        self.preprocessing_source = None
+
+        self._interpreter = None
+        self._input_index = None
+        self._output_index = None
+        self._features_index = None
+        self._batch_size = None
+        self._pid = None
+        # A TFLite interpreter must not be invoked from two threads at once
+        self._lock = threading.Lock()
+
+    def convert(self):
+        import tensorflow as tf
+        log.info("Converting %s to %s...", self.model_path, self.name)
+        keras_model = load_keras_model(self.model_path)
+        # Export the penultimate features as a second output so embed() can
+        # share the converted graph with predict()
+        features = keras_model.layers[-1].input
+        dual_model = tf.keras.Model(keras_model.inputs, [keras_model.output, features])
+        converter = tf.lite.TFLiteConverter.from_keras_model(dual_model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if self.quantization == "fp16":
+            converter.target_spec.supported_types = [tf.float16]
+        # With Optimize.DEFAULT and no representative dataset the converter
+        # produces dynamic-range int8 weights, which is what "int8" means here.
+        tflite_model = converter.convert()
+
+        tmp_path = self.tflite_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(tflite_model)
+        os.replace(tmp_path, self.tflite_path)
+        log.info("Saved %s (%.1f MB)", self.tflite_path, len(tflite_model) / 1e6)
+
+        # The Keras layers are gone after conversion, so record the
+        # preprocessing contract next to the .tflite file while we can see them
+        mode, source = detect_preprocessing(self.model_path, keras_model)
+        outputs = {"probabilities": int(keras_model.output.shape[-1]), "features": int(features.shape[-1])}
+        with open(metadata_path(self.tflite_path), "w") as f:
+            json.dump({"preprocessing": mode, "detected_from": source, "outputs": outputs}, f, indent=2)
+
+    def _needs_conversion(self):
+        if not os.path.exists(self.tflite_path):
+            return True
+        if "outputs" not in read_model_metadata(self.tflite_path):
+            # Converted before the features output existed
+            return True
+        return os.path.exists(self.model_path) and os.path.getmtime(self.model_path) > os.path.getmtime(self.tflite_path)
+
+    def load(self):
+        start = time.perf_counter()
+        if self._needs_conversion():
+            self.convert()
+        self._open_interpreter()
+
+        # Metadata for the Keras model wins over what was recorded at conversion
+        if read_model_metadata(self.model_path).get("preprocessing"):
+            self.preprocessing, self.preprocessing_source = detect_preprocessing(self.model_path)
+        else:
+            self.preprocessing, self.preprocessing_source = detect_preprocessing(self.tflite_path)
+            if self.preprocessing_source == "metadata":
+                self.preprocessing_source = read_model_metadata(self.tflite_path).get("detected_from", "metadata")
+        self.load_seconds = time.perf_counter() - start
+        return self
+
+    def _open_interpreter(self):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self._interpreter = Interpreter(model_path=self.tflite_path, num_threads=self.num_threads)
+        self._input_index = self._interpreter.get_input_details()[0]["index"]
+        # Output order isn't guaranteed after conversion; tell the two apart by width
+        sizes = read_model_metadata(self.tflite_path).get("outputs", {})
+        by_width = {int(o["shape"][-1]): o["index"] for o in self._interpreter.get_output_details()}
+        self._output_index = by_width.get(sizes.get("probabilities"), self._interpreter.get_output_details()[0]["index"])
+        self._features_index = by_width.get(sizes.get("features"))
+        self._batch_size = None
+        self._resize(1)
+        self._pid = os.getpid()
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            self._interpreter.resize_tensor_input(self._input_index, [batch_size, 224, 224, 3])
+            self._interpreter.allocate_tensors()
+            self._batch_size = batch_size
+
+    def _run(self, images, output):
+        images = np.ascontiguousarray(images, dtype=np.float32)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked since load(): the interpreter's threads stayed in the parent
+                self._open_interpreter()
+            if output == "features" and self._features_index is None:
+                raise RuntimeError(f"{self.tflite_path} has no features output; delete it to reconvert")
+            self._resize(images.shape[0])
+            self._interpreter.set_tensor(self._input_index, images)
+            self._interpreter.invoke()
+            index = self._features_index if output == "features" else self._output_index
+            return self._interpreter.get_tensor(index).copy()
+
+    def predict(self, images):
+        return self._run(images, "probabilities")
+
+    def embed(self, images):
+        return self._run(images, "features")
+
+
+def create_backend(name=INFERENCE_BACKEND, model_path=MODEL_PATH):
+    if name == "keras":
+        return KerasBackend(model_path)
+    if name in ("tflite-fp16", "tflite-int8"):
+        return TFLiteBackend(name.split("-", 1)[1], model_path)
+    raise ValueError(f"Unknown inference backend '{name}' (expected keras, tflite-fp16 or tflite-int8)")
+
+
+def check_parity(reference, candidate, images, batch_size=8):
+    """Compare two loaded backends on the same images.
+
+    Returns top-1 / top-3 agreement and probability differences so a
+    quantized backend can be checked against the Keras model.
+    """
+    top1_agree = top3_agree = 0
+    max_abs_diff = 0.0
+    total_abs_diff = 0.0
+    for i in range(0, len(images), batch_size):
+        batch = np.asarray(images[i:i + batch_size], dtype=np.float32)
+        ref = reference.predict(apply_preprocessing(batch, reference.preprocessing))
+        cand = candidate.predict(apply_preprocessing(batch, candidate.preprocessing))
+        diff = np.abs(ref - cand)
+        max_abs_diff = max(max_abs_diff, float(diff.max()))
+        total_abs_diff += float(diff.mean()) * len(batch)
+        ref_top1 = ref.argmax(axis=1)
+        top1_agree += int((ref_top1 == cand.argmax(axis=1)).sum())
+        cand_top3 = np.argsort(cand, axis=1)[:, -3:]
+        top3_agree += int(sum(ref_top1[j] in cand_top3[j] for j in range(len(batch))))
+    n = len(images)
+    return {
+        "samples": n,
+        "top1_agreement": top1_agree / n if n else 0.0,
+        "top3_agreement": top3_agree / n if n else 0.0,
+        "max_abs_diff": max_abs_diff,
+        "mean_abs_diff": total_abs_diff / n if n else 0.0,
+    }
+
+
+def load_sample_images(samples_dir, limit=200):
+    from PIL import Image, ImageOps
+    images = []
+    for root, _, files in os.walk(samples_dir):
+        for name in sorted(files):
+            if not name.lower().endswith((".jpg", ".jpeg", ".png")):
+                continue
+            image = ImageOps.exif_transpose(Image.open(os.path.join(root, name))).convert("RGB")
+            images.append(np.asarray(image.resize((224, 224), Image.Resampling.LANCZOS), dtype=np.float32))
+            if len(images) >= limit:
+                return images
+    return images
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check a TFLite backend against the Keras model")
+    parser.add_argument("--backend", default="tflite-int8", choices=["tflite-fp16", "tflite-int8"])
+    parser.add_argument("--samples", help="directory of sample plant images (default: random inputs)")
+    parser.add_argument("--count", type=int, default=64)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.samples:
+        images = load_sample_images(args.samples, args.count)
+    else:
+        rng = np.random.default_rng(0)
+        images = list(rng.uniform(0, 255, size=(args.count, 224, 224, 3)).astype(np.float32))
+
+    reference = KerasBackend().load()
+    candidate = create_backend(args.backend).load()
+    print(f"Keras load: {reference.load_seconds:.2f}s, {candidate.name} load: {candidate.load_seconds:.2f}s")
+    print(f"Preprocessing: keras={reference.preprocessing} ({reference.preprocessing_source}), "
+          f"{candidate.name}={candidate.preprocessing} ({candidate.preprocessing_source})")
+    print(json.dumps(check_parity(reference, candidate, images), indent=2))
@@ -0,0 +1,183 @@
+"""Dynamic micro-batching for model inference.
+
+Every /predict request hands its single preprocessed image to a shared
+InferenceBatcher. A background thread collects requests that arrive close
+together into one batch, runs a single forward pass for the whole batch and
+hands each caller back its own row of the output.
+
+Configuration (environment variables):
+    HERBAL_MAX_BATCH_SIZE     largest batch sent to the model (default 8)
+    HERBAL_MAX_BATCH_WAIT_MS  how long the first request of a batch may wait
+                              for company before the batch is run (default 5)
+"""
+import collections
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+MAX_BATCH_SIZE = int(os.environ.get("HERBAL_MAX_BATCH_SIZE", "8"))
+MAX_BATCH_WAIT_MS = float(os.environ.get("HERBAL_MAX_BATCH_WAIT_MS", "5"))
+
+# Number of recent queue-wait samples kept for the percentile stats
+_WAIT_SAMPLES = 1000
+
+
+class _PendingRequest:
+    __slots__ = ("image", "enqueued_at", "done", "result", "error")
+
+    def __init__(self, image):
+        self.image = image
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceBatcher:
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS):
+        # predict_fn takes a (N, 224, 224, 3) float32 array and returns an
+        # (N, num_classes) numpy array of probabilities.
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        # Reused input buffer for batches, allocated once the image shape is known
+        self._buffer = None
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._batch_sizes = collections.Counter()
+        self._waits = collections.deque(maxlen=_WAIT_SAMPLES)
+        self._max_wait_seen = 0.0
+
+    def submit(self, image, timeout=None):
+        """Queue one (224, 224, 3) image and block until its prediction row is ready."""
+        if image.ndim == 4:
+            # Accept the (1, 224, 224, 3) arrays preprocess_image returns
+            image = image[0]
+        self._ensure_worker()
+
+        pending = _PendingRequest(image)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for batched inference")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def submit_many(self, images, timeout=None):
+        """Queue several (224, 224, 3) images at once and block until all rows are ready.
+
+        They are enqueued together, so they share forward passes (one pass when
+        there are no more of them than max_batch_size and nothing else is waiting).
+        """
+        self._ensure_worker()
+        pendings = [_PendingRequest(image) for image in images]
+        for pending in pendings:
+            self._queue.put(pending)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for pending in pendings:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            if not pending.done.wait(remaining):
+                raise TimeoutError("Timed out waiting for batched inference")
+            if pending.error is not None:
+                raise pending.error
+        return np.stack([pending.result for pending in pendings])
+
+    def stats(self):
+        with self._stats_lock:
+            waits_ms = sorted(w * 1000 for w in self._waits)
+            batches = self._batches
+            requests = self._requests
+            sizes = dict(sorted(self._batch_sizes.items()))
+            max_wait_ms = self._max_wait_seen * 1000
+
+        def percentile(p):
+            if not waits_ms:
+                return 0.0
+            return round(waits_ms[min(len(waits_ms) - 1, int(p / 100 * len(waits_ms)))], 3)
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": batches,
+            "requests": requests,
+            "queued": self._queue.qsize(),
+            "avg_batch_size": round(requests / batches, 3) if batches else 0.0,
+            "batch_size_counts": sizes,
+            "queue_wait_ms": {
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+                "max": round(max_wait_ms, 3),
+            },
+        }
+
+    def _ensure_worker(self):
+        # The worker thread is started on first use rather than at import so a
+        # process that never predicts (or forks before predicting) doesn't own one.
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    # Still take anything that is already waiting
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            try:
+                images = self._fill_buffer(batch)
+                preds = np.asarray(self.predict_fn(images))
+                for i, pending in enumerate(batch):
+                    pending.result = preds[i]
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finally:
+                self._record(batch, started)
+                for pending in batch:
+                    pending.done.set()
+
+    def _fill_buffer(self, batch):
+        # Only the worker thread touches the buffer, and predict_fn has copied
+        # it into the model's own input before the next batch is collected.
+        shape = batch[0].image.shape
+        if self._buffer is None or self._buffer.shape[1:] != shape:
+            self._buffer = np.empty((self.max_batch_size, *shape), dtype=np.float32)
+        return np.stack([p.image for p in batch], out=self._buffer[:len(batch)])
+
+    def _record(self, batch, started):
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            for pending in batch:
+                wait = started - pending.enqueued_at
+                self._waits.append(wait)
+                if wait > self._max_wait_seen:
+                    self._max_wait_seen = wait
@@ -0,0 +1,247 @@
+"""Prometheus-style metrics, served as text on /metrics.
+
+A small in-process registry with the three metric types we need (counters,
+gauges and histograms, optionally labelled), rendered in the Prometheus text
+exposition format. Figures other modules already count themselves (cache
+and translation store hits, batcher totals) are read at scrape time through
+collectors instead of being counted twice.
+
+Metrics are per process: behind serve.py each worker reports its own.
+
+Configuration (environment variables):
+    HERBAL_METRICS_BUCKETS   comma-separated histogram bucket bounds in seconds
+                             (default 0.001,0.0025,0.005,...,10)
+"""
+import contextlib
+import logging
+import math
+import os
+import threading
+import time
+
+log = logging.getLogger("herbal.metrics")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS = tuple(float(b) for b in os.environ.get("HERBAL_METRICS_BUCKETS", "").split(",") if b.strip()) or DEFAULT_BUCKETS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in labels) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return list(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name + "_total", self._labels(k), v) for k, v in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    @contextlib.contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(k), v) for k, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry else 0
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, n in zip(self.buckets + (math.inf,), counts):
+                    cumulative += n
+                    out.append((self.name + "_bucket", labels + [("le", format_value(bound))], cumulative))
+                out.append((self.name + "_sum", labels, total))
+                out.append((self.name + "_count", labels, count))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """Register `collect()`, called on every scrape.
+
+        It returns a list of (name, kind, help, samples) where samples is a
+        list of (labels dict, value) and the name already carries any suffix
+        (e.g. _total for counters).
+        """
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+        for collect in collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                log.warning("Metrics collector failed: %s", e)
+                continue
+            for name, kind, help, samples in families:
+                family = name[:-len("_total")] if kind == "counter" and name.endswith("_total") else name
+                lines.append(f"# HELP {family} {help}")
+                lines.append(f"# TYPE {family} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{format_labels(sorted(labels.items()))} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "herbal_requests_in_flight", "Requests currently being handled", ["endpoint"])
+REQUEST_SECONDS = registry.histogram(
+    "herbal_request_duration_seconds", "Time to handle a request, end to end", ["endpoint", "status"])
+PREDICT_STAGE_SECONDS = registry.histogram(
+    "herbal_predict_stage_seconds",
+    "Time spent in each /predict stage (decode, preprocess, gate, inference or inference_tta, translation, serialization)", ["stage"])
+CHAT_STAGE_SECONDS = registry.histogram(
+    "herbal_chat_stage_seconds", "Time spent in each /chat stage (matching, scoring, translation)", ["stage"])
+IMAGE_DECODES = registry.counter(
+    "herbal_image_decodes", "Uploads decoded, by path: draft (reduced-resolution JPEG) or full (fallback full-resolution decode)",
+    ["path"])
+TRANSLATION_FALLBACKS = registry.counter(
+    "herbal_translation_fallbacks", "Responses served in English because translation failed", ["endpoint"])
+GATE_DECISIONS = registry.counter(
+    "herbal_gate_decisions", "Predictions by gate decision: accepted, uncertain or rejected (non-plant pre-filter)",
+    ["decision"])
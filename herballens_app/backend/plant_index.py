@@ -0,0 +1,126 @@
+"""Inverted benefit -> plant index used to rank plants for /chat.
+
+The index is built once from plant_info and answers the same questions the
+old per-request scan over every plant asked:
+
+  * does any benefit of a plant contain the term, or is contained in it? (+50
+    for a primary term, +5 for an expanded synonym)
+  * otherwise, does the description contain the term? (+5 / +1)
+  * otherwise, for primary terms, does the plant name contain it? (+10)
+  * plants matching more than one primary condition get a bonus of 20 per
+    matched condition
+
+Only plants that share something with the query are ever scored, and the
+best k are taken with a heap instead of sorting every match.
+"""
+import collections
+import heapq
+
+from symptom_index import SymptomMatcher
+
+PRIMARY_BENEFIT_SCORE = 50
+PRIMARY_DESCRIPTION_SCORE = 5
+PRIMARY_NAME_SCORE = 10
+MULTI_CONDITION_BONUS = 20
+EXPANDED_BENEFIT_SCORE = 5
+EXPANDED_DESCRIPTION_SCORE = 1
+
+
+class _SubstringIndex:
+    # Character trigram postings over a set of texts. find() narrows the
+    # candidates with the postings and then confirms with a real substring
+    # test, so results match `term in text` exactly.
+    def __init__(self, texts):
+        self.texts = texts
+        self.grams = collections.defaultdict(set)
+        for doc_id, text in texts.items():
+            for i in range(len(text) - 2):
+                self.grams[text[i:i + 3]].add(doc_id)
+
+    def find(self, term):
+        if len(term) < 3:
+            candidates = self.texts.keys()
+        else:
+            postings = []
+            for i in range(len(term) - 2):
+                posting = self.grams.get(term[i:i + 3])
+                if posting is None:
+                    return set()
+                postings.append(posting)
+            postings.sort(key=len)
+            candidates = postings[0].intersection(*postings[1:])
+        return {doc_id for doc_id in candidates if term in self.texts[doc_id]}
+
+
+class PlantIndex:
+    def __init__(self, plant_info):
+        self.plant_info = plant_info
+
+        # Normalized benefit phrase -> plants listing it
+        benefit_plants = collections.defaultdict(set)
+        for plant, info in plant_info.items():
+            for benefit in info.get("benefits", []):
+                benefit = benefit.lower()
+                if benefit:
+                    benefit_plants[benefit].add(plant)
+        self.benefit_plants = {b: frozenset(p) for b, p in benefit_plants.items()}
+
+        # Benefits containing a term are found through trigram postings;
+        # benefits contained in a term through one automaton pass over it.
+        self._benefits_containing = _SubstringIndex({b: b for b in self.benefit_plants})
+        self._benefits_within = SymptomMatcher({b: [] for b in self.benefit_plants})
+
+        self._descriptions = _SubstringIndex({
+            plant: info.get("description", "").lower() for plant, info in plant_info.items()
+        })
+        self._names = _SubstringIndex({plant: plant.lower() for plant in plant_info})
+
+    def _plants_by_benefit(self, term):
+        benefits = self._benefits_containing.find(term) | self._benefits_within.match(term)
+        plants = set()
+        for benefit in benefits:
+            plants |= self.benefit_plants[benefit]
+        return plants
+
+    def score(self, primary_terms, expanded_terms):
+        """Return {plant: score} for every plant sharing a term with the query."""
+        scores = collections.defaultdict(int)
+        matched_conditions = collections.defaultdict(int)
+
+        # 1. Primary terms (High priority)
+        for term in primary_terms:
+            term = term.lower()
+            by_benefit = self._plants_by_benefit(term)
+            for plant in by_benefit:
+                scores[plant] += PRIMARY_BENEFIT_SCORE
+                matched_conditions[plant] += 1
+            by_description = self._descriptions.find(term) - by_benefit
+            for plant in by_description:
+                scores[plant] += PRIMARY_DESCRIPTION_SCORE
+            for plant in self._names.find(term) - by_benefit - by_description:
+                scores[plant] += PRIMARY_NAME_SCORE
+
+        # Bonus for matching multiple query terms
+        for plant, count in matched_conditions.items():
+            if count > 1:
+                scores[plant] += count * MULTI_CONDITION_BONUS
+
+        # 2. Expanded synonyms (Lower priority)
+        for term in expanded_terms:
+            term = term.lower()
+            by_benefit = self._plants_by_benefit(term)
+            for plant in by_benefit:
+                scores[plant] += EXPANDED_BENEFIT_SCORE
+            for plant in self._descriptions.find(term) - by_benefit:
+                scores[plant] += EXPANDED_DESCRIPTION_SCORE
+
+        return scores
+
+    def top_matches(self, primary_terms, expanded_terms, k=5):
+        """Best k plants as (name, score), by score descending then name.
+
+        Also returns how many plants matched at all.
+        """
+        scores = self.score(primary_terms, expanded_terms)
+        best = heapq.nsmallest(k, ((-score, plant) for plant, score in scores.items() if score > 0))
+        return [(plant, -neg_score) for neg_score, plant in best], len(scores)
@@ -0,0 +1,126 @@
+"""Content-addressed cache of /predict responses.
+
+Users often upload the same photo again (switching language, pressing retry).
+Responses are cached under a hash of the raw upload bytes plus the model
+version, so a repeat upload is answered without decoding the image, running
+the model or translating anything.
+
+Entries are the encoded JSON response bodies, served as they are. They live
+in a memory-bounded LRU and, if a directory is configured, are also written
+to disk so they survive restarts.
+
+Configuration (environment variables):
+    HERBAL_PREDICTION_CACHE_MB   memory budget for cached responses (default 32, 0 disables)
+    HERBAL_PREDICTION_CACHE_DIR  directory for the disk tier (default: memory only)
+"""
+import collections
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+log = logging.getLogger("herbal.prediction_cache")
+
+PREDICTION_CACHE_MB = float(os.environ.get("HERBAL_PREDICTION_CACHE_MB", "32"))
+PREDICTION_CACHE_DIR = os.environ.get("HERBAL_PREDICTION_CACHE_DIR") or None
+
+
+class PredictionCache:
+    def __init__(self, max_bytes=int(PREDICTION_CACHE_MB * 1024 * 1024), disk_dir=PREDICTION_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # key -> encoded response body
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 or bool(self.disk_dir)
+
+    @staticmethod
+    def key(data, model_version):
+        digest = hashlib.sha256(data)
+        digest.update(b"\0" + model_version.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return body
+
+        body = self._read_disk(key)
+        with self._lock:
+            if body is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, body)
+        return body
+
+    def put(self, key, body):
+        with self._lock:
+            self._remember(key, body)
+        self._write_disk(key, body)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_dir": self.disk_dir,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remember(self, key, body):
+        # Caller holds self._lock
+        if len(body) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = body
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key, body):
+        if not self.disk_dir:
+            return
+        try:
+            # Write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            log.warning("Could not write prediction cache entry: %s", e)
@@ -0,0 +1,175 @@
+"""Confidence gating for /predict: flag uncertain results, reject non-plants early.
+
+Two independent checks:
+
+  * Uncertainty. The model's probabilities are temperature-scaled
+    (softmax(log p / T), the usual post-hoc calibration) and the normalized
+    entropy of the result, 0 for a one-hot answer and 1 for a uniform one,
+    is compared with a threshold. Above it the prediction is still returned
+    but marked "uncertain": true. With 86 classes, 0.45 roughly corresponds
+    to a 70% top score with the rest spread out, the point below which the
+    frontend used to warn.
+  * Greenness pre-filter (off by default). Before the model runs, the
+    fraction of plant-coloured pixels (excess green, 2G - R - B, above a
+    margin) is measured on a 56x56 subsample of the resized image. Uploads
+    below the minimum fraction are answered as "not a plant" without
+    inference or translation. Dried leaves, bark and flowers are not green,
+    so keep the minimum small (a few percent) when enabling it.
+
+The temperature is fitted offline on labelled photos and saved to the
+model's sidecar metadata (herbal_model.json), where it is picked up at
+startup:
+
+    python prediction_gate.py --samples DIR     # DIR/<plant name>/*.jpg
+
+Configuration (environment variables):
+    HERBAL_GATE_TEMPERATURE         calibration temperature (default: herbal_model.json, else 1.0)
+    HERBAL_GATE_MAX_ENTROPY         normalized entropy above which a result is uncertain (default 0.45)
+    HERBAL_GATE_MIN_GREEN_FRACTION  minimum plant-coloured pixel fraction, 0 disables (default 0)
+"""
+import logging
+import os
+
+import numpy as np
+
+from inference_backend import MODEL_PATH, read_model_metadata
+
+log = logging.getLogger("herbal.gate")
+
+MAX_ENTROPY = float(os.environ.get("HERBAL_GATE_MAX_ENTROPY", "0.45"))
+MIN_GREEN_FRACTION = float(os.environ.get("HERBAL_GATE_MIN_GREEN_FRACTION", "0"))
+
+# Excess-green margin (0-255 scale) for a pixel to count as plant-coloured
+GREEN_MARGIN = 20
+# Subsampling step of the 224x224 input for the greenness check
+GREEN_STRIDE = 4
+
+
+def configured_temperature(model_path=MODEL_PATH):
+    if os.environ.get("HERBAL_GATE_TEMPERATURE"):
+        return float(os.environ["HERBAL_GATE_TEMPERATURE"]), "environment"
+    temperature = read_model_metadata(model_path).get("temperature")
+    if temperature:
+        return float(temperature), "metadata"
+    return 1.0, "default"
+
+
+def temperature_scale(probabilities, temperature):
+    # Probabilities are softmax outputs, so log p equals the logits up to a
+    # per-row constant and rescaling them is exact temperature scaling
+    logits = np.log(np.maximum(np.asarray(probabilities, dtype=np.float64), 1e-12)) / temperature
+    logits -= logits.max(axis=-1, keepdims=True)
+    scaled = np.exp(logits)
+    return scaled / scaled.sum(axis=-1, keepdims=True)
+
+
+def normalized_entropy(probabilities):
+    p = np.maximum(probabilities, 1e-12)
+    return -(p * np.log(p)).sum(axis=-1) / np.log(p.shape[-1])
+
+
+def green_fraction(image):
+    # image: (224, 224, 3) raw 0-255 pixels
+    sample = np.asarray(image[::GREEN_STRIDE, ::GREEN_STRIDE], dtype=np.float32)
+    r, g, b = sample[..., 0], sample[..., 1], sample[..., 2]
+    return float(np.mean(2 * g - r - b > GREEN_MARGIN))
+
+
+class PredictionGate:
+    def __init__(self, temperature=None, max_entropy=MAX_ENTROPY, min_green_fraction=MIN_GREEN_FRACTION):
+        if temperature is None:
+            temperature, self.temperature_source = configured_temperature()
+        else:
+            self.temperature_source = "argument"
+        if temperature <= 0:
+            raise ValueError(f"Gate temperature must be positive, got {temperature}")
+        self.temperature = temperature
+        self.max_entropy = max_entropy
+        self.min_green_fraction = min_green_fraction
+
+    @property
+    def signature(self):
+        # Part of the prediction cache key: responses carry the gate's verdict
+        return f"t{self.temperature:g}-e{self.max_entropy:g}-g{self.min_green_fraction:g}"
+
+    def assess(self, pred_row):
+        """Return the uncertainty fields added to a prediction."""
+        calibrated = temperature_scale(pred_row, self.temperature)
+        entropy = float(normalized_entropy(calibrated))
+        return {
+            "uncertain": entropy > self.max_entropy,
+            "entropy": round(entropy, 4),
+            "calibrated_confidence": round(float(calibrated.max()) * 100, 2),
+        }
+
+    def looks_like_plant(self, image):
+        """Return (passes, green fraction) for one raw (224, 224, 3) image."""
+        if self.min_green_fraction <= 0:
+            return True, None
+        fraction = green_fraction(image)
+        return fraction >= self.min_green_fraction, round(fraction, 4)
+
+    def status(self):
+        return {
+            "temperature": self.temperature,
+            "temperature_source": self.temperature_source,
+            "max_entropy": self.max_entropy,
+            "min_green_fraction": self.min_green_fraction,
+        }
+
+
+def fit_temperature(probabilities, labels, candidates=np.geomspace(0.25, 8.0, 121)):
+    """Temperature minimizing the negative log-likelihood of the true labels."""
+    rows = np.arange(len(labels))
+    losses = [-np.log(np.maximum(temperature_scale(probabilities, t)[rows, labels], 1e-12)).mean()
+              for t in candidates]
+    best = int(np.argmin(losses))
+    return float(candidates[best]), float(losses[best])
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from embedding_index import load_class_names, reference_photos, read_bytes
+    from image_pipeline import preprocess_upload
+    from inference_backend import KerasBackend, apply_preprocessing, metadata_path
+
+    parser = argparse.ArgumentParser(description="Fit the gating temperature on labelled photos")
+    parser.add_argument("--samples", required=True, help="labelled photos, one folder per plant")
+    parser.add_argument("--per-class", type=int, default=50)
+    parser.add_argument("--class-indices", default=os.path.join(os.path.dirname(MODEL_PATH), "class_indices.json"))
+    parser.add_argument("--write", action="store_true", help="save the temperature to the model metadata")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    class_names = load_class_names(args.class_indices)
+    photos = reference_photos(args.samples, class_names, args.per_class)
+    if not photos:
+        parser.error(f"No photos found under {args.samples}/<plant name>/")
+
+    backend = KerasBackend().load()
+    probabilities = []
+    for start in range(0, len(photos), 16):
+        batch = np.concatenate([preprocess_upload(read_bytes(os.path.join(args.samples, p)))
+                                for _, p in photos[start:start + 16]])
+        probabilities.append(backend.predict(apply_preprocessing(batch, backend.preprocessing)))
+    probabilities = np.concatenate(probabilities)
+    labels = np.array([class_names.index(plant) for plant, _ in photos])
+
+    temperature, loss = fit_temperature(probabilities, labels)
+    calibrated = temperature_scale(probabilities, temperature)
+    correct = calibrated.argmax(axis=1) == labels
+    entropy = normalized_entropy(calibrated)
+    print(f"{len(photos)} photos, accuracy {correct.mean():.1%}, temperature {temperature:.3f} (NLL {loss:.4f})")
+    for q in (0.90, 0.95, 0.99):
+        print(f"  {q:.0%} of correct predictions have normalized entropy <= {np.quantile(entropy[correct], q):.3f}")
+    if (~correct).any():
+        print(f"  median entropy of wrong predictions: {np.median(entropy[~correct]):.3f}")
+
+    if args.write:
+        meta = read_model_metadata(MODEL_PATH)
+        meta["temperature"] = round(temperature, 4)
+        with open(metadata_path(MODEL_PATH), "w") as f:
+            json.dump(meta, f, indent=2)
+        print(f"Saved temperature to {metadata_path(MODEL_PATH)}")
@@ -0,0 +1,38 @@
+"""Memory usage of a server process.
+
+On Linux the numbers come from /proc/<pid>/smaps_rollup, which splits the
+resident set into pages shared with other processes (e.g. model weights a
+preforked worker inherited from its parent) and pages private to it. That
+private figure is the real per-worker cost. Elsewhere only the peak RSS is
+available.
+"""
+import os
+import resource
+import sys
+
+
+def memory_usage(pid="self"):
+    """Return memory figures in MB for `pid` (default: this process)."""
+    try:
+        fields = {}
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) / 1024
+        private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+        shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+        return {
+            "pid": os.getpid() if pid == "self" else pid,
+            "rss_mb": round(fields.get("Rss", 0), 1),
+            "pss_mb": round(fields.get("Pss", 0), 1),
+            "private_mb": round(private, 1),
+            "shared_mb": round(shared, 1),
+        }
+    except OSError:
+        if pid != "self":
+            return {"pid": pid}
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes on Linux
+        peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+        return {"pid": os.getpid(), "peak_rss_mb": round(peak_mb, 1)}
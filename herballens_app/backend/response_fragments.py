@@ -0,0 +1,164 @@
+"""Pre-serialized pieces of /predict and /chat responses.
+
+Between two predictions of the same plant only the confidence figures
+change; the plant's details and their Telugu translation are the same every
+time. Instead of rebuilding those dicts and running them through jsonify on
+each request, each plant's English and Telugu parts are encoded to JSON once
+and a response is assembled by splicing the per-request fields between them:
+
+    {"plant":…,"plant_te":…,"confidence":…,…,"details":{…},"details_te":{…}}
+     └─ English ─┘└─ Telugu ─┘└─ per request ─┘└─ English ─┘└─── Telugu ──┘
+
+English fragments are built for every class at startup. Telugu fragments
+are built at startup for plants whose texts are already in the translation
+store and otherwise on the first successful translation; an English
+fallback is encoded per response and never kept, so it is retried next time.
+
+/chat replies are built the same way from per-plant lines ("🌿 **name**:
+description") and fixed header and note templates kept per language. The
+Telugu line of a plant comes from the translation store (the same plant
+name and description texts /predict translates), so a Telugu reply costs no
+more than an English one; only a plant whose texts were never translated
+goes out to the live translator, once.
+
+Streamed responses (see app.stream_prediction and app.stream_chat_reply)
+are NDJSON: one event object per line, {"event": "result", …} with the
+body's own fields spliced in after the event name, then "translation"
+events and a final "done".
+
+Bodies are compact UTF-8 JSON (Telugu is not \\u-escaped, which alone
+halves its size) and are compressed with brotli (when the brotli package is
+installed) or gzip for clients that accept it.
+
+Configuration (environment variables):
+    HERBAL_RESPONSE_COMPRESSION   1 to compress responses for clients that accept it (default 1)
+    HERBAL_COMPRESS_MIN_BYTES     smallest body worth compressing (default 512)
+"""
+import gzip
+import json
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_COMPRESSION = os.environ.get("HERBAL_RESPONSE_COMPRESSION", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.environ.get("HERBAL_COMPRESS_MIN_BYTES", "512"))
+
+JSON_CONTENT_TYPE = "application/json"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def encode_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_fields(fields):
+    # '"a":1,"b":2' — the inside of an object, ready to splice
+    return encode_json(fields)[1:-1]
+
+
+def encode_event(event, body=None, **fields):
+    # One NDJSON line: {"event":…,<fields>,<body's fields>}
+    head = encode_fields({"event": event, **fields})
+    if body is None:
+        return b"{" + head + b"}\n"
+    return b"{" + head + b"," + body[1:] + b"\n"
+
+
+class PredictionFragments:
+    def __init__(self, plant_names, plant_details):
+        # plant_details(name) -> the English details dict served for that plant
+        self.plant_details = plant_details
+        self._lock = threading.Lock()
+        # plant -> (b'"plant":…', b'"details":{…}') and (b'"plant_te":…', b'"details_te":{…}')
+        self._english = {name: self._encode_english(name) for name in plant_names}
+        self._telugu = {}
+
+    def _encode_english(self, plant_name):
+        return encode_fields({"plant": plant_name}), encode_fields({"details": self.plant_details(plant_name)})
+
+    @staticmethod
+    def encode_telugu(plant_name_te, details_te):
+        return encode_fields({"plant_te": plant_name_te}), encode_fields({"details_te": details_te})
+
+    def telugu(self, plant_name):
+        """The stored Telugu fragment for a plant, or None if it hasn't been translated yet."""
+        return self._telugu.get(plant_name)
+
+    def remember_telugu(self, plant_name, plant_name_te, details_te):
+        fragment = self.encode_telugu(plant_name_te, details_te)
+        with self._lock:
+            self._telugu[plant_name] = fragment
+        return fragment
+
+    def assemble(self, plant_name, telugu, fields):
+        """Return the response body for `plant_name` with the per-request `fields` spliced in."""
+        english = self._english.get(plant_name)
+        if english is None:
+            english = self._encode_english(plant_name)
+        return b"".join((b"{", english[0], b",", telugu[0], b",", encode_fields(fields), b",",
+                         english[1], b",", telugu[1], b"}"))
+
+    def stats(self):
+        return {
+            "plants": len(self._english),
+            "telugu": len(self._telugu),
+            "bytes": sum(len(a) + len(b) for a, b in [*self._english.values(), *self._telugu.values()]),
+        }
+
+
+class ChatFragments:
+    def __init__(self, templates):
+        # lang -> {"header": …, "note": …}
+        self.templates = templates
+        self._lock = threading.Lock()
+        self._lines = {}
+
+    @staticmethod
+    def format_line(name, description):
+        return f"🌿 **{name}**: {description}\n\n"
+
+    def line(self, plant_name, lang):
+        """The stored reply line for a plant, or None if there isn't one yet."""
+        return self._lines.get((plant_name, lang))
+
+    def remember(self, plant_name, lang, name, description):
+        line = self.format_line(name, description)
+        with self._lock:
+            self._lines[(plant_name, lang)] = line
+        return line
+
+    def reply(self, lang, lines):
+        template = self.templates[lang]
+        return f"{template['header']}\n\n{''.join(lines)}⚠️ *{template['note']}*"
+
+    def stats(self):
+        counts = {}
+        for _, lang in list(self._lines):
+            counts[lang] = counts.get(lang, 0) + 1
+        return counts
+
+
+def accepted_encodings(accept_encoding):
+    # Codings named in an Accept-Encoding header, ignoring q=0 ones
+    codings = set()
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            codings.add(coding)
+    return codings
+
+
+def compress(body, accept_encoding):
+    """Return (payload, Content-Encoding or None) for a client's Accept-Encoding header."""
+    if not RESPONSE_COMPRESSION or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    codings = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in codings:
+        return brotli.compress(body, quality=5), "br"
+    if "gzip" in codings:
+        return gzip.compress(body, compresslevel=5, mtime=0), "gzip"
+    return body, None
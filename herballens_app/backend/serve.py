@@ -0,0 +1,159 @@
+"""Production entry point: a preforked pool of app.py workers.
+
+`python app.py` runs a single process, so JSON building, PIL work and chat
+scoring all share one GIL. This script opens the listening socket once, does
+the expensive startup work in the parent, then forks N workers that accept
+connections on the shared socket. Each worker serves with threads as before.
+
+Startup in the parent:
+  * app.py is imported once (plant data, symptom matcher, plant index), so
+    those structures are shared copy-on-write by every worker.
+  * TensorFlow thread counts are set per worker (cores / workers intra-op,
+    1 inter-op by default) so the workers don't oversubscribe the CPU.
+  * With a TFLite backend running on tflite_runtime the model is converted,
+    loaded and warmed up before forking; the memory-mapped .tflite file is
+    then shared by all workers. TensorFlow's own runtime is not fork-safe,
+    so with the Keras backend, or a TFLite one falling back to tf.lite
+    because tflite_runtime isn't installed, each worker loads and warms the
+    model itself after the fork.
+
+With HERBAL_MODE=chat (see app.py) the workers serve /chat only: nothing
+model-related is imported or loaded, so they start in well under a second
+and can run as a separate, independently scaled pool next to one started
+with HERBAL_MODE=predict.
+
+Each worker reports its memory split (private vs shared with the parent) on
+/stats, and the parent logs every worker's figures periodically.
+
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 5000]
+
+Configuration (environment variables, besides the app's own):
+    HERBAL_WORKERS                  worker processes (default: CPU count)
+    HERBAL_TF_INTRA_OP_THREADS      per-worker intra-op threads (default: cores / workers)
+    HERBAL_TF_INTER_OP_THREADS      per-worker inter-op threads (default 1)
+    HERBAL_MEMORY_REPORT_SECONDS    how often the parent logs worker memory (default 60)
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from structured_log import stop_logging
+
+log = logging.getLogger("herbal.serve")
+
+
+def configure_worker_threads(workers):
+    cores = os.cpu_count() or 1
+    intra = os.environ.get("HERBAL_TF_INTRA_OP_THREADS") or str(max(1, cores // workers))
+    inter = os.environ.get("HERBAL_TF_INTER_OP_THREADS") or "1"
+    # Must be in the environment before TensorFlow / TFLite are first used
+    os.environ["TF_NUM_INTRAOP_THREADS"] = intra
+    os.environ["TF_NUM_INTEROP_THREADS"] = inter
+    os.environ.setdefault("OMP_NUM_THREADS", intra)
+    os.environ.setdefault("HERBAL_TFLITE_THREADS", intra)
+    return int(intra), int(inter)
+
+
+def open_listener(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app_module, sock, host, port):
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if app_module.SERVES_PREDICT and not app_module.warmup.ready:
+        # Keras backend: load and warm up in this process (see module docstring)
+        app_module.warmup.run()
+    server = make_server(host, port, app_module.app, threaded=True, fd=sock.fileno())
+    log.info("Worker %d serving", os.getpid())
+    server.serve_forever()
+
+
+def spawn(app_module, sock, host, port):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(app_module, sock, host, port)
+        finally:
+            stop_logging()
+            os._exit(0)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Herbal Lens API with a preforked worker pool")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("HERBAL_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    intra, inter = configure_worker_threads(args.workers)
+    # The parent drives loading itself; don't start app.py's background warm-up
+    os.environ["HERBAL_EAGER_LOAD"] = "0"
+    import app as app_module
+    from process_stats import memory_usage
+
+    start = time.perf_counter()
+    if app_module.SERVES_PREDICT:
+        log.info("Starting %d workers on %s:%d (backend: %s, TF threads per worker: intra=%d, inter=%d)",
+                 args.workers, args.host, args.port, app_module.INFERENCE_BACKEND, intra, inter)
+        backend = app_module.create_backend(app_module.INFERENCE_BACKEND, app_module.MODEL_PATH)
+    else:
+        log.info("Starting %d %s workers on %s:%d", args.workers, app_module.SERVICE_MODE, args.host, args.port)
+        backend = None
+    if backend is not None and backend.fork_safe:
+        app_module.warmup.run()
+        if not app_module.warmup.ready:
+            sys.exit(f"Model failed to load: {app_module.warmup.error}")
+    log.info("Parent ready in %.2fs, memory: %s", time.perf_counter() - start, memory_usage())
+
+    sock = open_listener(args.host, args.port)
+    workers = {spawn(app_module, sock, args.host, args.port) for _ in range(args.workers)}
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    report_every = float(os.environ.get("HERBAL_MEMORY_REPORT_SECONDS", "60"))
+    next_report = time.monotonic() + min(report_every, 15)
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            workers.discard(pid)
+            if not stopping:
+                log.warning("Worker %d exited with status %d; restarting", pid, status)
+                workers.add(spawn(app_module, sock, args.host, args.port))
+            continue
+        if time.monotonic() >= next_report:
+            for worker_pid in sorted(workers):
+                log.info("Worker memory: %s", memory_usage(worker_pid))
+            next_report = time.monotonic() + report_every
+        time.sleep(0.5)
+
+
+if __name__ == "__main__":
+    main()
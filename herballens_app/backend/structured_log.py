@@ -0,0 +1,181 @@
+"""Structured, sampled, non-blocking logging.
+
+Every record is tagged with the id of the request it belongs to and handed
+to a queue; a single background thread formats it and writes it to stdout,
+so request threads never wait on a flush.
+
+Per-request diagnostics are logged at DEBUG level and only kept for a
+sample of requests (HERBAL_LOG_DEBUG_SAMPLE_RATE, 1% by default). A client
+can ask for the full trace of one request with an `X-Debug-Trace: 1`
+header, and HERBAL_LOG_LEVEL=DEBUG traces everything.
+
+Request ids come from the `X-Request-ID` header when the client sends one
+and are generated otherwise; they are echoed back on the response.
+
+    log = logging.getLogger("herbal.app")
+    with request_context(request_id, force_trace) as rid:
+        log.debug("query parts %s", parts)          # sampled
+        log.info("prediction", extra={"plant": name})  # always
+
+Extra fields become keys of the JSON line (or key=value pairs in text mode).
+Log arguments are formatted later on the writer thread, so don't mutate an
+object after passing it as an argument.
+
+Configuration (environment variables):
+    HERBAL_LOG_LEVEL                level for untraced requests (default INFO)
+    HERBAL_LOG_FORMAT               text or json (default text)
+    HERBAL_LOG_DEBUG_SAMPLE_RATE    fraction of requests whose DEBUG trace is kept (default 0.01)
+"""
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+
+LOG_LEVEL = logging.getLevelName(os.environ.get("HERBAL_LOG_LEVEL", "INFO").upper())
+LOG_FORMAT = os.environ.get("HERBAL_LOG_FORMAT", "text").lower()
+DEBUG_SAMPLE_RATE = float(os.environ.get("HERBAL_LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+DEBUG_TRACE_HEADER = "X-Debug-Trace"
+
+# Parent of every logger in this service ("herbal.app", "herbal.serve", ...)
+APP_LOGGER = "herbal"
+
+_request_id = contextvars.ContextVar("herbal_request_id", default="-")
+_trace = contextvars.ContextVar("herbal_trace", default=False)
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def trace_enabled():
+    """True if DEBUG records of the current request are being kept."""
+    return _trace.get()
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+@contextlib.contextmanager
+def request_context(request_id=None, force_trace=False):
+    """Tag log records in this block with a request id and decide whether to trace it."""
+    request_id = request_id or new_request_id()
+    traced = force_trace or LOG_LEVEL <= logging.DEBUG or random.random() < DEBUG_SAMPLE_RATE
+    id_token = _request_id.set(request_id)
+    trace_token = _trace.set(traced)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(id_token)
+        _trace.reset(trace_token)
+
+
+def wants_trace(header_value):
+    return (header_value or "").strip().lower() in ("1", "true", "yes")
+
+
+def extra_fields(record):
+    return {k: v for k, v in vars(record).items() if k not in _STANDARD_ATTRS and not k.startswith("_")}
+
+
+class RequestFilter(logging.Filter):
+    # Runs in the thread that logs, where the request context is set
+    def __init__(self, level):
+        super().__init__()
+        self.level = level
+
+    def filter(self, record):
+        if record.levelno < self.level and not _trace.get():
+            return False
+        record.request_id = _request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        line = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        line.update(extra_fields(record))
+        if record.exc_info:
+            line["exception"] = self.formatException(record.exc_info)
+        return json.dumps(line, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s")
+
+    def format(self, record):
+        record.request_id = getattr(record, "request_id", "-")
+        text = super().format(record)
+        fields = extra_fields(record)
+        if fields:
+            text += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return text
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # The queue never leaves this process, so skip the eager formatting
+        # QueueHandler does to make records picklable; the listener formats.
+        return record
+
+
+_handler = None
+_listener = None
+
+
+def _start_listener(stream_handler):
+    global _listener
+    _handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """Route all logging through the background writer. Safe to call more than once."""
+    global _handler
+    if _handler is not None:
+        return
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    _handler = _InProcessQueueHandler(queue.SimpleQueue())
+    _handler.addFilter(RequestFilter(level))
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+    # Our own loggers must let DEBUG through for traced requests; the filter
+    # drops the rest before anything is queued. Libraries (PIL, urllib3,
+    # werkzeug) stay at the root level so their debug calls stay cheap.
+    logging.getLogger(APP_LOGGER).setLevel(logging.DEBUG if DEBUG_SAMPLE_RATE > 0 else level)
+
+    _start_listener(stream_handler)
+    # The writer thread does not survive fork() (see serve.py): give each
+    # child a fresh queue and writer.
+    os.register_at_fork(after_in_child=lambda: _start_listener(stream_handler))
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush everything still queued."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
@@ -0,0 +1,214 @@
+"""Symptom vocabulary for /chat, compiled into a multi-pattern matcher.
+
+symptoms.json maps each condition key to its synonyms (English and Telugu).
+At startup every key and synonym is compiled into one Aho-Corasick automaton,
+so finding all conditions mentioned in a query is a single pass over the
+query text no matter how large the vocabulary grows.
+
+Misspellings are handled by a second, fuzzy stage. Every English word of the
+vocabulary goes into a BK-tree; a query word the vocabulary doesn't contain
+is replaced by its nearest vocabulary word within a small edit distance, and
+the corrected text goes through the same automaton. So "hedache" finds
+headache and "sore thraot" finds sore throat without listing either typo. A
+BK-tree lookup with a bounded distance only visits the branches that can
+hold a match, not the whole vocabulary.
+
+Configuration (environment variables):
+    HERBAL_FUZZY_MAX_DISTANCE   largest edit distance corrected (default 2, 0 disables)
+"""
+import collections
+import functools
+import json
+import os
+import re
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SYMPTOMS_PATH = os.path.join(BASE_DIR, "symptoms.json")
+FUZZY_MAX_DISTANCE = int(os.environ.get("HERBAL_FUZZY_MAX_DISTANCE", "2"))
+
+_WORD = re.compile(r"[a-z]+")
+
+# Words people write around their symptoms that sit one edit away from a
+# vocabulary word ("feeling" / "peeling"); never corrected.
+CHAT_WORDS = frozenset({
+    "feeling", "having", "suffering", "problem", "problems", "remedy", "remedies", "herbal", "please",
+    "since", "about", "there", "really", "which", "treatment", "medicine", "plants", "natural",
+    "severe", "little", "today", "night", "morning", "getting", "cured", "sometimes", "always",
+})
+
+
+def load_synonyms(path=SYMPTOMS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+class BKTree:
+    """Burkhard-Keller tree of words for bounded edit-distance lookups."""
+
+    def __init__(self, words=()):
+        # Each node is [word, {distance: child node}]
+        self._root = None
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self._root is None:
+            self._root = [word, {}]
+            self.size = 1
+            return
+        node = self._root
+        while True:
+            d = edit_distance(word, node[0], len(word) + len(node[0]))
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [word, {}]
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """Return [(distance, word)] for every word within max_distance, nearest first."""
+        found = []
+        pending = [self._root] if self._root is not None else []
+        while pending:
+            node = pending.pop()
+            # Past max_distance + the largest child distance neither this node
+            # nor any child can match, so the distance may be capped there
+            d = edit_distance(word, node[0], max_distance + max(node[1], default=0))
+            if d <= max_distance:
+                found.append((d, node[0]))
+            # Triangle inequality: only children at distance d +- max_distance
+            # from this node can be within max_distance of the word
+            for child_distance, child in node[1].items():
+                if d - max_distance <= child_distance <= d + max_distance:
+                    pending.append(child)
+        found.sort()
+        return found
+
+
+def allowed_distance(word, max_distance=FUZZY_MAX_DISTANCE):
+    # Short words are left alone (one edit turns "cold" into "bold"); longer
+    # words may be off by one, and by two from 8 letters on
+    if len(word) < 5:
+        return 0
+    return min(max_distance, 1 if len(word) < 8 else 2)
+
+
+class SymptomMatcher:
+    def __init__(self, synonyms, max_distance=FUZZY_MAX_DISTANCE):
+        self.synonyms = synonyms
+        self.max_distance = max_distance
+
+        # Trie over all terms: _goto[state] maps a character to the next state
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [frozenset()]
+        terms = collections.defaultdict(set)
+        for key, syn_list in synonyms.items():
+            for term in [key, *syn_list]:
+                term = term.lower()
+                if term:
+                    terms[term].add(key)
+
+        for term, keys in terms.items():
+            state = 0
+            for ch in term:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(frozenset())
+                state = nxt
+            self._out[state] = self._out[state] | keys
+
+        # Breadth-first pass to set failure links and merge the outputs of
+        # every suffix state, so matching never has to walk the fail chain
+        # just to collect results.
+        pending = collections.deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, nxt in self._goto[state].items():
+                pending.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] | self._out[self._fail[nxt]]
+
+        self.term_count = len(terms)
+
+        # Fuzzy stage: every English vocabulary word, and a cache of the
+        # corrections made for query words
+        self.vocabulary = {word for term in terms for word in _WORD.findall(term)}
+        self._words = BKTree(sorted(self.vocabulary))
+        self.correct_word = functools.lru_cache(maxsize=4096)(self._correct_word)
+
+    def match(self, text):
+        """Return the set of condition keys whose key or synonym occurs in `text`."""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+    def _correct_word(self, word):
+        limit = allowed_distance(word, self.max_distance)
+        if not limit or word in self.vocabulary or word in CHAT_WORDS:
+            return word
+        candidates = self._words.search(word, limit)
+        # A swapped pair of letters is two Levenshtein edits but one typo;
+        # look those up directly rather than searching one edit wider
+        for i in range(len(word) - 1):
+            swapped = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+            if swapped != word and swapped in self.vocabulary:
+                candidates.append((1, swapped))
+        if not candidates:
+            return word
+        best = min(d for d, _ in candidates)
+        # Among the nearest words prefer one sharing the first letter, which
+        # typos rarely change
+        nearest = [w for d, w in candidates if d == best]
+        return min(nearest, key=lambda w: (w[0] != word[0], w))
+
+    def correct(self, text):
+        """Return `text` with misspelt words replaced by their nearest vocabulary word."""
+        return _WORD.sub(lambda m: self.correct_word(m.group()), text)
+
+    def match_parts(self, parts, fuzzy=True):
+        # Query parts are matched separately so a term never spans the
+        # "and"/"," boundaries the query was split on. Fuzzy matches only
+        # ever add to the exact ones.
+        found = set()
+        for part in parts:
+            found |= self.match(part)
+            if fuzzy and self.max_distance:
+                corrected = self.correct(part)
+                if corrected != part:
+                    found |= self.match(corrected)
+        return found
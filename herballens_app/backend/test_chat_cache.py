@@ -0,0 +1,26 @@
+import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+URL = "http://localhost:5000"
+
+def ask(query):
+    start = time.time()
+    data = requests.post(f"{URL}/chat", json={"query": query}).json()
+    return (time.time() - start) * 1000, data
+
+if __name__ == "__main__":
+    try:
+        # Same conditions in a different order and case share one cache entry
+        for query in ("Cough and cold", "cold, cough", "cough and cold"):
+            elapsed, data = ask(query)
+            print(f"{query!r:<18} {elapsed:7.1f} ms  {data['response'].splitlines()[2][:50]}")
+
+        # Identical queries arriving together are computed once
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            timings = [t for t, _ in pool.map(ask, ["joint pain"] * 8)]
+        print(f"8 concurrent 'joint pain': max {max(timings):.1f} ms")
+
+        print("Chat cache:", requests.get(f"{URL}/stats").json()["chat_cache"])
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
@@ -0,0 +1,36 @@
+import requests
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+URL = "http://localhost:5000"
+
+def stream_chat(query):
+    # One streamed /chat, read to the end; the timeout catches a hung stream
+    start = time.time()
+    events = []
+    with requests.post(f"{URL}/chat?stream=1", json={"query": query},
+                       headers={"Accept": "application/x-ndjson"}, stream=True, timeout=30) as r:
+        for line in r.iter_lines():
+            if line:
+                events.append(json.loads(line)["event"])
+    return (time.time() - start) * 1000, events
+
+if __name__ == "__main__":
+    # Run against either server (python app.py or python asgi_app.py). With
+    # the async one, keep HERBAL_ASGI_CHAT_WORKERS small (the default 2) so
+    # there are more identical streams than chat threads, and use a fresh
+    # translation store so the first reply still has to translate.
+    try:
+        for query in ("fever", "joint pain and swelling"):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(stream_chat, [query] * 8))
+            complete = sum(1 for _, events in results if events and events[-1] == "done")
+            print(f"8 concurrent streams of {query!r}: {complete}/8 complete, "
+                  f"max {max(ms for ms, _ in results):.1f} ms")
+            for ms, events in results:
+                print(f"  {ms:7.1f} ms  {' -> '.join(events)}")
+
+        print("Chat cache:", requests.get(f"{URL}/stats").json()["chat_cache"])
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
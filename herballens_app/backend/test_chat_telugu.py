@@ -0,0 +1,20 @@
+import requests
+import time
+
+URL = "http://localhost:5000"
+
+QUERIES = ["fever", "cough", "headache and cold", "indigestion"]
+
+if __name__ == "__main__":
+    try:
+        # The second round should be as fast as English: every Telugu line
+        # now comes from the translation store
+        for round_no in (1, 2):
+            for query in QUERIES:
+                start = time.time()
+                data = requests.post(f"{URL}/chat", json={"query": query}).json()
+                elapsed = (time.time() - start) * 1000
+                print(f"round {round_no} {query!r:<22} {elapsed:7.1f} ms  te: {data.get('response_te', '')[:60]!r}")
+        print("Chat lines:", requests.get(f"{URL}/stats").json()["response_fragments"]["chat_lines"])
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
@@ -0,0 +1,42 @@
+import requests
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+URL = "http://localhost:5000"
+
+def make_image_bytes(color):
+    img = Image.new('RGB', (640, 480), color)
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG')
+    return buf.getvalue()
+
+def send_prediction(i):
+    data = make_image_bytes((i * 37 % 256, 120, 60))
+    start = time.perf_counter()
+    r = requests.post(f"{URL}/predict", files={'image': (f'test_{i}.jpg', data, 'image/jpeg')})
+    elapsed = (time.perf_counter() - start) * 1000
+    return r.status_code, elapsed
+
+if __name__ == "__main__":
+    concurrency = 16
+    total = 64
+
+    print(f"Sending {total} predictions with concurrency {concurrency}...")
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(send_prediction, range(total)))
+        wall = time.perf_counter() - start
+
+        latencies = sorted(ms for _, ms in results)
+        errors = [code for code, _ in results if code != 200]
+        print(f"Throughput: {total / wall:.2f} req/s")
+        print(f"p50: {latencies[len(latencies) // 2]:.1f} ms, p99: {latencies[int(len(latencies) * 0.99) - 1]:.1f} ms")
+        print(f"Errors: {len(errors)}")
+
+        stats = requests.get(f"{URL}/stats").json()
+        print(f"Batcher stats: {stats.get('batcher')}")
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
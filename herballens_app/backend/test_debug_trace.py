@@ -0,0 +1,18 @@
+import requests
+import uuid
+
+URL = "http://localhost:5000"
+
+if __name__ == "__main__":
+    # Watch the server log: the traced request shows every DEBUG step under
+    # its id, the untraced one only its summary lines (unless sampled)
+    try:
+        traced_id = f"trace-{uuid.uuid4().hex[:8]}"
+        r = requests.post(f"{URL}/chat", json={"query": "headache and fever"},
+                          headers={"X-Request-ID": traced_id, "X-Debug-Trace": "1"})
+        print(f"Traced request: sent {traced_id}, got back {r.headers.get('X-Request-ID')}")
+
+        r = requests.post(f"{URL}/chat", json={"query": "headache and fever"})
+        print(f"Untraced request: server assigned {r.headers.get('X-Request-ID')}")
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
@@ -0,0 +1,25 @@
+import requests
+import io
+from PIL import Image
+
+URL = "http://localhost:5000"
+
+def upload(color, name):
+    buf = io.BytesIO()
+    Image.new('RGB', (800, 600), color).save(buf, format='JPEG')
+    return requests.post(f"{URL}/predict", files={'image': (name, buf.getvalue(), 'image/jpeg')}).json()
+
+if __name__ == "__main__":
+    try:
+        print("Gate settings:", requests.get(f"{URL}/stats").json()["model"].get("gate"))
+        # A leaf-coloured photo goes through the model; a grey one is turned
+        # away when HERBAL_GATE_MIN_GREEN_FRACTION is set
+        for color, name in (((50, 140, 60), "leaf.jpg"), ((128, 128, 128), "wall.jpg")):
+            result = upload(color, name)
+            if result.get("rejected"):
+                print(f"{name}: rejected ({result['rejected']}, green fraction {result['green_fraction']})")
+            else:
+                print(f"{name}: {result.get('plant')} {result.get('confidence')}% "
+                      f"uncertain={result.get('uncertain')} entropy={result.get('entropy')}")
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
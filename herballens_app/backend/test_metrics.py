@@ -0,0 +1,35 @@
+import requests
+import io
+from PIL import Image
+
+URL = "http://localhost:5000"
+
+def stage_means(text, metric):
+    # Mean seconds per stage from the histogram _sum and _count lines
+    sums, counts = {}, {}
+    for line in text.splitlines():
+        if not line.startswith(metric + "_sum") and not line.startswith(metric + "_count"):
+            continue
+        name, value = line.rsplit(" ", 1)
+        stage = name.split('stage="')[1].split('"')[0]
+        (sums if "_sum" in name else counts)[stage] = float(value)
+    return {stage: sums[stage] / counts[stage] for stage in sums if counts.get(stage)}
+
+if __name__ == "__main__":
+    try:
+        buf = io.BytesIO()
+        Image.new('RGB', (1200, 900), (40, 140, 60)).save(buf, format='JPEG')
+        requests.post(f"{URL}/predict", files={'image': ('metrics.jpg', buf.getvalue(), 'image/jpeg')})
+        requests.post(f"{URL}/chat", json={"query": "cough and cold"})
+
+        text = requests.get(f"{URL}/metrics").text
+        for metric in ("herbal_predict_stage_seconds", "herbal_chat_stage_seconds"):
+            print(metric)
+            for stage, mean in sorted(stage_means(text, metric).items()):
+                print(f"  {stage:<14} {mean * 1000:8.2f} ms")
+        for line in text.splitlines():
+            if line.startswith(("herbal_prediction_cache_lookups_total", "herbal_image_decodes_total",
+                                "herbal_translation_failures_total", "herbal_requests_in_flight")):
+                print(line)
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
@@ -0,0 +1,45 @@
+import requests
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+URL = "http://localhost:5000"
+
+def make_image_bytes(color):
+    img = Image.new('RGB', (640, 480), color)
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG')
+    return buf.getvalue()
+
+def send_prediction(i):
+    data = make_image_bytes((i * 37 % 256, 90, 140))
+    start = time.perf_counter()
+    r = requests.post(f"{URL}/predict", files={'image': (f'burst_{i}.jpg', data, 'image/jpeg')})
+    elapsed = (time.perf_counter() - start) * 1000
+    return r.status_code, elapsed, r.headers.get("Retry-After")
+
+if __name__ == "__main__":
+    # Start the async server first (python asgi_app.py), ideally with a small
+    # HERBAL_ASGI_PREDICT_QUEUE so the burst overflows it
+    concurrency = 128
+    total = 256
+
+    print(f"Sending a burst of {total} predictions with concurrency {concurrency}...")
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(send_prediction, range(total)))
+
+        served = sorted(ms for code, ms, _ in results if code == 200)
+        rejected = [(ms, retry) for code, ms, retry in results if code == 503]
+        print(f"Served: {len(served)}, rejected with 503: {len(rejected)}, "
+              f"other: {total - len(served) - len(rejected)}")
+        if served:
+            print(f"Served p50: {served[len(served) // 2]:.1f} ms, p99: {served[int(len(served) * 0.99) - 1]:.1f} ms")
+        if rejected:
+            print(f"Slowest rejection: {max(ms for ms, _ in rejected):.1f} ms, Retry-After: {rejected[0][1]}")
+
+        stats = requests.get(f"{URL}/stats").json()
+        print(f"Admission stats: {stats.get('admission')}")
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
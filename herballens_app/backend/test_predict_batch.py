@@ -0,0 +1,39 @@
+import requests
+import json
+import io
+import zipfile
+from PIL import Image
+
+def make_image_bytes(color):
+    img = Image.new('RGB', (640, 480), color)
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG')
+    return buf.getvalue()
+
+if __name__ == "__main__":
+    # A few loose files plus a zip with one broken entry
+    files = [('images', (f'loose_{i}.jpg', make_image_bytes((i * 40, 150, 60)), 'image/jpeg')) for i in range(3)]
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for i in range(5):
+            zf.writestr(f'survey/plant_{i}.jpg', make_image_bytes((30, i * 40, 90)))
+        zf.writestr('survey/broken.jpg', b'not an image')
+    files.append(('archive', ('survey.zip', archive.getvalue(), 'application/zip')))
+
+    print("Sending batch to http://localhost:5000/predict_batch...")
+    try:
+        with requests.post('http://localhost:5000/predict_batch', files=files, stream=True) as r:
+            print(f"Status Code: {r.status_code}")
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                if result.get("done"):
+                    print(f"Done: {result['count']} images, {result['errors']} errors")
+                elif "error" in result:
+                    print(f"  [{result['index']}] {result['filename']}: ERROR {result['error']}")
+                else:
+                    print(f"  [{result['index']}] {result['filename']}: {result['plant']} ({result['confidence']}%)")
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
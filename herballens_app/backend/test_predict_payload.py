@@ -0,0 +1,19 @@
+import requests
+import io
+from PIL import Image
+
+URL = "http://localhost:5000"
+
+if __name__ == "__main__":
+    try:
+        buf = io.BytesIO()
+        Image.new('RGB', (800, 600), (50, 140, 60)).save(buf, format='JPEG')
+        for encoding in ("identity", "gzip", "br"):
+            response = requests.post(f"{URL}/predict", files={'image': ('leaf.jpg', buf.getvalue(), 'image/jpeg')},
+                                     headers={'Accept-Encoding': encoding}, stream=True)
+            wire = len(response.raw.read(decode_content=False))
+            print(f"Accept-Encoding {encoding:<8} -> Content-Encoding {response.headers.get('Content-Encoding', '-'):<5} "
+                  f"{wire} bytes on the wire")
+        print("Fragments:", requests.get(f"{URL}/stats").json().get("response_fragments"))
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
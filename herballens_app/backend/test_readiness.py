@@ -0,0 +1,23 @@
+import requests
+import time
+
+URL = "http://localhost:5000"
+
+if __name__ == "__main__":
+    # Start the server with HERBAL_EAGER_LOAD=1, then run this to watch it become ready
+    print("Waiting for /readyz...")
+    start = time.time()
+    try:
+        print(f"/healthz: {requests.get(f'{URL}/healthz').json()}")
+        while True:
+            r = requests.get(f"{URL}/readyz")
+            data = r.json()
+            print(f"  {r.status_code} state={data.get('state')}")
+            if r.status_code == 200 or data.get("state") == "failed":
+                break
+            time.sleep(1)
+        print(f"Ready after {time.time() - start:.1f}s")
+        print(f"Load time: {data.get('load_seconds')}s, warm-up time: {data.get('warmup_seconds')}s")
+        print(f"Per batch size: {data.get('warmup_batch_seconds')}")
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
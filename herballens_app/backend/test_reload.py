@@ -0,0 +1,34 @@
+import requests
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+URL = "http://localhost:5000"
+# Same token the server was started with (HERBAL_ADMIN_TOKEN)
+TOKEN = os.environ.get("HERBAL_ADMIN_TOKEN", "")
+
+def ask(query):
+    start = time.time()
+    requests.post(f"{URL}/chat", json={"query": query})
+    return (time.time() - start) * 1000
+
+def reload_content():
+    response = requests.post(f"{URL}/admin/reload", headers={"X-Admin-Token": TOKEN})
+    return response.status_code, response.json()
+
+if __name__ == "__main__":
+    try:
+        print("Content before:", requests.get(f"{URL}/stats").json()["content"])
+
+        # Chat traffic keeps flowing while the content is rebuilt and swapped
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            before = list(pool.map(ask, ["fever", "cough", "skin rash", "headache"] * 10))
+            pending = [pool.submit(ask, q) for q in ["fever", "cough", "skin rash", "headache"] * 10]
+            status, result = reload_content()
+            during = [f.result() for f in pending]
+        print(f"Reload: {status} {result}")
+        print(f"Chat latency before: max {max(before):.1f} ms, during reload: max {max(during):.1f} ms")
+
+        print("Content after:", requests.get(f"{URL}/stats").json()["content"])
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
@@ -0,0 +1,26 @@
+import requests
+import io
+from PIL import Image
+
+URL = "http://localhost:5000"
+
+if __name__ == "__main__":
+    try:
+        buf = io.BytesIO()
+        Image.new('RGB', (800, 600), (60, 150, 70)).save(buf, format='JPEG')
+        response = requests.post(f"{URL}/similar", files={'image': ('leaf.jpg', buf.getvalue(), 'image/jpeg')},
+                                 data={'k': 3})
+        print(f"Status Code: {response.status_code}")
+        result = response.json()
+        if response.status_code != 200:
+            print(f"Error: {result.get('error')}")
+        else:
+            print("Look-alike plants:")
+            for p in result["similar_plants"]:
+                print(f"  {p['plant']:<24} {p['similarity']:.4f}")
+            print("Nearest reference photos:")
+            for p in result["similar_images"]:
+                print(f"  {p['image']:<40} {p['similarity']:.4f}")
+        print("Index:", requests.get(f"{URL}/stats").json().get("embedding_index"))
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
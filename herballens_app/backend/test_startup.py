@@ -0,0 +1,28 @@
+import requests
+import os
+import subprocess
+import sys
+import time
+
+URL = "http://localhost:5000"
+
+def import_seconds(mode):
+    # Cold import of app.py in a fresh interpreter, as a new worker would do it
+    env = {**os.environ, "HERBAL_MODE": mode}
+    start = time.time()
+    subprocess.run([sys.executable, "-c", "import app"], env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.time() - start
+
+if __name__ == "__main__":
+    for mode in ("chat", "predict", "all"):
+        print(f"HERBAL_MODE={mode:<8} cold import {import_seconds(mode):.2f} s")
+
+    try:
+        # What the running server spent its startup on, and what it imported
+        startup = requests.get(f"{URL}/stats").json()["startup"]
+        print(f"Server mode {startup['mode']}: {startup['seconds']}")
+        print(f"  {startup['modules_loaded']} modules, numpy: {startup['numpy_imported']}, "
+              f"tensorflow: {startup['tensorflow_imported']}")
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
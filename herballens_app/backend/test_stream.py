@@ -0,0 +1,37 @@
+import requests
+import io
+import json
+import time
+from PIL import Image
+
+URL = "http://localhost:5000"
+
+def print_events(response, start):
+    # One NDJSON event per line, timed as it arrives
+    for line in response.iter_lines():
+        if line:
+            event = json.loads(line)
+            fields = ", ".join(k for k in event if k != "event")
+            print(f"  {(time.time() - start) * 1000:7.1f} ms  {event['event']}: {fields}")
+
+if __name__ == "__main__":
+    try:
+        image = Image.new('RGB', (800, 600), (60, 140, 50))
+        buf = io.BytesIO()
+        image.save(buf, format='JPEG')
+
+        # First request translates while streaming; the repeat is one cached result
+        for attempt in (1, 2):
+            start = time.time()
+            response = requests.post(f"{URL}/predict", files={'image': ('leaf.jpg', buf.getvalue(), 'image/jpeg')},
+                                     data={'stream': '1'}, stream=True)
+            print(f"/predict stream #{attempt}: {response.status_code} {response.headers.get('Content-Type')}")
+            print_events(response, start)
+
+        start = time.time()
+        response = requests.post(f"{URL}/chat", json={"query": "fever and cough"},
+                                 headers={"Accept": "application/x-ndjson"}, stream=True)
+        print(f"/chat stream: {response.status_code} {response.headers.get('Content-Type')}")
+        print_events(response, start)
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
@@ -0,0 +1,25 @@
+import requests
+import io
+import time
+from PIL import Image
+
+URL = "http://localhost:5000"
+
+if __name__ == "__main__":
+    try:
+        # Off-centre subject: a green patch near the right edge of a wide photo
+        image = Image.new('RGB', (1600, 900), (210, 200, 180))
+        image.paste((40, 130, 50), (1150, 250, 1550, 650))
+        buf = io.BytesIO()
+        image.save(buf, format='JPEG')
+
+        for tta in ("0", "1"):
+            start = time.time()
+            response = requests.post(f"{URL}/predict", files={'image': ('offcentre.jpg', buf.getvalue(), 'image/jpeg')},
+                                     data={'tta': tta})
+            elapsed = (time.time() - start) * 1000
+            result = response.json()
+            print(f"tta={tta}: {response.status_code} {result.get('plant')} {result.get('confidence')}% "
+                  f"views={result.get('tta_views', 1)} in {elapsed:.0f} ms")
+    except Exception as e:
+        print(f"Error connecting to server: {e}")
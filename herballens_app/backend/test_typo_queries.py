@@ -0,0 +1,32 @@
+import requests
+
+URL = "http://127.0.0.1:5000/chat"
+
+# Misspelt queries with the condition each should still be matched to
+TYPO_QUERIES = [
+    ("hedache", "headache"),
+    ("sore thraot", "sore throat"),
+    ("constipaton", "constipation"),
+    ("diarhea", "diarrhea"),
+    ("migrane", "migraine"),
+    ("insomina", "insomnia"),
+    ("dandruf", "dandruff"),
+    ("asthama", "asthma"),
+    ("wheezng and caugh", "asthma, cough"),
+]
+
+if __name__ == "__main__":
+    print("Testing typo-tolerant symptom matching...")
+    found = 0
+    for query, expected in TYPO_QUERIES:
+        try:
+            r = requests.post(URL, json={"query": query})
+            reply = r.json().get("response", "")
+            matched = not reply.startswith("I couldn't find")
+            found += matched
+            print(f"{'OK ' if matched else 'MISS'} '{query}' (expected {expected})")
+            print(f"     {reply.splitlines()[2] if matched and len(reply.splitlines()) > 2 else reply[:80]}")
+        except Exception as e:
+            print(f"Connection failed: {e}. Is the server running?")
+            break
+    print(f"\nMatched {found}/{len(TYPO_QUERIES)} misspelt queries")
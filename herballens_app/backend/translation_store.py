@@ -0,0 +1,195 @@
+"""Persistent translation store.
+
+Translations of the static texts we serve (plant descriptions, benefits and
+plant names) are kept in a small SQLite file keyed by a hash of the source
+text and the target language. Lookups go through an in-memory LRU first,
+then the file, and only call GoogleTranslator on a miss. Live results are
+written back so each text is translated at most once.
+
+Pre-translate everything in plant_info.json and class_indices.json with:
+
+    python translation_store.py [--lang te]
+
+Configuration (environment variables):
+    HERBAL_TRANSLATIONS_PATH   location of the store file
+                               (default: translations.sqlite3 next to app.py)
+    HERBAL_TRANSLATION_LRU     number of translations kept in memory (default 4096)
+"""
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRANSLATIONS_PATH = os.environ.get("HERBAL_TRANSLATIONS_PATH", os.path.join(BASE_DIR, "translations.sqlite3"))
+TRANSLATION_LRU_SIZE = int(os.environ.get("HERBAL_TRANSLATION_LRU", "4096"))
+
+
+def google_translator(lang):
+    # Imported here so the store can be used (read-only) without deep_translator
+    from deep_translator import GoogleTranslator
+    return GoogleTranslator(source='en', target=lang)
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TranslationStore:
+    def __init__(self, path=TRANSLATIONS_PATH, lru_size=TRANSLATION_LRU_SIZE, translator_factory=google_translator):
+        self.path = path
+        self.lru_size = lru_size
+        self.translator_factory = translator_factory
+
+        self._lock = threading.Lock()
+        self._lru = collections.OrderedDict()
+        self._conn = None
+        self._pid = None
+        self._connect()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def _connect(self):
+        # SQLite connections must not be shared across fork(), so each
+        # process (see serve.py) opens its own on first use.
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " key TEXT NOT NULL, lang TEXT NOT NULL, source TEXT NOT NULL, text TEXT NOT NULL,"
+            " PRIMARY KEY (key, lang))"
+        )
+        self._conn.commit()
+        self._pid = os.getpid()
+
+    @property
+    def conn(self):
+        # Caller holds self._lock
+        if self._pid != os.getpid():
+            self._connect()
+        return self._conn
+
+    def lookup(self, text, lang='te'):
+        """Return a stored translation, or None if it has never been translated."""
+        key = (text_key(text), lang)
+        with self._lock:
+            cached = self._lru.get(key)
+            if cached is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return cached
+
+            row = self.conn.execute(
+                "SELECT text FROM translations WHERE key = ? AND lang = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def translate(self, text, lang='te'):
+        """Translate English text, going to the network only if the store has no entry.
+
+        Raises whatever the translator raises when a live translation fails, so
+        callers keep their existing English fallbacks.
+        """
+        if not text:
+            return text
+        stored = self.lookup(text, lang)
+        if stored is not None:
+            return stored
+
+        with self._lock:
+            self.misses += 1
+        try:
+            translated = self.translator_factory(lang).translate(text)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        if not translated:
+            return text
+        self.add(text, translated, lang)
+        return translated
+
+    def add(self, text, translated, lang='te'):
+        key = (text_key(text), lang)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO translations (key, lang, source, text) VALUES (?, ?, ?, ?)",
+                (key[0], lang, text, translated),
+            )
+            self.conn.commit()
+            self._remember(key, translated)
+
+    def pretranslate(self, texts, lang='te'):
+        """Make sure every text in `texts` is in the store. Returns (translated, failed)."""
+        translated = failed = 0
+        for text in dict.fromkeys(t for t in texts if t):
+            if self.lookup(text, lang) is not None:
+                continue
+            try:
+                self.translate(text, lang)
+                translated += 1
+            except Exception as e:
+                print(f"Could not translate {text[:40]!r}: {e}")
+                failed += 1
+        return translated, failed
+
+    def stats(self):
+        with self._lock:
+            stored = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            return {
+                "path": self.path,
+                "stored": stored,
+                "in_memory": len(self._lru),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "failures": self.failures,
+            }
+
+    def _remember(self, key, translated):
+        # Caller holds self._lock
+        self._lru[key] = translated
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+
+def static_texts(plant_info, class_names):
+    """Every English text /predict may need translated, in a stable order."""
+    texts = []
+    for details in plant_info.values():
+        texts.append(details.get("description", ""))
+        texts.extend(details.get("benefits", []))
+    for name in class_names:
+        # /predict translates plant names with underscores replaced by spaces
+        texts.append(name.replace("_", " "))
+    return texts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-translate plant_info.json and class names into the translation store")
+    parser.add_argument("--lang", default="te")
+    parser.add_argument("--path", default=TRANSLATIONS_PATH)
+    args = parser.parse_args()
+
+    with open(os.path.join(BASE_DIR, "plant_info.json")) as f:
+        plant_info = json.load(f)
+    with open(os.path.join(BASE_DIR, "class_indices.json")) as f:
+        class_indices = json.load(f)
+
+    names = [k if isinstance(v, int) else v for k, v in class_indices.items()]
+    store = TranslationStore(args.path)
+    texts = static_texts(plant_info, names)
+    print(f"Pre-translating {len(set(texts))} texts to '{args.lang}' into {args.path}...")
+    translated, failed = store.pretranslate(texts, args.lang)
+    print(f"Done. Newly translated: {translated}, failed: {failed}, stats: {store.stats()}")
@@ -0,0 +1,78 @@
+"""Background model loading and warm-up.
+
+With HERBAL_EAGER_LOAD=1 the model is loaded in a background thread as soon
+as the app starts, then a few dummy batches are pushed through it so graph
+tracing and buffer allocation happen before the first real request.
+/readyz reports not-ready until this has finished.
+
+Configuration (environment variables):
+    HERBAL_EAGER_LOAD            1 to load and warm up at startup (default 0: lazy)
+    HERBAL_WARMUP_BATCH_SIZES    comma-separated batch sizes to run (default 1,2,4,8)
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger("herbal.warmup")
+
+EAGER_LOAD = os.environ.get("HERBAL_EAGER_LOAD", "0") == "1"
+WARMUP_BATCH_SIZES = [int(s) for s in os.environ.get("HERBAL_WARMUP_BATCH_SIZES", "1,2,4,8").split(",") if s.strip()]
+
+
+class ModelWarmup:
+    def __init__(self, load_fn, batch_sizes=WARMUP_BATCH_SIZES):
+        # load_fn returns a loaded inference backend (see inference_backend.py)
+        self.load_fn = load_fn
+        self.batch_sizes = batch_sizes
+
+        self.state = "not started"
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.batch_seconds = {}
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def start(self):
+        if self._thread is None:
+            self.state = "loading"
+            self._thread = threading.Thread(target=self.run, name="model-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def run(self):
+        try:
+            self.state = "loading"
+            start = time.perf_counter()
+            backend = self.load_fn()
+            self.load_seconds = time.perf_counter() - start
+
+            self.state = "warming up"
+            start = time.perf_counter()
+            for size in self.batch_sizes:
+                batch_start = time.perf_counter()
+                backend.predict(np.zeros((size, 224, 224, 3), dtype=np.float32))
+                self.batch_seconds[size] = round(time.perf_counter() - batch_start, 4)
+            self.warmup_seconds = time.perf_counter() - start
+
+            self.state = "ready"
+            log.info("Model ready: load %.2fs, warm-up %.2fs %s", self.load_seconds, self.warmup_seconds, self.batch_seconds)
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            log.critical("CRITICAL ERROR during model warm-up: %s", e, exc_info=True)
+
+    def status(self):
+        return {
+            "state": self.state,
+            "error": self.error,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "warmup_batch_seconds": self.batch_seconds,
+        }
@@ -33,34 +33,86 @@ async function predict() {
   `;
 
   try {
-    const res = await fetch("http://127.0.0.1:5000/predict", {
+    // Streamed: the English result arrives as soon as the plant is identified,
+    // the Telugu fields follow as they are translated
+    const res = await fetch("http://127.0.0.1:5000/predict?stream=1", {
       method: "POST",
+      headers: { "Accept": "application/x-ndjson" },
       body: formData
     });
 
     if (!res.ok) throw new Error(`Server error: ${res.status}`);
 
-    const data = await res.json();
-    
-    // Store current prediction for "Add to History"
-    currentPrediction = {
-      ...data,
-      image: document.getElementById("previewImg").src,
-      timestamp: new Date().toLocaleString()
-    };
-
-    renderResult(data);
+    await readEvents(res, (event) => {
+      if (event.event === "result") {
+        // Store current prediction for "Add to History", without the event tag
+        const { event: _, ...result } = event;
+        currentPrediction = {
+          ...result,
+          image: document.getElementById("previewImg").src,
+          timestamp: new Date().toLocaleString()
+        };
+        renderResult(currentPrediction);
+      } else if (event.event === "translation" && currentPrediction) {
+        if (event.plant_te) currentPrediction.plant_te = event.plant_te;
+        if (event.details_te) {
+          currentPrediction.details_te = { ...currentPrediction.details_te, ...event.details_te };
+        }
+        // Only the Telugu view changes
+        if (currentLanguage === 'te') renderResult(currentPrediction);
+      }
+    });
   } catch (error) {
     console.error(error);
     resultDiv.innerHTML = `<p style="color:red">Error: ${error.message}</p>`;
   }
 }
 
+// Calls onEvent for each line of an NDJSON response ({"event": "result"},
+// {"event": "translation"}, ..., {"event": "done"}) as it arrives. A plain
+// JSON response (older server) is handed over as a single "result".
+async function readEvents(res, onEvent) {
+  const contentType = res.headers.get("Content-Type") || "";
+  if (!contentType.includes("application/x-ndjson") || !res.body) {
+    const data = await res.json();
+    onEvent({ event: "result", ...data });
+    onEvent({ event: "done" });
+    return;
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split("\n");
+    buffered = lines.pop();
+    lines.filter(line => line.trim()).forEach(line => onEvent(JSON.parse(line)));
+  }
+  if (buffered.trim()) onEvent(JSON.parse(buffered));
+}
+
 function renderResult(data) {
   const resultDiv = document.getElementById("result");
   
   // Choose language-specific data
   const isTe = currentLanguage === 'te';
+
+  // The server turned the photo away before identifying it (no plant found)
+  if (data.rejected) {
+    const btnNew = isTe ? "📷 కొత్త చిత్రాన్ని అప్‌లోడ్ చేయండి" : "📷 Upload New Image";
+    resultDiv.innerHTML = `
+      <div class="low-confidence-warning">
+        ⚠️ ${isTe ? (data.message_te || data.message) : data.message}
+      </div>
+      <div class="action-buttons">
+        <button class="btn-new" onclick="uploadNew()">${btnNew}</button>
+      </div>
+    `;
+    return;
+  }
   const plantName = isTe ? (data.plant_te || data.plant) : data.plant;
   const description = isTe ? (data.details_te?.description || data.details.description) : data.details.description;
   const benefits = isTe ? (data.details_te?.benefits || data.details.benefits) : data.details.benefits;
@@ -71,7 +123,9 @@ function renderResult(data) {
 
   // Display result with potential low-confidence warning
   let confidenceWarning = "";
-  if (data.confidence < 70) {
+  // Older servers don't send the uncertainty flag; fall back to the raw score
+  const uncertain = data.uncertain !== undefined ? data.uncertain : data.confidence < 70;
+  if (uncertain) {
     if (isTe) {
       confidenceWarning = `
         <div class="low-confidence-warning">
@@ -299,33 +353,62 @@ async function sendMessage() {
   const thinkingTe = "ఆలోచిస్తున్నాను...";
   addMessage(thinkingEn, "bot", typingId, thinkingTe);
 
-  try {
-    const data = await getBotResponse(text);
-    
-    // Remove typing indicator and add bot response
+  let botMessage = null;
+  const removeTyping = () => {
     const typingEl = document.getElementById(typingId);
     if (typingEl) typingEl.remove();
-    
-    // Add bot message with both English and Telugu content for voice
-    addMessage(data.response, "bot", null, data.response_te);
+  };
+
+  try {
+    await getBotResponse(text, (event) => {
+      if (event.event === "result") {
+        // Remove typing indicator and add bot response
+        removeTyping();
+        // Add bot message with both English and Telugu content for voice
+        botMessage = addMessage(event.response, "bot", null, event.response_te);
+      } else if (event.event === "translation" && botMessage) {
+        setMessageTelugu(botMessage, event.response_te);
+      }
+    });
   } catch (error) {
     console.error("Chat error:", error);
-    const typingEl = document.getElementById(typingId);
-    if (typingEl) typingEl.remove();
+    removeTyping();
     addMessage("Sorry, I encountered an error. Please try again.", "bot");
   }
 }
 
+// Fill in the Telugu text of a bot message that arrived in English first
+function setMessageTelugu(msgWrapper, textTe) {
+  if (!textTe) return;
+  msgWrapper.setAttribute('data-te', textTe);
+
+  if (currentLanguage === 'te') {
+    msgWrapper.querySelector('.message.bot').innerHTML = textTe
+      .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
+      .replace(/\n/g, '<br>');
+  }
+
+  const btnContainer = msgWrapper.querySelector('.voice-btn-container');
+  if (btnContainer && !btnContainer.querySelector('.voice-btn.te')) {
+    const speakBtnTe = document.createElement("button");
+    speakBtnTe.className = "voice-btn te";
+    speakBtnTe.innerHTML = "TE 🔊";
+    speakBtnTe.title = "Listen in Telugu";
+    speakBtnTe.onclick = () => toggleSpeech(textTe, speakBtnTe, "te-IN");
+    btnContainer.appendChild(speakBtnTe);
+  }
+}
+
 function addMessage(text, sender, id = null, textTe = null) {
   const messagesDiv = document.getElementById("chatMessages");
   const msgWrapper = document.createElement("div");
   msgWrapper.className = `message-wrapper ${sender}`;
   if (id) msgWrapper.id = id;
   
-  // Store both languages for switching later
-  if (sender === "bot" && textTe) {
+  // Store both languages for switching later (Telugu may follow, see setMessageTelugu)
+  if (sender === "bot") {
     msgWrapper.setAttribute('data-en', text);
-    msgWrapper.setAttribute('data-te', textTe);
+    if (textTe) msgWrapper.setAttribute('data-te', textTe);
   }
 
   const msgEl = document.createElement("div");
@@ -376,6 +459,7 @@ function addMessage(text, sender, id = null, textTe = null) {
 
   messagesDiv.appendChild(msgWrapper);
   messagesDiv.scrollTop = messagesDiv.scrollHeight;
+  return msgWrapper;
 }
 
 let currentButton = null;
@@ -502,24 +586,32 @@ function toggleSpeech(text, button, lang = "en-US") {
   }
 }
 
-async function getBotResponse(query) {
+async function getBotResponse(query, onEvent) {
+  let answered = false;
   try {
-    const res = await fetch("http://127.0.0.1:5000/chat", {
+    const res = await fetch("http://127.0.0.1:5000/chat?stream=1", {
       method: "POST",
       headers: {
-        "Content-Type": "application/json"
+        "Content-Type": "application/json",
+        "Accept": "application/x-ndjson"
       },
       body: JSON.stringify({ query: query })
     });
 
     if (!res.ok) throw new Error("Chat server error");
-    return await res.json();
+    await readEvents(res, (event) => {
+      if (event.event === "result") answered = true;
+      onEvent(event);
+    });
   } catch (error) {
     console.error("Chat error:", error);
-    return {
+    // A reply already shown stays; only a missing one is replaced
+    if (answered) return;
+    onEvent({
+      event: "result",
       response: "I'm having trouble connecting to my knowledge base, but I'm here to help!",
       response_te: "క్షమించండి, సర్వర్‌తో కనెక్ట్ కావడంలో సమస్య ఉంది."
-    };
+    });
   }
 }
 